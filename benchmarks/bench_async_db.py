@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный бенчмарк: синхронная сессия внутри async-обработчика против AsyncSession
+
+Запускает --requests одновременных "запросов" списка задач с параллельностью
+--concurrency в одном event loop (как один воркер uvicorn) и измеряет пропускную
+способность и максимальную задержку event loop. Синхронный вариант повторяет
+прежние обработчики: SessionLocal + crud в async def, т.е. каждый запрос к БД
+блокирует цикл.
+
+Для SQLite --latency-ms имитирует сетевую задержку до сервера БД: пауза выполняется
+в потоке, исполняющем запрос (в event loop для синхронной сессии, в потоке
+aiosqlite для асинхронной). Для проверки на PostgreSQL задайте DATABASE_URL.
+
+    python benchmarks/bench_async_db.py --todos 50000 --requests 200 --concurrency 20 --latency-ms 5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp_dir = tempfile.mkdtemp(prefix="todo_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+
+from sqlalchemy import event, insert  # noqa: E402
+from sqlalchemy.util import await_only  # noqa: E402
+
+from src.category.models import Category  # noqa: E402,F401
+from src.notifications.models import Notification  # noqa: E402,F401
+from src.todo import async_crud, crud  # noqa: E402
+from src.todo.models import Todo  # noqa: E402
+from src.user.models import User  # noqa: E402
+from src.utils.db import (  # noqa: E402
+    AsyncSessionLocal,
+    Base,
+    SessionLocal,
+    async_engine,
+    engine,
+)
+
+
+def seed(total: int) -> int:
+    """Создать пользователя и total задач"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        user = User(email="bench@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+
+        start = datetime.utcnow() - timedelta(days=365)
+        batch = []
+        for i in range(total):
+            batch.append(
+                {
+                    "title": f"Todo {i}",
+                    "description": f"Описание задачи номер {i}",
+                    "user_id": user.id,
+                    "created_at": start + timedelta(seconds=i),
+                }
+            )
+            if len(batch) == 5000:
+                db.execute(insert(Todo), batch)
+                batch = []
+        if batch:
+            db.execute(insert(Todo), batch)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def add_latency(latency_ms: float):
+    """Пауза перед каждым запросом в потоке, который его выполняет (только SQLite)"""
+
+    def trace(_statement):
+        time.sleep(latency_ms / 1000)
+
+    @event.listens_for(engine, "connect")
+    def sync_connect(dbapi_connection, _):
+        dbapi_connection.set_trace_callback(trace)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def async_connect(dbapi_connection, _):
+        await_only(dbapi_connection.driver_connection.set_trace_callback(trace))
+
+    # Новые соединения получат обработчик
+    engine.dispose()
+
+
+async def sync_request(user_id: int, search: str):
+    """Прежний обработчик: синхронная сессия в async def"""
+    db = SessionLocal()
+    try:
+        crud.list_todos(db, user_id, limit=20, search=search)
+    finally:
+        db.close()
+
+
+async def async_request(user_id: int, search: str):
+    """Новый обработчик: AsyncSession, ввод-вывод не блокирует цикл"""
+    async with AsyncSessionLocal() as db:
+        await async_crud.list_todos(db, user_id, limit=20, search=search)
+
+
+async def measure(
+    handler, user_id: int, requests: int, concurrency: int, search: str
+) -> dict:
+    """Пропускная способность и максимальная задержка event loop"""
+    semaphore = asyncio.Semaphore(concurrency)
+    max_lag = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        # Задача, которая хочет просыпаться каждую миллисекунду
+        nonlocal max_lag
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.001)
+
+    async def one():
+        async with semaphore:
+            await handler(user_id, search)
+
+    ticker_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticker_task
+
+    return {"rps": requests / elapsed, "elapsed": elapsed, "max_lag_ms": max_lag * 1000}
+
+
+async def run(
+    total: int, requests: int, concurrency: int, search: str, latency_ms: float
+):
+    user_id = seed(total)
+    if latency_ms and engine.dialect.name == "sqlite":
+        add_latency(latency_ms)
+
+    print(
+        f"{total} задач, {requests} запросов, параллельность {concurrency}, "
+        f"поиск '{search or '-'}', задержка БД {latency_ms} мс"
+    )
+    print(
+        f"{'вариант':>8} {'запр/с':>10} {'время, с':>10} {'макс. задержка цикла, мс':>26}"
+    )
+
+    try:
+        for name, handler in (("sync", sync_request), ("async", async_request)):
+            # Прогрев пула соединений и кэша страниц
+            await measure(handler, user_id, concurrency, concurrency, search)
+            result = await measure(handler, user_id, requests, concurrency, search)
+            print(
+                f"{name:>8} {result['rps']:>10.1f} {result['elapsed']:>10.2f} {result['max_lag_ms']:>26.1f}"
+            )
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--todos", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--search",
+        default=None,
+        help="Поисковый запрос (дополнительная нагрузка на БД)",
+    )
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(
+        run(args.todos, args.requests, args.concurrency, args.search, args.latency_ms)
+    )
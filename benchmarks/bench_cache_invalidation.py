@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк инвалидации кэша пользователя: KEYS по паттернам против поколений
+
+Заполняет Redis --keys ключами (данные --users пользователей) и измеряет:
+- прежнюю инвалидацию: четыре KEYS user:<id>:<раздел>:* и DEL найденного;
+- инвалидацию поколением: один INCR (invalidate_user_cache);
+- уборку устаревших поколений (SCAN + UNLINK) после инвалидации всех пользователей.
+
+Во время каждого замера отдельный поток выполняет GET и фиксирует максимальную
+задержку - насколько операция блокирует остальных клиентов Redis.
+
+ВНИМАНИЕ: база из --redis-url очищается (FLUSHDB).
+
+    python benchmarks/bench_cache_invalidation.py --redis-url redis://localhost:6379/15 --keys 1000000
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import redis  # noqa: E402
+
+import src.utils.cache as cache_module  # noqa: E402
+from src.utils.cache import (  # noqa: E402
+    CacheManager,
+    invalidate_user_cache,
+    user_cache_key,
+)
+
+SECTIONS = ("todos", "categories", "statistics", "timeline")
+PIPELINE_SIZE = 10000
+
+
+class ProbeLatency:
+    """Фоновый клиент: максимальная задержка GET во время замера"""
+
+    def __init__(self, url: str):
+        self.client = redis.from_url(url)
+        self.max_latency = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            self.client.get("probe")
+            self.max_latency = max(self.max_latency, time.perf_counter() - start)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def fill(client, users: int, keys: int, key_for):
+    """Заполнить Redis keys ключами, равномерно по пользователям и разделам"""
+    client.flushdb()
+    per_user = max(keys // users, 1)
+    pipe = client.pipeline(transaction=False)
+    written = 0
+    for user_id in range(users):
+        for i in range(per_user):
+            pipe.set(
+                key_for(user_id, SECTIONS[i % len(SECTIONS)], i), b"x" * 64, ex=3600
+            )
+            written += 1
+            if written % PIPELINE_SIZE == 0:
+                pipe.execute()
+    pipe.execute()
+    return client.dbsize()
+
+
+def legacy_invalidate(client, user_id: int) -> int:
+    """Прежняя инвалидация: KEYS по каждому разделу и DEL"""
+    deleted = 0
+    for section in SECTIONS:
+        keys = client.keys(f"user:{user_id}:{section}:*")
+        if keys:
+            deleted += client.delete(*keys)
+    return deleted
+
+
+def measure(url: str, label: str, func, repeat: int):
+    with ProbeLatency(url) as probe:
+        start = time.perf_counter()
+        for i in range(repeat):
+            func(i)
+        elapsed = time.perf_counter() - start
+    print(
+        f"{label:<40} {elapsed / repeat * 1000:>12.3f} {probe.max_latency * 1000:>18.1f}"
+    )
+
+
+def run(url: str, users: int, keys: int, repeat: int):
+    client = redis.from_url(url)
+    manager = CacheManager(client=client, local_cache=False)
+    cache_module.cache_manager = manager
+
+    print(f"{'операция':<40} {'мс на вызов':>12} {'макс. задержка GET, мс':>18}")
+
+    total = fill(
+        client,
+        users,
+        keys,
+        lambda user_id, section, i: f"user:{user_id}:{section}:page:{i}",
+    )
+    print(f"прежняя схема: {total} ключей")
+    measure(url, "KEYS x4 + DEL", lambda i: legacy_invalidate(client, i), repeat)
+
+    total = fill(
+        client,
+        users,
+        keys,
+        lambda user_id, section, i: user_cache_key(user_id, section, page=i),
+    )
+    print(f"поколения: {total} ключей")
+    measure(url, "INCR поколения", lambda i: invalidate_user_cache(i), repeat)
+
+    for user_id in range(users):
+        invalidate_user_cache(user_id)
+    start = time.perf_counter()
+    with ProbeLatency(url) as probe:
+        deleted = manager.sweep_stale_generations()
+    elapsed = time.perf_counter() - start
+    print(
+        f"уборка: удалено {deleted} ключей за {elapsed:.1f} с "
+        f"({deleted / elapsed:,.0f} ключей/с), макс. задержка GET {probe.max_latency * 1000:.1f} мс"
+    )
+    client.flushdb()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--keys", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.redis_url, args.users, args.keys, args.repeat)
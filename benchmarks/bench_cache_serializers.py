@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк сериализаторов кэша на типичных страницах списка задач
+
+Сравнивает прежний формат (pickle для dict/list) с кодеками src.utils.serializers
+(orjson, msgpack, с zlib-сжатием и без) по времени кодирования/декодирования и
+размеру записи в Redis. Страница собирается из тех же полей, что отдает
+crud.list_todos (TODO_LIST_FIELDS).
+
+    python benchmarks/bench_cache_serializers.py --sizes 20 100 500
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from src.todo.crud import TODO_LIST_FIELDS  # noqa: E402
+from src.todo.models import TodoStatus  # noqa: E402
+from src.utils.serializers import SERIALIZERS, get_codec  # noqa: E402
+
+
+def todo_page(size: int) -> dict:
+    """Ответ списка задач: size элементов и метаданные пагинации"""
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    statuses = list(TodoStatus)
+    items = []
+    for i in range(size):
+        values = {
+            "id": 100000 + i,
+            "title": f"Подготовить отчет по проекту {i}",
+            "description": (
+                f"Собрать данные за квартал, сверить с бюджетом и отправить руководителю ({i})"
+                if i % 3
+                else None
+            ),
+            "status": statuses[i % len(statuses)],
+            "category_id": i % 7 or None,
+            "deadline": start + timedelta(days=i) if i % 2 else None,
+            "user_id": 42,
+            "created_at": start + timedelta(minutes=i),
+            "updated_at": start + timedelta(minutes=i, seconds=30) if i % 4 else None,
+            "category_name": f"Категория {i % 7}" if i % 7 else None,
+            "category_color": "#3B82F6" if i % 7 else None,
+        }
+        items.append({field: values[field] for field in TODO_LIST_FIELDS})
+    return {
+        "items": items,
+        "total": size,
+        "page": 1,
+        "size": size,
+        "pages": 1,
+        "next_cursor": None,
+    }
+
+
+def timed(func, repeat: int) -> float:
+    """Среднее время вызова в микросекундах"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run(sizes, repeat: int):
+    formats = [("pickle (прежний)", pickle.dumps, pickle.loads)]
+    for name in sorted(SERIALIZERS):
+        for label, threshold in (("", 0), ("+zlib", 1024)):
+            codec = get_codec(name, compress_min_size=threshold)
+            formats.append((f"{name}{label}", codec.dumps, codec.loads))
+
+    for size in sizes:
+        payload = todo_page(size)
+        print(f"\nстраница из {size} задач, {repeat} повторов")
+        print(
+            f"{'формат':<18} {'кодирование, мкс':>17} {'декодирование, мкс':>19} {'байт':>9}"
+        )
+        for label, dumps, loads in formats:
+            data = dumps(payload)
+            encode_us = timed(lambda: dumps(payload), repeat)
+            decode_us = timed(lambda: loads(data), repeat)
+            print(f"{label:<18} {encode_us:>17.1f} {decode_us:>19.1f} {len(data):>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный бенчмарк: GET /todos с кэшем пользователя в get_current_user и без него
+
+Отправляет --requests запросов списка задач с параллельностью --concurrency через
+ASGI-транспорт httpx (весь стек FastAPI в одном event loop, как один воркер uvicorn)
+и измеряет пропускную способность. Страница списка кэшируется в обоих вариантах,
+поэтому при попадании в ее кэш чтение пользователя остается единственным запросом
+к БД. Вариант "db" отключает кэш пользователя (cache_principal_ttl = 0).
+
+Для SQLite --latency-ms имитирует сетевую задержку до сервера БД (в потоке aiosqlite).
+Для проверки на PostgreSQL задайте DATABASE_URL.
+
+ВНИМАНИЕ: база из --redis-url очищается (FLUSHDB).
+
+    python benchmarks/bench_principal_cache.py --redis-url redis://localhost:6379/15 --requests 2000 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp_dir = tempfile.mkdtemp(prefix="todo_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+
+import httpx  # noqa: E402
+import redis  # noqa: E402
+import redis.asyncio as aioredis  # noqa: E402
+from sqlalchemy import event, insert  # noqa: E402
+from sqlalchemy.util import await_only  # noqa: E402
+
+import src.utils.cache as cache_module  # noqa: E402
+from main import app  # noqa: E402
+from src.config import settings  # noqa: E402
+from src.todo.models import Todo  # noqa: E402
+from src.user.models import User  # noqa: E402
+from src.utils.db import Base, SessionLocal, async_engine, engine  # noqa: E402
+from src.utils.security import create_access_token  # noqa: E402
+
+
+def seed(total: int) -> int:
+    """Создать пользователя и total задач"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        user = User(email="bench@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        db.execute(
+            insert(Todo),
+            [
+                {
+                    "title": f"Todo {i}",
+                    "description": f"Описание задачи номер {i}",
+                    "user_id": user.id,
+                }
+                for i in range(total)
+            ],
+        )
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def use_redis(url: str):
+    """Подменить глобальный cache_manager менеджером поверх --redis-url"""
+    client = redis.from_url(url)
+    client.flushdb()
+    manager = cache_module.CacheManager(
+        client=client, async_client=aioredis.from_url(url)
+    )
+    original = cache_module.cache_manager
+    # Модули импортируют cache_manager по имени: подменяем во всех
+    for module in list(sys.modules.values()):
+        if getattr(module, "cache_manager", None) is original:
+            module.cache_manager = manager
+    return manager
+
+
+def add_latency(latency_ms: float):
+    """Пауза перед каждым запросом к БД в потоке aiosqlite (только SQLite)"""
+
+    def trace(_statement):
+        time.sleep(latency_ms / 1000)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def async_connect(dbapi_connection, _):
+        await_only(dbapi_connection.driver_connection.set_trace_callback(trace))
+
+
+async def measure(
+    client: httpx.AsyncClient, headers: dict, requests: int, concurrency: int
+) -> dict:
+    """Пропускная способность и задержки запросов"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get("/api/v1/todos/?limit=20", headers=headers)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+async def run(
+    total: int, requests: int, concurrency: int, latency_ms: float, redis_url: str
+):
+    user_id = seed(total)
+    manager = use_redis(redis_url)
+    if latency_ms and engine.dialect.name == "sqlite":
+        add_latency(latency_ms)
+
+    headers = {
+        "Authorization": f"Bearer {create_access_token(data={'sub': str(user_id)})}"
+    }
+    ttl = settings.cache_principal_ttl or 30
+
+    print(
+        f"{total} задач, {requests} запросов, параллельность {concurrency}, задержка БД {latency_ms} мс"
+    )
+    print(f"{'вариант':>8} {'запр/с':>10} {'p50, мс':>10} {'p99, мс':>10}")
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            for name, principal_ttl in (("db", 0), ("cache", ttl)):
+                settings.cache_principal_ttl = principal_ttl
+                # Прогрев пула соединений и кэша страниц
+                await measure(client, headers, concurrency, concurrency)
+                result = await measure(client, headers, requests, concurrency)
+                print(
+                    f"{name:>8} {result['rps']:>10.1f} {result['p50_ms']:>10.2f} {result['p99_ms']:>10.2f}"
+                )
+    finally:
+        manager.close()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--todos", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    args = parser.parse_args()
+    asyncio.run(
+        run(
+            args.todos, args.requests, args.concurrency, args.latency_ms, args.redis_url
+        )
+    )
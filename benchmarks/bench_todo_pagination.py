@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пагинации списка задач: OFFSET против keyset (курсор)
+
+Показывает задержку получения N-й страницы для пользователя с большим
+количеством задач. Для keyset-режима задержка не должна расти с номером страницы.
+
+    python benchmarks/bench_todo_pagination.py --todos 50000 --limit 20
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp_dir = tempfile.mkdtemp(prefix="todo_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+
+from sqlalchemy import insert  # noqa: E402
+
+from src.category.models import Category  # noqa: E402,F401
+from src.notifications.models import Notification  # noqa: E402,F401
+from src.todo import crud  # noqa: E402
+from src.todo.models import Todo  # noqa: E402
+from src.user.models import User  # noqa: E402
+from src.utils.db import Base, SessionLocal, engine  # noqa: E402
+
+
+def seed(total: int) -> int:
+    """Создать пользователя и total задач"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        user = User(email="bench@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+
+        start = datetime.utcnow() - timedelta(days=365)
+        batch = []
+        for i in range(total):
+            batch.append(
+                {
+                    "title": f"Todo {i}",
+                    "user_id": user.id,
+                    "created_at": start + timedelta(seconds=i),
+                    "deadline": start + timedelta(hours=i % 5000) if i % 3 else None,
+                }
+            )
+            if len(batch) == 5000:
+                db.execute(insert(Todo), batch)
+                batch = []
+        if batch:
+            db.execute(insert(Todo), batch)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def timed(func, repeat: int) -> float:
+    """Среднее время вызова в миллисекундах"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(total: int, limit: int, repeat: int, sort: str):
+    user_id = seed(total)
+    db = SessionLocal()
+    try:
+        # Собираем курсоры страниц одним проходом, чтобы мерить только выборку страницы
+        positions = {1: None}
+        after = None
+        page = 1
+        while True:
+            _, next_position = crud.get_todos_keyset(
+                db, user_id, limit=limit, after=after, sort=sort
+            )
+            if next_position is None:
+                break
+            page += 1
+            after = {"value": next_position[0], "id": next_position[1]}
+            positions[page] = after
+
+        last_page = page
+        probe_pages = sorted(
+            {1, 10, 100, last_page // 4, last_page // 2, last_page} - {0}
+        )
+
+        print(f"{total} задач, limit={limit}, sort={sort}, страниц: {last_page}")
+        print(f"{'страница':>10} {'offset, мс':>12} {'keyset, мс':>12}")
+        for page in probe_pages:
+            if page not in positions:
+                continue
+            skip = (page - 1) * limit
+            offset_ms = timed(
+                lambda: crud.get_todos_with_category(
+                    db, user_id, skip=skip, limit=limit, sort=sort
+                ),
+                repeat,
+            )
+            keyset_ms = timed(
+                lambda: crud.get_todos_keyset(
+                    db, user_id, limit=limit, after=positions[page], sort=sort
+                ),
+                repeat,
+            )
+            print(f"{page:>10} {offset_ms:>12.2f} {keyset_ms:>12.2f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--todos", type=int, default=50000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--sort", choices=["created_at", "deadline"], default="created_at"
+    )
+    args = parser.parse_args()
+    run(args.todos, args.limit, args.repeat, args.sort)
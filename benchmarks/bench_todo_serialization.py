@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сериализации страницы списка задач: прежний путь против быстрого
+
+Прежний путь: выборка ORM-объектов Todo, словари из __dict__, валидация
+TodoListResponse в обработчике и повторно по response_model, json.dumps.
+Быстрый путь: выборка только колонок (crud.list_todos), ответ без повторной
+валидации, кодирование orjson (ORJSONResponse).
+
+Показывает элементов в секунду для всего пути (запрос + сериализация) и
+отдельно для сериализации уже выбранной страницы.
+
+    python benchmarks/bench_todo_serialization.py --todos 5000 --limit 100
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp_dir = tempfile.mkdtemp(prefix="todo_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+
+from sqlalchemy import insert  # noqa: E402
+
+from src.category.models import Category  # noqa: E402
+from src.notifications.models import Notification  # noqa: E402,F401
+from src.todo import crud, schemas  # noqa: E402
+from src.todo.models import Todo  # noqa: E402
+from src.user.models import User  # noqa: E402
+from src.utils.db import Base, SessionLocal, engine  # noqa: E402
+from src.utils.responses import ORJSONResponse  # noqa: E402
+
+
+def seed(total: int) -> int:
+    """Создать пользователя, категории и total задач"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        user = User(email="bench@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+
+        categories = [
+            Category(name=f"Категория {i}", user_id=user.id) for i in range(5)
+        ]
+        db.add_all(categories)
+        db.commit()
+
+        start = datetime.utcnow() - timedelta(days=365)
+        db.execute(
+            insert(Todo),
+            [
+                {
+                    "title": f"Todo {i}",
+                    "description": f"Описание задачи номер {i}",
+                    "user_id": user.id,
+                    "category_id": categories[i % 5].id if i % 2 else None,
+                    "created_at": start + timedelta(seconds=i),
+                    "deadline": start + timedelta(days=i % 400),
+                }
+                for i in range(total)
+            ],
+        )
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def legacy_items(db, user_id: int, limit: int) -> list:
+    """Прежняя выборка: ORM-объекты и словари из __dict__"""
+    rows = (
+        db.query(
+            Todo,
+            Category.name.label("category_name"),
+            Category.color.label("category_color"),
+        )
+        .outerjoin(Category, Todo.category_id == Category.id)
+        .filter(Todo.user_id == user_id)
+        .order_by(Todo.created_at.desc(), Todo.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return [
+        {
+            **row[0].__dict__,
+            "category_name": row.category_name,
+            "category_color": row.category_color,
+        }
+        for row in rows
+    ]
+
+
+def legacy_render(items: list, limit: int) -> bytes:
+    """Прежняя сериализация: модель в обработчике, проверка response_model, json.dumps"""
+    response = schemas.TodoListResponse(
+        items=items, total=len(items), page=1, size=limit, pages=1
+    )
+    content = schemas.TodoListResponse.model_validate(response).model_dump(mode="json")
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+def fast_items(db, user_id: int, limit: int) -> list:
+    """Быстрая выборка: только колонки элемента списка"""
+    return crud.list_todos(db, user_id, limit=limit, count="none")["items"]
+
+
+def fast_render(items: list, limit: int) -> bytes:
+    """Быстрая сериализация: словарь ответа сразу в orjson"""
+    return ORJSONResponse(
+        {
+            "items": items,
+            "total": len(items),
+            "total_is_estimate": False,
+            "page": 1,
+            "size": limit,
+            "pages": 1,
+            "next_cursor": None,
+        }
+    ).body
+
+
+def items_per_second(func, items_per_call: int, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return items_per_call * repeat / (time.perf_counter() - start)
+
+
+def run(total: int, limit: int, repeat: int):
+    user_id = seed(total)
+    db = SessionLocal()
+    try:
+        print(f"{total} задач, страница {limit} элементов, {repeat} повторов")
+        print(
+            f"{'путь':>8} {'запрос+сериализация, эл/с':>28} {'только сериализация, эл/с':>28}"
+        )
+        for name, select_items, render in (
+            ("прежний", legacy_items, legacy_render),
+            ("быстрый", fast_items, fast_render),
+        ):
+
+            def full():
+                render(select_items(db, user_id, limit), limit)
+                # Сессия запроса живет недолго: ORM-объекты не копятся в identity map
+                db.expunge_all()
+
+            items = select_items(db, user_id, limit)
+            full_rate = items_per_second(full, limit, repeat)
+            render_rate = items_per_second(lambda: render(items, limit), limit, repeat)
+            print(f"{name:>8} {full_rate:>28,.0f} {render_rate:>28,.0f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--todos", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=300)
+    args = parser.parse_args()
+    run(args.todos, args.limit, args.repeat)
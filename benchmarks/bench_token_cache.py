@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк зависимости аутентификации с кэшем проверенных JWT и без него
+
+Измеряет время на вызов:
+- verify_token для одного и того же токена (как у клиента, повторяющего запросы);
+- get_current_user целиком: токен + пользователь (кэш пользователя в Redis из
+  --redis-url, при недоступном Redis - запрос к БД).
+
+ВНИМАНИЕ: база из --redis-url очищается (FLUSHDB).
+
+    python benchmarks/bench_token_cache.py --iterations 20000 --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+_tmp_dir = tempfile.mkdtemp(prefix="todo_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmp_dir, 'bench.db')}")
+
+import redis  # noqa: E402
+import redis.asyncio as aioredis  # noqa: E402
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+
+import src.utils.cache as cache_module  # noqa: E402
+from src.category.models import Category  # noqa: E402,F401
+from src.notifications.models import Notification  # noqa: E402,F401
+from src.todo.models import Todo  # noqa: E402,F401
+from src.user.models import User  # noqa: E402
+from src.utils import security  # noqa: E402
+from src.utils.db import (  # noqa: E402
+    AsyncSessionLocal,
+    Base,
+    SessionLocal,
+    async_engine,
+    engine,
+)
+from src.utils.permissions import get_current_user  # noqa: E402
+
+
+def seed() -> int:
+    """Создать пользователя"""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        user = User(email="bench@example.com", password_hash="x")
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def use_redis(url: str):
+    """Подменить глобальный cache_manager менеджером поверх --redis-url"""
+    try:
+        client = redis.from_url(url)
+        client.flushdb()
+    except redis.RedisError as e:
+        print(f"Redis недоступен ({e}): пользователь читается из БД")
+        return None
+    manager = cache_module.CacheManager(
+        client=client, async_client=aioredis.from_url(url)
+    )
+    original = cache_module.cache_manager
+    # Модули импортируют cache_manager по имени: подменяем во всех
+    for module in list(sys.modules.values()):
+        if getattr(module, "cache_manager", None) is original:
+            module.cache_manager = manager
+    return manager
+
+
+def bench_verify(token: str, iterations: int) -> float:
+    """Микросекунд на verify_token"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        security.verify_token(token, "access")
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def bench_dependency(token: str, iterations: int) -> float:
+    """Микросекунд на get_current_user"""
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await get_current_user(credentials, db)
+        return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def run(iterations: int, redis_url: str):
+    user_id = seed()
+    manager = use_redis(redis_url)
+    token = security.create_access_token(data={"sub": str(user_id)})
+    token_cache = security.verified_tokens
+
+    print(f"{iterations} вызовов")
+    print(
+        f"{'кэш токенов':>12} {'verify_token, мкс':>18} {'get_current_user, мкс':>22}"
+    )
+    try:
+        for name, cache in (("нет", None), ("да", token_cache)):
+            security.verified_tokens = cache
+            # Прогрев (кэш пользователя, соединения)
+            bench_verify(token, 100)
+            await bench_dependency(token, 100)
+            verify_us = bench_verify(token, iterations)
+            dependency_us = await bench_dependency(token, iterations)
+            print(f"{name:>12} {verify_us:>18.1f} {dependency_us:>22.1f}")
+    finally:
+        security.verified_tokens = token_cache
+        if manager is not None:
+            manager.close()
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations, args.redis_url))
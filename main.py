@@ -1,18 +1,27 @@
+import asyncio
+import time
+import traceback
+
 from fastapi import FastAPI, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from src.config import settings
-from src.user.routers import router as user_router
+
+from src.admin.routers import router as admin_router
 from src.category.routers import router as category_router
-from src.todo.routers import router as todo_router
+from src.config import settings
 from src.notifications.routers import router as notification_router
-from src.utils.logger import app_logger
+from src.todo.routers import router as todo_router
+from src.user.routers import router as user_router
+from src.utils.cache import cache_manager, run_cache_janitor
 from src.utils.db import check_db_connection
-import time
-import traceback
+from src.utils.logger import app_logger
+from src.utils.password_hasher import password_hasher
+from src.utils.security import calibrate_password_hashing, password_costs
+from src.utils.token_revocation import run_revocation_sync, token_revocations
 
 # Создание приложения
 app = FastAPI(
@@ -20,7 +29,7 @@ app = FastAPI(
     version=settings.project_version,
     description="API для управления списком задач",
     docs_url="/docs" if settings.debug else None,
-    openapi_url="/openapi.json" if settings.debug else None
+    openapi_url="/openapi.json" if settings.debug else None,
 )
 
 # Middleware для CORS
@@ -34,34 +43,33 @@ app.add_middleware(
 
 # Middleware для проверки доверенных хостов
 if settings.environment == "production":
-    app.add_middleware(
-        TrustedHostMiddleware,
-        allowed_hosts=settings.allowed_hosts
-    )
+    app.add_middleware(TrustedHostMiddleware, allowed_hosts=settings.allowed_hosts)
 
 
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     """Middleware для измерения времени выполнения запросов"""
     start_time = time.time()
-    
+
     # Логируем начало запроса
-    app_logger.info(f"Запрос {request.method} {request.url.path} от {request.client.host}")
-    
+    app_logger.info(
+        f"Запрос {request.method} {request.url.path} от {request.client.host}"
+    )
+
     response = await call_next(request)
-    
+
     # Вычисляем время выполнения
     process_time = time.time() - start_time
-    
+
     # Добавляем заголовок с временем выполнения
     response.headers["X-Process-Time"] = str(process_time)
-    
+
     # Логируем завершение запроса
     app_logger.info(
         f"Запрос {request.method} {request.url.path} завершен за {process_time:.3f}s "
         f"с кодом {response.status_code}"
     )
-    
+
     return response
 
 
@@ -72,14 +80,15 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
         f"HTTP ошибка {exc.status_code}: {exc.detail} "
         f"для {request.method} {request.url.path}"
     )
-    
+
     return JSONResponse(
         status_code=exc.status_code,
         content={
             "error": exc.detail,
             "status_code": exc.status_code,
-            "path": request.url.path
-        }
+            "path": request.url.path,
+        },
+        headers=getattr(exc, "headers", None),
     )
 
 
@@ -89,14 +98,14 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     app_logger.warning(
         f"Ошибка валидации для {request.method} {request.url.path}: {exc.errors()}"
     )
-    
+
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "error": "Ошибка валидации данных",
-            "details": exc.errors(),
-            "path": request.url.path
-        }
+            "details": jsonable_encoder(exc.errors()),
+            "path": request.url.path,
+        },
     )
 
 
@@ -105,15 +114,12 @@ async def general_exception_handler(request: Request, exc: Exception):
     """Общий обработчик исключений"""
     app_logger.error(
         f"Неожиданная ошибка для {request.method} {request.url.path}: {str(exc)}",
-        exc_info=True
+        exc_info=True,
     )
-    
+
     return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        content={
-            "error": "Внутренняя ошибка сервера",
-            "path": request.url.path
-        }
+        content={"error": "Внутренняя ошибка сервера", "path": request.url.path},
     )
 
 
@@ -122,25 +128,54 @@ app.include_router(user_router, prefix=settings.api_v1_prefix)
 app.include_router(category_router, prefix=settings.api_v1_prefix)
 app.include_router(todo_router, prefix=settings.api_v1_prefix)
 app.include_router(notification_router, prefix=settings.api_v1_prefix)
+app.include_router(admin_router, prefix=settings.api_v1_prefix)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Событие запуска приложения"""
-    app_logger.info(f"Запуск приложения {settings.project_name} v{settings.project_version}")
+    app_logger.info(
+        f"Запуск приложения {settings.project_name} v{settings.project_version}"
+    )
     app_logger.info(f"Окружение: {settings.environment}")
-    
+
     # Проверяем соединение с базой данных
     if check_db_connection():
         app_logger.info("Приложение готово к работе")
     else:
         app_logger.error("Не удалось подключиться к базе данных")
 
+    # Калибровка стоимости хеширования паролей - один раз на процесс
+    if not password_costs:
+        await asyncio.to_thread(calibrate_password_hashing)
+
+    if cache_manager.enabled and settings.cache_janitor_interval > 0:
+        app.state.cache_janitor = asyncio.create_task(
+            run_cache_janitor(settings.cache_janitor_interval)
+        )
+
+    # Фильтр отзывов токенов: загрузить отзывы из Redis и обновлять их в фоне
+    if cache_manager.enabled:
+        await token_revocations.sync()
+        token_revocations.start_listener()
+        app.state.revocation_sync = asyncio.create_task(
+            run_revocation_sync(settings.token_revocation_sync_interval)
+        )
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Событие остановки приложения"""
     app_logger.info("Остановка приложения")
+    janitor = getattr(app.state, "cache_janitor", None)
+    if janitor is not None:
+        janitor.cancel()
+    revocation_sync = getattr(app.state, "revocation_sync", None)
+    if revocation_sync is not None:
+        revocation_sync.cancel()
+    token_revocations.stop_listener()
+    cache_manager.close()
+    await cache_manager.aclose()
 
 
 @app.get("/", tags=["root"])
@@ -151,7 +186,7 @@ async def root():
         "version": settings.project_version,
         "environment": settings.environment,
         "docs": "/docs" if settings.debug else None,
-        "health": "/health"
+        "health": "/health",
     }
 
 
@@ -159,16 +194,27 @@ async def root():
 async def health_check():
     """Проверка состояния приложения"""
     db_status = check_db_connection()
-    
+
     return {
         "status": "healthy" if db_status else "unhealthy",
         "timestamp": time.time(),
         "version": settings.project_version,
         "environment": settings.environment,
-        "database": "connected" if db_status else "disconnected"
+        "database": "connected" if db_status else "disconnected",
     }
 
 
+@app.get("/metrics", tags=["health"], response_class=PlainTextResponse)
+async def metrics():
+    """Метрики процесса в текстовом формате Prometheus"""
+    return PlainTextResponse(
+        cache_manager.render_metrics()
+        + "\n".join(password_hasher.render_prometheus())
+        + "\n",
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 @app.get("/info", tags=["info"])
 async def app_info():
     """Информация о приложении"""
@@ -178,17 +224,21 @@ async def app_info():
         "environment": settings.environment,
         "debug": settings.debug,
         "cache_enabled": settings.cache_enabled,
-        "database_url": settings.database_url.split("@")[-1] if "@" in settings.database_url else "hidden"
+        "database_url": (
+            settings.database_url.split("@")[-1]
+            if "@" in settings.database_url
+            else "hidden"
+        ),
     }
 
 
 if __name__ == "__main__":
     import uvicorn
-    
+
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
         reload=settings.debug,
-        log_level=settings.log_level.lower()
+        log_level=settings.log_level.lower(),
     )
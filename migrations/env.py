@@ -1,17 +1,19 @@
-from logging.config import fileConfig
-from sqlalchemy import engine_from_config
-from sqlalchemy import pool
-from alembic import context
 import os
 import sys
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
 
 # Добавляем путь к src в sys.path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
 
-from src.utils.db import Base
-from src.user.models import User
+import src.notifications.models  # noqa: F401 - таблица notifications в Base.metadata
 from src.category.models import Category
+from src.config import settings
 from src.todo.models import Todo
+from src.user.models import User
+from src.utils.db import Base
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -22,6 +24,10 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# URL базы берется из настроек приложения (DATABASE_URL), если не задан явно
+if config.get_main_option("sqlalchemy.url") in (None, "", "${DATABASE_URL}"):
+    config.set_main_option("sqlalchemy.url", settings.database_url)
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 target_metadata = Base.metadata
@@ -70,9 +76,7 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata
-        )
+        context.configure(connection=connection, target_metadata=target_metadata)
 
         with context.begin_transaction():
             context.run_migrations()
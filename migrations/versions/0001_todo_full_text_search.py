@@ -0,0 +1,74 @@
+"""Полнотекстовый поиск по задачам
+
+PostgreSQL: generated-колонка todos.search_vector (tsvector) с GIN-индексом.
+SQLite: FTS5-таблица todos_fts с внешним содержимым и триггерами синхронизации.
+
+Базовые таблицы создаются init_db.py (Base.metadata.create_all).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        op.execute(
+            "ALTER TABLE todos ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+            ") STORED"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_todos_search_vector ON todos USING GIN (search_vector)"
+        )
+
+    elif dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5("
+            "title, description, content='todos', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS todos_fts_ai AFTER INSERT ON todos BEGIN "
+            "INSERT INTO todos_fts(rowid, title, description) "
+            "VALUES (new.id, new.title, new.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS todos_fts_ad AFTER DELETE ON todos BEGIN "
+            "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+            "VALUES ('delete', old.id, old.title, old.description); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS todos_fts_au AFTER UPDATE OF title, description ON todos BEGIN "
+            "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+            "VALUES ('delete', old.id, old.title, old.description); "
+            "INSERT INTO todos_fts(rowid, title, description) "
+            "VALUES (new.id, new.title, new.description); END"
+        )
+        # Индексируем уже существующие задачи
+        op.execute("INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_todos_search_vector")
+        op.execute("ALTER TABLE todos DROP COLUMN IF EXISTS search_vector")
+
+    elif dialect == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS todos_fts_au")
+        op.execute("DROP TRIGGER IF EXISTS todos_fts_ad")
+        op.execute("DROP TRIGGER IF EXISTS todos_fts_ai")
+        op.execute("DROP TABLE IF EXISTS todos_fts")
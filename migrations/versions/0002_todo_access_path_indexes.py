@@ -0,0 +1,69 @@
+"""Составные и частичные индексы для основных выборок задач и уведомлений
+
+В PostgreSQL индексы создаются CONCURRENTLY, чтобы не блокировать запись.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+OPEN_DEADLINE_CONDITION = (
+    "deadline IS NOT NULL AND status IN ('PENDING', 'IN_PROGRESS')"
+)
+
+# (имя, таблица, колонки, условие частичного индекса)
+INDEXES = [
+    ("ix_todos_user_created_id", "todos", ["user_id", "created_at", "id"], None),
+    ("ix_todos_user_deadline_id", "todos", ["user_id", "deadline", "id"], None),
+    ("ix_todos_user_status", "todos", ["user_id", "status"], None),
+    ("ix_todos_user_category", "todos", ["user_id", "category_id"], None),
+    (
+        "ix_todos_user_open_deadline",
+        "todos",
+        ["user_id", "deadline"],
+        OPEN_DEADLINE_CONDITION,
+    ),
+    (
+        "ix_notifications_user_read_created",
+        "notifications",
+        ["user_id", "is_read", "created_at"],
+        None,
+    ),
+]
+
+
+def upgrade() -> None:
+    is_postgresql = op.get_bind().dialect.name == "postgresql"
+
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                if_not_exists=True,
+                postgresql_concurrently=is_postgresql,
+                postgresql_where=sa.text(where) if where else None,
+                sqlite_where=sa.text(where) if where else None,
+            )
+
+
+def downgrade() -> None:
+    is_postgresql = op.get_bind().dialect.name == "postgresql"
+
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                if_exists=True,
+                postgresql_concurrently=is_postgresql,
+            )
@@ -0,0 +1,52 @@
+"""Счетчики задач пользователя по статусам (todo_counters)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "todo_counters",
+        sa.Column(
+            "user_id",
+            sa.Integer(),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column("total", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("pending", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("in_progress", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("completed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cancelled", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()
+        ),
+        if_not_exists=True,
+    )
+
+    # Заполняем по текущим данным одним проходом по задачам
+    op.execute(
+        "INSERT INTO todo_counters (user_id, total, pending, in_progress, completed, cancelled) "
+        "SELECT user_id, COUNT(*), "
+        "SUM(CASE WHEN status = 'PENDING' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN status = 'IN_PROGRESS' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN status = 'COMPLETED' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN status = 'CANCELLED' THEN 1 ELSE 0 END) "
+        "FROM todos "
+        "WHERE user_id NOT IN (SELECT user_id FROM todo_counters) "
+        "GROUP BY user_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("todo_counters")
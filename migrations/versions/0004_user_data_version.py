@@ -0,0 +1,36 @@
+"""Версия данных пользователя для ETag (users.data_version)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def _has_data_version() -> bool:
+    # init_db.py (create_all) уже создает колонку на новой базе
+    columns = sa.inspect(op.get_bind()).get_columns("users")
+    return any(column["name"] == "data_version" for column in columns)
+
+
+def upgrade() -> None:
+    if _has_data_version():
+        return
+    op.add_column(
+        "users",
+        sa.Column("data_version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    if not _has_data_version():
+        return
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("data_version")
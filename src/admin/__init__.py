@@ -0,0 +1 @@
+# Административные эндпоинты
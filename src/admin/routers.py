@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from src.user.models import User
+from src.utils.cache import cache_manager
+from src.utils.logger import app_logger
+from src.utils.permissions import admin_required
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/cache/metrics")
+async def get_cache_metrics(
+    top: int = Query(
+        20, ge=1, le=200, description="Сколько частых и крупных ключей показать"
+    ),
+    current_user: User = Depends(admin_required),
+):
+    """Метрики кэша: hit ratio по пространствам имен, задержки, размеры значений, частые и крупные ключи"""
+    try:
+        return cache_manager.get_metrics(top_keys=top)
+    except Exception as e:
+        app_logger.error(f"Ошибка при получении метрик кэша: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Внутренняя ошибка сервера",
+        )
+
+
+@router.post("/cache/metrics/reset")
+async def reset_cache_metrics(current_user: User = Depends(admin_required)):
+    """Сбросить метрики кэша этого процесса"""
+    cache_manager.metrics.reset()
+    return {"message": "Метрики кэша сброшены"}
@@ -0,0 +1,64 @@
+"""Асинхронные версии функций src.category.crud (через AsyncSession.run_sync)"""
+
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.category import crud
+from src.category.models import Category
+from src.category.schemas import CategoryCreate, CategoryUpdate
+from src.utils.cache import run_sync_invalidating
+
+
+async def get_category(
+    db: AsyncSession, category_id: int, user_id: int
+) -> Optional[Category]:
+    """Получить категорию по ID для конкретного пользователя"""
+    return await db.run_sync(crud.get_category, category_id, user_id)
+
+
+async def get_categories(
+    db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100
+) -> List[Category]:
+    """Получить список категорий пользователя"""
+    return await db.run_sync(crud.get_categories, user_id, skip=skip, limit=limit)
+
+
+async def get_categories_with_todo_count(db: AsyncSession, user_id: int) -> List[dict]:
+    """Получить категории с количеством задач"""
+    return await db.run_sync(crud.get_categories_with_todo_count, user_id)
+
+
+async def create_category(
+    db: AsyncSession, category: CategoryCreate, user_id: int
+) -> Optional[Category]:
+    """Создать новую категорию"""
+    return await run_sync_invalidating(db, crud.create_category, category, user_id)
+
+
+async def update_category(
+    db: AsyncSession, category_id: int, category_update: CategoryUpdate, user_id: int
+) -> Optional[Category]:
+    """Обновить категорию"""
+    return await run_sync_invalidating(
+        db, crud.update_category, category_id, category_update, user_id
+    )
+
+
+async def delete_category(db: AsyncSession, category_id: int, user_id: int) -> bool:
+    """Удалить категорию"""
+    return await run_sync_invalidating(db, crud.delete_category, category_id, user_id)
+
+
+async def get_category_by_name(
+    db: AsyncSession, name: str, user_id: int
+) -> Optional[Category]:
+    """Получить категорию по имени"""
+    return await db.run_sync(crud.get_category_by_name, name, user_id)
+
+
+async def get_categories_by_ids(
+    db: AsyncSession, category_ids: List[int], user_id: int
+) -> List[Category]:
+    """Получить категории по списку ID"""
+    return await db.run_sync(crud.get_categories_by_ids, category_ids, user_id)
@@ -1,62 +1,84 @@
-from sqlalchemy.orm import Session
+import logging
+from typing import List, Optional
+
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
 from src.category.models import Category
 from src.category.schemas import CategoryCreate, CategoryUpdate
-from typing import Optional, List
-import logging
+from src.todo.counters import rebuild_todo_counters
+from src.user.crud import bump_data_version
+from src.utils.cache import invalidate_after_commit, user_tag, versioned_key
 
 logger = logging.getLogger(__name__)
 
 
+def category_item_key(user_id: int, generation: int, category_id: int) -> str:
+    """Ключ кэша названия и цвета категории в поколении категорий пользователя"""
+    return versioned_key(
+        user_tag(user_id, "categories"), generation, f"category:{category_id}"
+    )
+
+
 def get_category(db: Session, category_id: int, user_id: int) -> Optional[Category]:
     """Получить категорию по ID для конкретного пользователя"""
-    return db.query(Category).filter(
-        Category.id == category_id,
-        Category.user_id == user_id
-    ).first()
+    return (
+        db.query(Category)
+        .filter(Category.id == category_id, Category.user_id == user_id)
+        .first()
+    )
 
 
-def get_categories(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[Category]:
+def get_categories(
+    db: Session, user_id: int, skip: int = 0, limit: int = 100
+) -> List[Category]:
     """Получить список категорий пользователя с пагинацией"""
-    return db.query(Category).filter(
-        Category.user_id == user_id
-    ).offset(skip).limit(limit).all()
+    return (
+        db.query(Category)
+        .filter(Category.user_id == user_id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
 
 
 def get_categories_with_todo_count(db: Session, user_id: int) -> List[dict]:
     """Получить категории с количеством задач в каждой"""
-    result = db.query(
-        Category,
-        func.count(Category.todos).label('todo_count')
-    ).outerjoin(Category.todos).filter(
-        Category.user_id == user_id
-    ).group_by(Category.id).all()
-    
+    result = (
+        db.query(Category, func.count(Category.todos).label("todo_count"))
+        .outerjoin(Category.todos)
+        .filter(Category.user_id == user_id)
+        .group_by(Category.id)
+        .all()
+    )
+
     return [
-        {
-            **category.__dict__,
-            'todo_count': todo_count
-        }
+        {**category.__dict__, "todo_count": todo_count}
         for category, todo_count in result
     ]
 
 
-def create_category(db: Session, category: CategoryCreate, user_id: int) -> Optional[Category]:
+def create_category(
+    db: Session, category: CategoryCreate, user_id: int
+) -> Optional[Category]:
     """Создать новую категорию"""
     try:
-        db_category = Category(
-            **category.dict(),
-            user_id=user_id
-        )
+        db_category = Category(**category.dict(), user_id=user_id)
         db.add(db_category)
+        bump_data_version(db, user_id)
+        invalidate_after_commit(db, user_tag(user_id, "categories"))
         db.commit()
         db.refresh(db_category)
-        logger.info(f"Создана новая категория: {category.name} для пользователя {user_id}")
+        logger.info(
+            f"Создана новая категория: {category.name} для пользователя {user_id}"
+        )
         return db_category
     except IntegrityError:
         db.rollback()
-        logger.warning(f"Попытка создать категорию с существующим именем: {category.name}")
+        logger.warning(
+            f"Попытка создать категорию с существующим именем: {category.name}"
+        )
         return None
     except Exception as e:
         db.rollback()
@@ -64,20 +86,26 @@ def create_category(db: Session, category: CategoryCreate, user_id: int) -> Opti
         raise
 
 
-def update_category(db: Session, category_id: int, category_update: CategoryUpdate, user_id: int) -> Optional[Category]:
+def update_category(
+    db: Session, category_id: int, category_update: CategoryUpdate, user_id: int
+) -> Optional[Category]:
     """Обновить категорию"""
     try:
         db_category = get_category(db, category_id, user_id)
         if not db_category:
             return None
-        
+
         update_data = category_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_category, field, value)
-        
+
+        bump_data_version(db, user_id)
+        invalidate_after_commit(db, user_tag(user_id, "categories"))
         db.commit()
         db.refresh(db_category)
-        logger.info(f"Обновлена категория: {db_category.name} для пользователя {user_id}")
+        logger.info(
+            f"Обновлена категория: {db_category.name} для пользователя {user_id}"
+        )
         return db_category
     except Exception as e:
         db.rollback()
@@ -91,8 +119,16 @@ def delete_category(db: Session, category_id: int, user_id: int) -> bool:
         db_category = get_category(db, category_id, user_id)
         if not db_category:
             return False
-        
+
         db.delete(db_category)
+        # Задачи категории удаляются каскадом: пересчитываем счетчики в той же транзакции
+        if db_category.todos:
+            db.flush()
+            rebuild_todo_counters(db, user_id)
+        bump_data_version(db, user_id)
+        invalidate_after_commit(
+            db, user_tag(user_id, "categories"), user_tag(user_id, "todos")
+        )
         db.commit()
         logger.info(f"Удалена категория: {db_category.name} для пользователя {user_id}")
         return True
@@ -104,15 +140,19 @@ def delete_category(db: Session, category_id: int, user_id: int) -> bool:
 
 def get_category_by_name(db: Session, name: str, user_id: int) -> Optional[Category]:
     """Получить категорию по имени для конкретного пользователя"""
-    return db.query(Category).filter(
-        Category.name == name,
-        Category.user_id == user_id
-    ).first()
+    return (
+        db.query(Category)
+        .filter(Category.name == name, Category.user_id == user_id)
+        .first()
+    )
 
 
-def get_categories_by_ids(db: Session, category_ids: List[int], user_id: int) -> List[Category]:
+def get_categories_by_ids(
+    db: Session, category_ids: List[int], user_id: int
+) -> List[Category]:
     """Получить категории по списку ID для конкретного пользователя"""
-    return db.query(Category).filter(
-        Category.id.in_(category_ids),
-        Category.user_id == user_id
-    ).all()
+    return (
+        db.query(Category)
+        .filter(Category.id.in_(category_ids), Category.user_id == user_id)
+        .all()
+    )
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import logging
 from typing import List
-from src.category import crud, schemas
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.category import async_crud, schemas
+from src.config import settings
+from src.user import async_crud as user_async_crud
 from src.user.schemas import User
-from src.utils.db import get_db
+from src.utils.cache import cached
+from src.utils.db import get_async_db
+from src.utils.etag import data_etag, etag_headers, etag_matches, not_modified
 from src.utils.permissions import get_current_active_user
-import logging
 
 logger = logging.getLogger(__name__)
 
@@ -16,70 +22,123 @@ router = APIRouter(prefix="/categories", tags=["categories"])
 async def create_category(
     category: schemas.CategoryCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Создать новую категорию"""
     try:
         # Проверяем, не существует ли уже категория с таким именем
-        existing_category = crud.get_category_by_name(db, category.name, current_user.id)
+        existing_category = await async_crud.get_category_by_name(
+            db, category.name, current_user.id
+        )
         if existing_category:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Категория с таким именем уже существует"
+                detail="Категория с таким именем уже существует",
             )
-        
-        db_category = crud.create_category(db=db, category=category, user_id=current_user.id)
+
+        db_category = await async_crud.create_category(
+            db=db, category=category, user_id=current_user.id
+        )
         if not db_category:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Ошибка при создании категории"
+                detail="Ошибка при создании категории",
             )
-        
+
         return db_category
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при создании категории: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
+@cached(
+    ttl=settings.cache_categories_ttl,
+    tags=("user:{user_id}", "user:{user_id}:categories"),
+)
+async def _categories(
+    db: AsyncSession, user_id: int, skip: int, limit: int
+) -> List[dict]:
+    """Категории пользователя в виде словарей схемы (ORM-объекты не кэшируются)"""
+    categories = await async_crud.get_categories(
+        db, user_id=user_id, skip=skip, limit=limit
+    )
+    return [
+        schemas.Category.model_validate(category).model_dump()
+        for category in categories
+    ]
+
+
+@cached(
+    ttl=settings.cache_categories_ttl,
+    tags=("user:{user_id}", "user:{user_id}:categories", "user:{user_id}:todos"),
+)
+async def _categories_with_counts(db: AsyncSession, user_id: int) -> List[dict]:
+    """Категории с количеством задач: зависят и от категорий, и от задач"""
+    categories = await async_crud.get_categories_with_todo_count(db, user_id=user_id)
+    return [
+        schemas.CategoryWithTodoCount.model_validate(category).model_dump()
+        for category in categories
+    ]
+
+
 @router.get("/", response_model=List[schemas.Category])
 async def read_categories(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить список категорий пользователя"""
     try:
-        categories = crud.get_categories(db, user_id=current_user.id, skip=skip, limit=limit)
+        data_version = await user_async_crud.get_data_version(db, current_user.id)
+        etag = data_etag(request, current_user.id, data_version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        categories = await _categories(
+            db, user_id=current_user.id, skip=skip, limit=limit
+        )
+        response.headers.update(etag_headers(etag))
         return categories
     except Exception as e:
         logger.error(f"Ошибка при получении категорий: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
 @router.get("/with-counts", response_model=List[schemas.CategoryWithTodoCount])
 async def read_categories_with_counts(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить категории с количеством задач в каждой"""
     try:
-        categories = crud.get_categories_with_todo_count(db, user_id=current_user.id)
+        # Версия данных учитывает и изменения задач, поэтому количество актуально
+        data_version = await user_async_crud.get_data_version(db, current_user.id)
+        etag = data_etag(request, current_user.id, data_version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        categories = await _categories_with_counts(db, user_id=current_user.id)
+        response.headers.update(etag_headers(etag))
         return categories
     except Exception as e:
         logger.error(f"Ошибка при получении категорий с количеством задач: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
@@ -87,15 +146,16 @@ async def read_categories_with_counts(
 async def read_category(
     category_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить категорию по ID"""
     try:
-        category = crud.get_category(db, category_id=category_id, user_id=current_user.id)
+        category = await async_crud.get_category(
+            db, category_id=category_id, user_id=current_user.id
+        )
         if category is None:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Категория не найдена"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Категория не найдена"
             )
         return category
     except HTTPException:
@@ -104,7 +164,7 @@ async def read_category(
         logger.error(f"Ошибка при получении категории: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
@@ -113,40 +173,41 @@ async def update_category(
     category_id: int,
     category_update: schemas.CategoryUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Обновить категорию"""
     try:
         # Проверяем, не существует ли уже категория с таким именем
         if category_update.name:
-            existing_category = crud.get_category_by_name(db, category_update.name, current_user.id)
+            existing_category = await async_crud.get_category_by_name(
+                db, category_update.name, current_user.id
+            )
             if existing_category and existing_category.id != category_id:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Категория с таким именем уже существует"
+                    detail="Категория с таким именем уже существует",
                 )
-        
-        db_category = crud.update_category(
-            db=db, 
-            category_id=category_id, 
-            category_update=category_update, 
-            user_id=current_user.id
+
+        db_category = await async_crud.update_category(
+            db=db,
+            category_id=category_id,
+            category_update=category_update,
+            user_id=current_user.id,
         )
         if not db_category:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Категория не найдена"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Категория не найдена"
             )
-        
+
         return db_category
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при обновлении категории: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
@@ -154,24 +215,25 @@ async def update_category(
 async def delete_category(
     category_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Удалить категорию"""
     try:
-        success = crud.delete_category(db=db, category_id=category_id, user_id=current_user.id)
+        success = await async_crud.delete_category(
+            db=db, category_id=category_id, user_id=current_user.id
+        )
         if not success:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Категория не найдена"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Категория не найдена"
             )
-        
+
         return {"message": "Категория успешно удалена"}
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при удалении категории: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
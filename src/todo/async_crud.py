@@ -0,0 +1,259 @@
+"""Асинхронные версии функций src.todo.crud
+
+Логика запросов общая с синхронным модулем: функции выполняются через
+AsyncSession.run_sync, где ввод-вывод асинхронного драйвера (asyncpg/aiosqlite)
+ожидается без блокировки event loop.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.todo import crud
+from src.todo.models import Todo, TodoStatus
+from src.todo.schemas import TodoCreate, TodoUpdate
+from src.utils.cache import cache_manager, run_sync_invalidating, user_tag
+
+
+async def get_todo(db: AsyncSession, todo_id: int, user_id: int) -> Optional[Todo]:
+    """Получить задачу по ID для конкретного пользователя"""
+    return await db.run_sync(crud.get_todo, todo_id, user_id)
+
+
+async def get_todos(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    status: Optional[TodoStatus] = None,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+) -> List[Todo]:
+    """Получить список задач пользователя с фильтрацией"""
+    return await db.run_sync(
+        crud.get_todos,
+        user_id,
+        skip=skip,
+        limit=limit,
+        status=status,
+        category_id=category_id,
+        search=search,
+    )
+
+
+async def get_todos_with_category(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    status: Optional[TodoStatus] = None,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    sort: str = "created_at",
+) -> List[dict]:
+    """Получить задачи с информацией о категории"""
+    return await db.run_sync(
+        crud.get_todos_with_category,
+        user_id,
+        skip=skip,
+        limit=limit,
+        status=status,
+        category_id=category_id,
+        search=search,
+        sort=sort,
+    )
+
+
+async def get_todos_keyset(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = 100,
+    after: Optional[Dict[str, Any]] = None,
+    status: Optional[TodoStatus] = None,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    sort: str = "created_at",
+) -> Tuple[List[dict], Optional[Tuple[Any, int]]]:
+    """Страница задач с keyset-пагинацией"""
+    return await db.run_sync(
+        crud.get_todos_keyset,
+        user_id,
+        limit=limit,
+        after=after,
+        status=status,
+        category_id=category_id,
+        search=search,
+        sort=sort,
+    )
+
+
+async def list_todos(
+    db: AsyncSession,
+    user_id: int,
+    limit: int = 100,
+    skip: int = 0,
+    after: Optional[Dict[str, Any]] = None,
+    keyset: bool = False,
+    status: Optional[TodoStatus] = None,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    sort: str = "created_at",
+    count: str = "exact",
+    hydrate: bool = False,
+) -> dict:
+    """Страница задач и общее количество по фильтрам одним запросом
+
+    hydrate: выбрать только id страницы, а элементы собрать из кэша
+    (из БД дочитываются только промахи).
+    """
+    page = await db.run_sync(
+        crud.list_todos,
+        user_id,
+        limit=limit,
+        skip=skip,
+        after=after,
+        keyset=keyset,
+        status=status,
+        category_id=category_id,
+        search=search,
+        sort=sort,
+        count=count,
+        ids_only=hydrate,
+    )
+    if hydrate:
+        page["items"] = await hydrate_todo_items(db, user_id, page["items"])
+    return page
+
+
+async def hydrate_todo_items(
+    db: AsyncSession, user_id: int, versions: Dict[int, str]
+) -> List[dict]:
+    """Собрать элементы страницы (id задачи -> версия) из кэша; из БД выбираются только промахи"""
+    category_key = crud.category_key_func(
+        user_id, await cache_manager.aget_generation(user_tag(user_id, "categories"))
+    )
+    keys = {
+        todo_id: crud.todo_item_key(todo_id, version)
+        for todo_id, version in versions.items()
+    }
+    todos = crud.cached_items(
+        list(versions), keys.get, await cache_manager.aget_many(keys.values())
+    )
+    fetched = await db.run_sync(
+        crud.get_todo_items,
+        user_id,
+        [todo_id for todo_id in versions if todo_id not in todos],
+    )
+    todos.update(fetched)
+
+    category_ids = list(
+        dict.fromkeys(
+            todo["category_id"] for todo in todos.values() if todo["category_id"]
+        )
+    )
+    cached = await cache_manager.aget_many(
+        category_key(category_id) for category_id in category_ids
+    )
+    categories = crud.cached_items(category_ids, category_key, cached)
+    fetched_categories = await db.run_sync(
+        crud.get_category_items,
+        user_id,
+        [category_id for category_id in category_ids if category_id not in categories],
+    )
+    categories.update(fetched_categories)
+
+    await cache_manager.aset_many(
+        crud.fetched_item_entries(fetched, fetched_categories, category_key),
+        ttl=settings.cache_todo_item_ttl,
+    )
+    return crud.assemble_todo_items(list(versions), todos, categories)
+
+
+async def get_todos_count(
+    db: AsyncSession,
+    user_id: int,
+    status: Optional[TodoStatus] = None,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+) -> int:
+    """Получить количество задач пользователя"""
+    return await db.run_sync(
+        crud.get_todos_count,
+        user_id,
+        status=status,
+        category_id=category_id,
+        search=search,
+    )
+
+
+async def create_todo(
+    db: AsyncSession, todo: TodoCreate, user_id: int
+) -> Optional[Todo]:
+    """Создать новую задачу"""
+    return await run_sync_invalidating(db, crud.create_todo, todo, user_id)
+
+
+async def update_todo(
+    db: AsyncSession, todo_id: int, todo_update: TodoUpdate, user_id: int
+) -> Optional[Todo]:
+    """Обновить задачу"""
+    return await run_sync_invalidating(
+        db, crud.update_todo, todo_id, todo_update, user_id
+    )
+
+
+async def update_todo_status(
+    db: AsyncSession, todo_id: int, status: TodoStatus, user_id: int
+) -> Optional[Todo]:
+    """Обновить статус задачи"""
+    return await run_sync_invalidating(
+        db, crud.update_todo_status, todo_id, status, user_id
+    )
+
+
+async def delete_todo(db: AsyncSession, todo_id: int, user_id: int) -> bool:
+    """Удалить задачу"""
+    return await run_sync_invalidating(db, crud.delete_todo, todo_id, user_id)
+
+
+async def bulk_create_todos(
+    db: AsyncSession, todos: List[TodoCreate], user_id: int
+) -> List[dict]:
+    """Создать несколько задач одним запросом"""
+    return await run_sync_invalidating(db, crud.bulk_create_todos, todos, user_id)
+
+
+async def bulk_update_todos(
+    db: AsyncSession, operations: list, user_id: int
+) -> List[dict]:
+    """Применить пакет операций update/status/delete в одной транзакции"""
+    return await run_sync_invalidating(db, crud.bulk_update_todos, operations, user_id)
+
+
+async def get_todo_stats(db: AsyncSession, user_id: int) -> dict:
+    """Получить статистику по задачам пользователя"""
+    return await db.run_sync(crud.get_todo_stats, user_id)
+
+
+async def get_todos_by_deadline(
+    db: AsyncSession,
+    user_id: int,
+    deadline_from: Optional[datetime] = None,
+    deadline_to: Optional[datetime] = None,
+) -> List[Todo]:
+    """Получить задачи по диапазону дедлайнов"""
+    return await db.run_sync(
+        crud.get_todos_by_deadline,
+        user_id,
+        deadline_from=deadline_from,
+        deadline_to=deadline_to,
+    )
+
+
+async def get_todos_by_category(
+    db: AsyncSession, user_id: int, category_id: int
+) -> List[Todo]:
+    """Получить задачи по категории"""
+    return await db.run_sync(crud.get_todos_by_category, user_id, category_id)
@@ -0,0 +1,165 @@
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from src.todo.models import Todo, TodoCounter, TodoStatus
+
+logger = logging.getLogger(__name__)
+
+# Колонка счетчика для каждого статуса
+STATUS_COLUMNS = {
+    TodoStatus.PENDING: "pending",
+    TodoStatus.IN_PROGRESS: "in_progress",
+    TodoStatus.COMPLETED: "completed",
+    TodoStatus.CANCELLED: "cancelled",
+}
+
+COUNTER_FIELDS = ("total",) + tuple(STATUS_COLUMNS.values())
+
+OPEN_STATUSES = (TodoStatus.PENDING, TodoStatus.IN_PROGRESS)
+
+
+def adjust_todo_counters(
+    db: Session,
+    user_id: int,
+    added: Iterable[TodoStatus] = (),
+    removed: Iterable[TodoStatus] = (),
+) -> None:
+    """Изменить счетчики пользователя на добавленные/удаленные статусы задач
+
+    Вызывается после изменения задач и до commit, чтобы счетчики
+    обновлялись в той же транзакции. Смена статуса - это removed=[старый], added=[новый].
+    """
+    # Изменения задач должны быть видны запросам на случай пересчета
+    db.flush()
+
+    deltas = Counter()
+    for status in added:
+        deltas["total"] += 1
+        deltas[STATUS_COLUMNS[TodoStatus(status)]] += 1
+    for status in removed:
+        deltas["total"] -= 1
+        deltas[STATUS_COLUMNS[TodoStatus(status)]] -= 1
+
+    values = {
+        field: getattr(TodoCounter, field) + delta
+        for field, delta in deltas.items()
+        if delta
+    }
+    if not values:
+        return
+
+    # Атомарный инкремент на стороне БД, без чтения текущих значений
+    increment = (
+        update(TodoCounter)
+        .where(TodoCounter.user_id == user_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(increment).rowcount == 0:
+        # Счетчиков еще нет (пользователь до миграции): строим по текущим данным транзакции.
+        # Если строку параллельно создал другой запрос, его значения не включают
+        # наши изменения - применяем их к ней
+        stats = compute_todo_stats(db, user_id)
+        if not _insert_counters(
+            db, user_id, {field: stats[field] for field in COUNTER_FIELDS}
+        ):
+            db.execute(increment)
+
+
+def compute_todo_stats(
+    db: Session, user_id: int, now: Optional[datetime] = None
+) -> Dict[str, int]:
+    """Посчитать статистику по таблице задач одним запросом (COUNT ... FILTER)"""
+    now = now or datetime.now(timezone.utc)
+    columns = [func.count().label("total")]
+    columns += [
+        func.count().filter(Todo.status == status).label(column)
+        for status, column in STATUS_COLUMNS.items()
+    ]
+    columns.append(func.count().filter(_overdue_condition(now)).label("overdue"))
+
+    row = db.execute(select(*columns).where(Todo.user_id == user_id)).one()
+    return dict(row._mapping)
+
+
+def count_overdue_todos(
+    db: Session, user_id: int, now: Optional[datetime] = None
+) -> int:
+    """Количество просроченных задач (зависит от времени, поэтому не хранится в счетчиках)"""
+    now = now or datetime.now(timezone.utc)
+    return db.scalar(
+        select(func.count())
+        .select_from(Todo)
+        .where(Todo.user_id == user_id, _overdue_condition(now))
+    )
+
+
+def get_todo_counters(db: Session, user_id: int) -> Optional[Dict[str, int]]:
+    """Прочитать счетчики пользователя (None, если они еще не построены)"""
+    row = db.execute(
+        select(*(getattr(TodoCounter, field) for field in COUNTER_FIELDS)).where(
+            TodoCounter.user_id == user_id
+        )
+    ).first()
+    return dict(row._mapping) if row is not None else None
+
+
+def rebuild_todo_counters(db: Session, user_id: int) -> Dict[str, int]:
+    """Пересчитать счетчики пользователя по таблице задач (без commit)"""
+    stats = compute_todo_stats(db, user_id)
+    values = {field: stats[field] for field in COUNTER_FIELDS}
+
+    overwrite = (
+        update(TodoCounter)
+        .where(TodoCounter.user_id == user_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if db.execute(overwrite).rowcount == 0 and not _insert_counters(
+        db, user_id, values
+    ):
+        db.execute(overwrite)
+
+    logger.info(f"Пересчитаны счетчики задач пользователя {user_id}")
+    return stats
+
+
+def _insert_counters(db: Session, user_id: int, values: Dict[str, int]) -> bool:
+    """Создать строку счетчиков, если ее нет (INSERT ... ON CONFLICT DO NOTHING)
+
+    False - строку уже создал параллельный запрос; IntegrityError при этом не возникает.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        statement = postgresql.insert(TodoCounter).on_conflict_do_nothing(
+            index_elements=["user_id"]
+        )
+    elif dialect == "sqlite":
+        statement = sqlite.insert(TodoCounter).on_conflict_do_nothing(
+            index_elements=["user_id"]
+        )
+    else:
+        statement = insert(TodoCounter)
+    return db.execute(statement.values(user_id=user_id, **values)).rowcount == 1
+
+
+def check_todo_counters(db: Session, user_id: int) -> Dict[str, Dict[str, int]]:
+    """Сравнить счетчики с фактическими данными; возвращает расхождения {поле: {stored, actual}}"""
+    stored = get_todo_counters(db, user_id) or {}
+    actual = compute_todo_stats(db, user_id)
+    return {
+        field: {"stored": stored.get(field), "actual": actual[field]}
+        for field in COUNTER_FIELDS
+        if stored.get(field) != actual[field]
+    }
+
+
+def _overdue_condition(now: datetime):
+    """Открытая задача с прошедшим дедлайном (совпадает с частичным индексом)"""
+    return and_(Todo.deadline < now, Todo.status.in_(OPEN_STATUSES))
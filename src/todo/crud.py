@@ -1,121 +1,503 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+import logging
+from datetime import datetime
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, tuple_, update
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.category.crud import category_item_key
+from src.category.models import Category
+from src.config import settings
+from src.notifications.models import Notification
+from src.todo.counters import (
+    adjust_todo_counters,
+    count_overdue_todos,
+    get_todo_counters,
+    rebuild_todo_counters,
+)
 from src.todo.models import Todo, TodoStatus
 from src.todo.schemas import TodoCreate, TodoUpdate
-from src.category.models import Category
-from typing import Optional, List
-from datetime import datetime
-import logging
+from src.todo.search import order_by_relevance, todo_search_condition
+from src.user.crud import bump_data_version
+from src.utils.cache import (
+    cache_manager,
+    invalidate_after_commit,
+    user_tag,
+    versioned_key,
+)
 
 logger = logging.getLogger(__name__)
 
+# Ключи сортировки, поддерживающие keyset-пагинацию
+TODO_SORT_FIELDS = ("created_at", "deadline")
+
+# Колонки элемента списка задач (поля schemas.TodoWithCategory): выбираются
+# строками без загрузки ORM-объектов
+TODO_ITEM_COLUMNS = (
+    Todo.id,
+    Todo.title,
+    Todo.description,
+    Todo.status,
+    Todo.category_id,
+    Todo.deadline,
+    Todo.user_id,
+    Todo.created_at,
+    Todo.updated_at,
+)
+TODO_ITEM_FIELDS = tuple(column.key for column in TODO_ITEM_COLUMNS)
+TODO_LIST_COLUMNS = TODO_ITEM_COLUMNS + (
+    Category.name.label("category_name"),
+    Category.color.label("category_color"),
+)
+TODO_LIST_FIELDS = tuple(column.key for column in TODO_LIST_COLUMNS)
+
+
+def _apply_todo_filters(
+    query,
+    status: Optional[TodoStatus] = None,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+):
+    """Применить общие фильтры списка задач к запросу"""
+    if status:
+        query = query.filter(Todo.status == status)
+
+    if category_id:
+        query = query.filter(Todo.category_id == category_id)
+
+    if search:
+        query = query.filter(todo_search_condition(query.session, search))
+
+    return query
+
+
+def _apply_todo_sort(query, sort: str = "created_at", search: Optional[str] = None):
+    """Стабильная сортировка: ключ сортировки + id как разрешение ничьих"""
+    if sort == "relevance" and search:
+        return order_by_relevance(query, search)
+    if sort == "deadline":
+        # Задачи без дедлайна идут в конце списка
+        return query.order_by(Todo.deadline.asc().nulls_last(), Todo.id.asc())
+    return query.order_by(Todo.created_at.desc(), Todo.id.desc())
+
 
 def get_todo(db: Session, todo_id: int, user_id: int) -> Optional[Todo]:
     """Получить задачу по ID для конкретного пользователя"""
-    return db.query(Todo).filter(
-        Todo.id == todo_id,
-        Todo.user_id == user_id
-    ).first()
+    return db.query(Todo).filter(Todo.id == todo_id, Todo.user_id == user_id).first()
+
+
+def _lock_todo(db: Session, todo_id: int, user_id: int) -> Optional[Todo]:
+    """Задача для изменения: строка блокируется до конца транзакции
+
+    Без блокировки два параллельных изменения прочитают один и тот же прежний
+    статус и оба вычтут его из счетчиков.
+    """
+    return (
+        db.query(Todo)
+        .filter(Todo.id == todo_id, Todo.user_id == user_id)
+        .with_for_update()
+        .populate_existing()
+        .first()
+    )
 
 
 def get_todos(
-    db: Session, 
-    user_id: int, 
-    skip: int = 0, 
+    db: Session,
+    user_id: int,
+    skip: int = 0,
     limit: int = 100,
     status: Optional[TodoStatus] = None,
     category_id: Optional[int] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
 ) -> List[Todo]:
     """Получить список задач пользователя с фильтрацией"""
     query = db.query(Todo).filter(Todo.user_id == user_id)
-    
-    if status:
-        query = query.filter(Todo.status == status)
-    
-    if category_id:
-        query = query.filter(Todo.category_id == category_id)
-    
-    if search:
-        search_filter = or_(
-            Todo.title.ilike(f"%{search}%"),
-            Todo.description.ilike(f"%{search}%")
-        )
-        query = query.filter(search_filter)
-    
+    query = _apply_todo_filters(query, status, category_id, search)
+
     return query.offset(skip).limit(limit).all()
 
 
 def get_todos_with_category(
-    db: Session, 
-    user_id: int, 
-    skip: int = 0, 
+    db: Session,
+    user_id: int,
+    skip: int = 0,
     limit: int = 100,
     status: Optional[TodoStatus] = None,
     category_id: Optional[int] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    sort: str = "created_at",
 ) -> List[dict]:
     """Получить задачи с информацией о категориях"""
-    query = db.query(
-        Todo,
-        Category.name.label('category_name'),
-        Category.color.label('category_color')
-    ).outerjoin(Category, Todo.category_id == Category.id).filter(
-        Todo.user_id == user_id
+    return list_todos(
+        db,
+        user_id,
+        limit=limit,
+        skip=skip,
+        status=status,
+        category_id=category_id,
+        search=search,
+        sort=sort,
+        count="none",
+    )["items"]
+
+
+def get_todos_keyset(
+    db: Session,
+    user_id: int,
+    limit: int = 100,
+    after: Optional[Dict[str, Any]] = None,
+    status: Optional[TodoStatus] = None,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    sort: str = "created_at",
+) -> Tuple[List[dict], Optional[Tuple[Any, int]]]:
+    """Получить страницу задач после позиции курсора (keyset-пагинация)
+
+    Возвращает элементы страницы и позицию (значение сортировки, id) последнего
+    элемента, если за ней есть еще записи.
+    """
+    page = list_todos(
+        db,
+        user_id,
+        limit=limit,
+        after=after,
+        keyset=True,
+        status=status,
+        category_id=category_id,
+        search=search,
+        sort=sort,
+        count="none",
     )
-    
-    if status:
-        query = query.filter(Todo.status == status)
-    
-    if category_id:
-        query = query.filter(Todo.category_id == category_id)
-    
-    if search:
-        search_filter = or_(
-            Todo.title.ilike(f"%{search}%"),
-            Todo.description.ilike(f"%{search}%")
+    return page["items"], page["next_position"]
+
+
+def list_todos(
+    db: Session,
+    user_id: int,
+    limit: int = 100,
+    skip: int = 0,
+    after: Optional[Dict[str, Any]] = None,
+    keyset: bool = False,
+    status: Optional[TodoStatus] = None,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    sort: str = "created_at",
+    count: str = "exact",
+    ids_only: bool = False,
+) -> dict:
+    """Получить страницу задач и общее количество по тем же фильтрам одним запросом
+
+    count: "exact" - точное количество, "estimate" - количество с ограничением
+    settings.todo_count_cap, "none" - без подсчета. ids_only: элементы страницы -
+    словарь id задачи -> версия строки (без соединения с категориями), для сборки из кэша.
+    """
+    if ids_only:
+        query = db.query(
+            Todo.id, Todo.created_at, Todo.deadline, Todo.updated_at
+        ).filter(Todo.user_id == user_id)
+    else:
+        query = _todos_with_category_query(db, user_id)
+    query = _apply_todo_filters(query, status, category_id, search)
+
+    # Количество считается скалярным подзапросом в том же SQL-выражении, что и страница
+    total_expr = _todo_total_expression(db, user_id, status, category_id, search, count)
+    if total_expr is not None:
+        query = query.add_columns(total_expr.label("total_count"))
+
+    if keyset:
+        # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+        if sort == "deadline":
+            result = _keyset_by_deadline(query, limit + 1, after)
+        else:
+            if after is not None:
+                query = query.filter(
+                    tuple_(Todo.created_at, Todo.id)
+                    < tuple_(after["value"], after["id"])
+                )
+            result = _apply_todo_sort(query, sort).limit(limit + 1).all()
+    else:
+        result = _apply_todo_sort(query, sort, search).offset(skip).limit(limit).all()
+
+    total = None
+    if total_expr is not None:
+        if result:
+            total = result[0].total_count
+        elif skip or after is not None:
+            # Страница за пределами выборки: отдельный запрос только в этом случае
+            total = db.scalar(select(total_expr))
+        else:
+            total = 0
+
+    next_position = None
+    if keyset and len(result) > limit:
+        result = result[:limit]
+        last_row = result[-1]
+        next_position = (getattr(last_row, sort), last_row.id)
+
+    return {
+        "items": _row_versions(result) if ids_only else _rows_to_dicts(result),
+        "total": total,
+        "total_is_estimate": count == "estimate"
+        and total is not None
+        and total >= settings.todo_count_cap,
+        "next_position": next_position,
+    }
+
+
+def _todo_total_expression(
+    db: Session,
+    user_id: int,
+    status: Optional[TodoStatus],
+    category_id: Optional[int],
+    search: Optional[str],
+    count: str,
+):
+    """Скалярный подзапрос количества задач по фильтрам списка"""
+    if count == "none":
+        return None
+
+    if count == "estimate":
+        # Считаем не дальше порога, чтобы стоимость не росла с размером аккаунта
+        capped = db.query(Todo.id).filter(Todo.user_id == user_id)
+        capped = _apply_todo_filters(capped, status, category_id, search)
+        capped = capped.limit(settings.todo_count_cap).subquery()
+        return select(func.count()).select_from(capped).scalar_subquery()
+
+    query = db.query(func.count(Todo.id)).filter(Todo.user_id == user_id)
+    return _apply_todo_filters(query, status, category_id, search).scalar_subquery()
+
+
+def _keyset_by_deadline(query, limit: int, after: Optional[Dict[str, Any]]) -> list:
+    """Keyset-выборка по (deadline, id): сначала задачи с дедлайном, затем без
+
+    Фазы выбираются отдельными запросами, чтобы каждый шел по индексу
+    без OR-условия на NULL.
+    """
+    result = []
+    if after is None or after["value"] is not None:
+        dated = query.filter(Todo.deadline.isnot(None))
+        if after is not None:
+            dated = dated.filter(
+                tuple_(Todo.deadline, Todo.id) > tuple_(after["value"], after["id"])
+            )
+        result = dated.order_by(Todo.deadline.asc(), Todo.id.asc()).limit(limit).all()
+        if len(result) >= limit:
+            return result
+
+    undated = query.filter(Todo.deadline.is_(None))
+    if after is not None and after["value"] is None:
+        undated = undated.filter(Todo.id > after["id"])
+    return result + undated.order_by(Todo.id.asc()).limit(limit - len(result)).all()
+
+
+def _todos_with_category_query(db: Session, user_id: int):
+    """Базовый запрос задач пользователя с данными категории (только колонки элемента списка)"""
+    return (
+        db.query(*TODO_LIST_COLUMNS)
+        .outerjoin(Category, Todo.category_id == Category.id)
+        .filter(Todo.user_id == user_id)
+    )
+
+
+def _rows_to_dicts(result) -> List[dict]:
+    """Преобразовать строки выборки в словари элементов списка
+
+    Колонки идут в порядке TODO_LIST_FIELDS; добавленный в конец total_count
+    отбрасывается zip.
+    """
+    return [dict(zip(TODO_LIST_FIELDS, row)) for row in result]
+
+
+def _row_versions(result) -> Dict[int, str]:
+    """id задачи -> версия строки, в порядке страницы"""
+    return {row.id: todo_version(row.updated_at, row.created_at) for row in result}
+
+
+def todo_item_key(todo_id: int, version: str) -> str:
+    """Ключ кэша полей задачи (без данных категории) в версии строки
+
+    Версия - время последнего изменения: строка, прочитанная до изменения,
+    попадает под прежнюю версию и новым страницам не видна.
+    """
+    return f"todo:{todo_id}:{version}"
+
+
+def todo_version(updated_at: Optional[datetime], created_at: datetime) -> str:
+    """Версия строки задачи для ключа кэша"""
+    return (updated_at or created_at).isoformat()
+
+
+def get_todo_items(db: Session, user_id: int, todo_ids: List[int]) -> Dict[int, dict]:
+    """Поля задач по id одним запросом (без данных категории)"""
+    if not todo_ids:
+        return {}
+    rows = db.query(*TODO_ITEM_COLUMNS).filter(
+        Todo.id.in_(todo_ids), Todo.user_id == user_id
+    )
+    return {row.id: dict(zip(TODO_ITEM_FIELDS, row)) for row in rows}
+
+
+def get_category_items(
+    db: Session, user_id: int, category_ids: List[int]
+) -> Dict[int, dict]:
+    """Название и цвет категорий по id одним запросом"""
+    if not category_ids:
+        return {}
+    rows = db.query(Category.id, Category.name, Category.color).filter(
+        Category.id.in_(category_ids), Category.user_id == user_id
+    )
+    return {row.id: {"name": row.name, "color": row.color} for row in rows}
+
+
+def assemble_todo_items(
+    todo_ids: List[int], todos: Dict[int, dict], categories: Dict[int, dict]
+) -> List[dict]:
+    """Элементы списка в порядке страницы; задачи, удаленные между запросами, пропускаются"""
+    items = []
+    for todo_id in todo_ids:
+        todo = todos.get(todo_id)
+        if todo is None:
+            continue
+        category = categories.get(todo["category_id"]) or {}
+        items.append(
+            {
+                **todo,
+                "category_name": category.get("name"),
+                "category_color": category.get("color"),
+            }
+        )
+    return items
+
+
+def hydrate_todo_items(
+    db: Session, user_id: int, versions: Dict[int, str]
+) -> List[dict]:
+    """Собрать элементы страницы (id задачи -> версия) из кэша; из БД выбираются только промахи"""
+    category_key = category_key_func(
+        user_id, cache_manager.get_generation(user_tag(user_id, "categories"))
+    )
+    keys = {
+        todo_id: todo_item_key(todo_id, version)
+        for todo_id, version in versions.items()
+    }
+    todos = cached_items(
+        list(versions), keys.get, cache_manager.get_many(keys.values())
+    )
+    fetched = get_todo_items(
+        db, user_id, [todo_id for todo_id in versions if todo_id not in todos]
+    )
+    todos.update(fetched)
+
+    category_ids = list(
+        dict.fromkeys(
+            todo["category_id"] for todo in todos.values() if todo["category_id"]
+        )
+    )
+    categories = cached_items(
+        category_ids,
+        category_key,
+        cache_manager.get_many(category_key(i) for i in category_ids),
+    )
+    fetched_categories = get_category_items(
+        db, user_id, [i for i in category_ids if i not in categories]
+    )
+    categories.update(fetched_categories)
+
+    cache_manager.set_many(
+        fetched_item_entries(fetched, fetched_categories, category_key),
+        ttl=settings.cache_todo_item_ttl,
+    )
+    return assemble_todo_items(list(versions), todos, categories)
+
+
+def category_key_func(user_id: int, generation: int) -> Callable[[int], str]:
+    """Ключи категорий в поколении, прочитанном до запроса к БД"""
+    return partial(category_item_key, user_id, generation)
+
+
+def fetched_item_entries(
+    todos: Dict[int, dict], categories: Dict[int, dict], category_key: Callable
+) -> Dict[str, dict]:
+    """Записи кэша для прочитанных из БД задач (под их собственной версией) и категорий"""
+    return {
+        todo_item_key(
+            todo_id, todo_version(todo["updated_at"], todo["created_at"])
+        ): todo
+        for todo_id, todo in todos.items()
+    } | {
+        category_key(category_id): category
+        for category_id, category in categories.items()
+    }
+
+
+def cached_items(ids: List[int], key_func, cached: Dict[str, dict]) -> Dict[int, dict]:
+    """Найденные в кэше записи по id"""
+    return {
+        item_id: cached[key_func(item_id)]
+        for item_id in ids
+        if key_func(item_id) in cached
+    }
+
+
+def iter_todos_for_export(
+    db: Session,
+    user_id: int,
+    status: Optional[TodoStatus] = None,
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    sort: str = "created_at",
+) -> Iterator[tuple]:
+    """Построчно выбрать задачи для экспорта
+
+    Выбираются только колонки (без ORM-объектов в identity map) порциями
+    по yield_per; на PostgreSQL используется серверный курсор.
+    """
+    query = (
+        db.query(
+            Todo.id,
+            Todo.title,
+            Todo.description,
+            Todo.status,
+            Category.name.label("category_name"),
+            Todo.deadline,
+            Todo.created_at,
+            Todo.updated_at,
         )
-        query = query.filter(search_filter)
-    
-    result = query.offset(skip).limit(limit).all()
-    
-    return [
-        {
-            **todo.__dict__,
-            'category_name': category_name,
-            'category_color': category_color
-        }
-        for todo, category_name, category_color in result
-    ]
+        .outerjoin(Category, Todo.category_id == Category.id)
+        .filter(Todo.user_id == user_id)
+    )
+
+    query = _apply_todo_filters(query, status, category_id, search)
+    query = _apply_todo_sort(query, sort, search)
+
+    for row in query.yield_per(settings.todo_export_batch_size):
+        yield tuple(row)
 
 
 def get_todos_count(
-    db: Session, 
+    db: Session,
     user_id: int,
     status: Optional[TodoStatus] = None,
-    category_id: Optional[int] = None
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
 ) -> int:
     """Получить общее количество задач пользователя"""
     query = db.query(Todo).filter(Todo.user_id == user_id)
-    
-    if status:
-        query = query.filter(Todo.status == status)
-    
-    if category_id:
-        query = query.filter(Todo.category_id == category_id)
-    
+    query = _apply_todo_filters(query, status, category_id, search)
+
     return query.count()
 
 
 def create_todo(db: Session, todo: TodoCreate, user_id: int) -> Optional[Todo]:
     """Создать новую задачу"""
     try:
-        db_todo = Todo(
-            **todo.dict(),
-            user_id=user_id
-        )
+        db_todo = Todo(**todo.dict(), user_id=user_id)
         db.add(db_todo)
+        adjust_todo_counters(db, user_id, added=[db_todo.status])
+        bump_data_version(db, user_id)
+        invalidate_after_commit(db, user_tag(user_id, "todos"))
         db.commit()
         db.refresh(db_todo)
         logger.info(f"Создана новая задача: {todo.title} для пользователя {user_id}")
@@ -130,17 +512,27 @@ def create_todo(db: Session, todo: TodoCreate, user_id: int) -> Optional[Todo]:
         raise
 
 
-def update_todo(db: Session, todo_id: int, todo_update: TodoUpdate, user_id: int) -> Optional[Todo]:
+def update_todo(
+    db: Session, todo_id: int, todo_update: TodoUpdate, user_id: int
+) -> Optional[Todo]:
     """Обновить задачу"""
     try:
-        db_todo = get_todo(db, todo_id, user_id)
+        db_todo = _lock_todo(db, todo_id, user_id)
         if not db_todo:
             return None
-        
+
+        old_status = db_todo.status
         update_data = todo_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_todo, field, value)
-        
+
+        if db_todo.status != old_status:
+            adjust_todo_counters(
+                db, user_id, added=[db_todo.status], removed=[old_status]
+            )
+
+        bump_data_version(db, user_id)
+        invalidate_after_commit(db, user_tag(user_id, "todos"))
         db.commit()
         db.refresh(db_todo)
         logger.info(f"Обновлена задача: {db_todo.title} для пользователя {user_id}")
@@ -151,17 +543,27 @@ def update_todo(db: Session, todo_id: int, todo_update: TodoUpdate, user_id: int
         raise
 
 
-def update_todo_status(db: Session, todo_id: int, status: TodoStatus, user_id: int) -> Optional[Todo]:
+def update_todo_status(
+    db: Session, todo_id: int, status: TodoStatus, user_id: int
+) -> Optional[Todo]:
     """Обновить статус задачи"""
     try:
-        db_todo = get_todo(db, todo_id, user_id)
+        db_todo = _lock_todo(db, todo_id, user_id)
         if not db_todo:
             return None
-        
+
+        old_status = db_todo.status
         db_todo.status = status
+        if status != old_status:
+            adjust_todo_counters(db, user_id, added=[status], removed=[old_status])
+
+        bump_data_version(db, user_id)
+        invalidate_after_commit(db, user_tag(user_id, "todos"))
         db.commit()
         db.refresh(db_todo)
-        logger.info(f"Обновлен статус задачи: {db_todo.title} -> {status} для пользователя {user_id}")
+        logger.info(
+            f"Обновлен статус задачи: {db_todo.title} -> {status} для пользователя {user_id}"
+        )
         return db_todo
     except Exception as e:
         db.rollback()
@@ -172,11 +574,14 @@ def update_todo_status(db: Session, todo_id: int, status: TodoStatus, user_id: i
 def delete_todo(db: Session, todo_id: int, user_id: int) -> bool:
     """Удалить задачу"""
     try:
-        db_todo = get_todo(db, todo_id, user_id)
+        db_todo = _lock_todo(db, todo_id, user_id)
         if not db_todo:
             return False
-        
+
         db.delete(db_todo)
+        adjust_todo_counters(db, user_id, removed=[db_todo.status])
+        bump_data_version(db, user_id)
+        invalidate_after_commit(db, user_tag(user_id, "todos"))
         db.commit()
         logger.info(f"Удалена задача: {db_todo.title} для пользователя {user_id}")
         return True
@@ -186,72 +591,223 @@ def delete_todo(db: Session, todo_id: int, user_id: int) -> bool:
         raise
 
 
-def get_todo_stats(db: Session, user_id: int) -> dict:
-    """Получить статистику по задачам пользователя"""
+def bulk_create_todos(db: Session, todos: List[TodoCreate], user_id: int) -> List[dict]:
+    """Создать несколько задач одним многострочным INSERT ... RETURNING
+
+    Возвращает результат по каждому элементу в исходном порядке.
+    """
     try:
-        # Общее количество задач
-        total = db.query(Todo).filter(Todo.user_id == user_id).count()
-        
-        # Количество задач по статусам
-        pending = db.query(Todo).filter(
-            and_(Todo.user_id == user_id, Todo.status == TodoStatus.PENDING)
-        ).count()
-        
-        in_progress = db.query(Todo).filter(
-            and_(Todo.user_id == user_id, Todo.status == TodoStatus.IN_PROGRESS)
-        ).count()
-        
-        completed = db.query(Todo).filter(
-            and_(Todo.user_id == user_id, Todo.status == TodoStatus.COMPLETED)
-        ).count()
-        
-        cancelled = db.query(Todo).filter(
-            and_(Todo.user_id == user_id, Todo.status == TodoStatus.CANCELLED)
-        ).count()
-        
-        # Просроченные задачи
-        overdue = db.query(Todo).filter(
-            and_(
-                Todo.user_id == user_id,
-                Todo.deadline < datetime.utcnow(),
-                Todo.status.in_([TodoStatus.PENDING, TodoStatus.IN_PROGRESS])
+        owned_categories = _owned_category_ids(
+            db, user_id, {todo.category_id for todo in todos if todo.category_id}
+        )
+
+        results = [None] * len(todos)
+        rows, row_indexes = [], []
+        for index, todo in enumerate(todos):
+            if todo.category_id and todo.category_id not in owned_categories:
+                results[index] = _bulk_result(
+                    index, "error", detail="Указанная категория не существует"
+                )
+                continue
+            rows.append({**todo.dict(), "user_id": user_id})
+            row_indexes.append(index)
+
+        if rows:
+            created = db.execute(
+                insert(Todo).returning(
+                    Todo.id, Todo.status, sort_by_parameter_order=True
+                ),
+                rows,
+            ).all()
+            for index, (todo_id, _) in zip(row_indexes, created):
+                results[index] = _bulk_result(index, "created", todo_id)
+
+            adjust_todo_counters(
+                db, user_id, added=[todo_status for _, todo_status in created]
             )
-        ).count()
-        
-        return {
-            "total": total,
-            "pending": pending,
-            "in_progress": in_progress,
-            "completed": completed,
-            "cancelled": cancelled,
-            "overdue": overdue
-        }
+            bump_data_version(db, user_id)
+            invalidate_after_commit(db, user_tag(user_id, "todos"))
+
+        db.commit()
+        logger.info(f"Создано {len(rows)} задач пакетом для пользователя {user_id}")
+        return results
     except Exception as e:
+        db.rollback()
+        logger.error(f"Ошибка при пакетном создании задач: {e}")
+        raise
+
+
+def bulk_update_todos(db: Session, operations: list, user_id: int) -> List[dict]:
+    """Применить пакет операций update/status/delete в одной транзакции
+
+    Операции применяются по порядку; изменения одной задачи объединяются
+    в одну строку executemany UPDATE, удаления выполняются одним DELETE.
+    """
+    try:
+        ids = {operation.id for operation in operations}
+        # Строки блокируются (в порядке id) до коммита: прежние статусы для
+        # счетчиков не изменятся параллельной транзакцией
+        current_status = dict(
+            db.query(Todo.id, Todo.status)
+            .filter(Todo.id.in_(ids), Todo.user_id == user_id)
+            .order_by(Todo.id)
+            .with_for_update()
+            .all()
+        )
+        initial_status = dict(current_status)
+        owned_categories = _owned_category_ids(
+            db,
+            user_id,
+            {
+                operation.fields.category_id
+                for operation in operations
+                if operation.op == "update" and operation.fields.category_id
+            },
+        )
+
+        results = []
+        pending_updates: Dict[int, dict] = {}
+        deleted = set()
+        for index, operation in enumerate(operations):
+            todo_id = operation.id
+            if todo_id not in current_status:
+                results.append(
+                    _bulk_result(index, "error", todo_id, "Задача не найдена")
+                )
+                continue
+
+            if operation.op == "delete":
+                del current_status[todo_id]
+                pending_updates.pop(todo_id, None)
+                deleted.add(todo_id)
+                results.append(_bulk_result(index, "deleted", todo_id))
+                continue
+
+            if operation.op == "status":
+                changes = {"status": operation.status}
+            else:
+                changes = operation.fields.dict(exclude_unset=True)
+                if (
+                    changes.get("category_id")
+                    and changes["category_id"] not in owned_categories
+                ):
+                    results.append(
+                        _bulk_result(
+                            index, "error", todo_id, "Указанная категория не существует"
+                        )
+                    )
+                    continue
+
+            if changes.get("status") is not None:
+                current_status[todo_id] = changes["status"]
+            pending_updates.setdefault(todo_id, {}).update(changes)
+            results.append(_bulk_result(index, "updated", todo_id))
+
+        if pending_updates:
+            db.execute(
+                update(Todo),
+                [
+                    {"id": todo_id, **changes}
+                    for todo_id, changes in pending_updates.items()
+                ],
+            )
+
+        if deleted:
+            # Bulk DELETE обходит ORM-каскад, поэтому уведомления удаляем явно
+            db.execute(delete(Notification).where(Notification.todo_id.in_(deleted)))
+            db.execute(
+                delete(Todo).where(Todo.id.in_(deleted), Todo.user_id == user_id)
+            )
+
+        changed = set(pending_updates) | deleted
+        adjust_todo_counters(
+            db,
+            user_id,
+            added=[
+                current_status[todo_id]
+                for todo_id in changed
+                if todo_id in current_status
+            ],
+            removed=[initial_status[todo_id] for todo_id in changed],
+        )
+        if changed:
+            bump_data_version(db, user_id)
+            invalidate_after_commit(db, user_tag(user_id, "todos"))
+
+        db.commit()
+        logger.info(
+            f"Пакетно обновлено {len(pending_updates)} и удалено {len(deleted)} задач "
+            f"для пользователя {user_id}"
+        )
+        return results
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ошибка при пакетном обновлении задач: {e}")
+        raise
+
+
+def _owned_category_ids(db: Session, user_id: int, category_ids: set) -> set:
+    """Проверить принадлежность категорий пользователю одним запросом"""
+    if not category_ids:
+        return set()
+    return {
+        category_id
+        for category_id, in db.query(Category.id).filter(
+            Category.id.in_(category_ids), Category.user_id == user_id
+        )
+    }
+
+
+def _bulk_result(
+    index: int, result: str, todo_id: Optional[int] = None, detail: Optional[str] = None
+) -> dict:
+    """Результат одной операции пакетного запроса"""
+    return {"index": index, "id": todo_id, "result": result, "detail": detail}
+
+
+def get_todo_stats(db: Session, user_id: int) -> dict:
+    """Получить статистику по задачам пользователя
+
+    Счетчики по статусам читаются из todo_counters по первичному ключу;
+    просроченные задачи считаются по частичному индексу открытых задач с дедлайном.
+    """
+    try:
+        counters = get_todo_counters(db, user_id)
+        if counters is None:
+            # Счетчики еще не построены: считаем одним запросом и сохраняем
+            stats = rebuild_todo_counters(db, user_id)
+            db.commit()
+            return stats
+
+        return {**counters, "overdue": count_overdue_todos(db, user_id)}
+    except Exception as e:
+        db.rollback()
         logger.error(f"Ошибка при получении статистики задач: {e}")
         raise
 
 
 def get_todos_by_deadline(
-    db: Session, 
-    user_id: int, 
+    db: Session,
+    user_id: int,
     deadline_from: Optional[datetime] = None,
-    deadline_to: Optional[datetime] = None
+    deadline_to: Optional[datetime] = None,
 ) -> List[Todo]:
     """Получить задачи по диапазону дедлайнов"""
     query = db.query(Todo).filter(Todo.user_id == user_id)
-    
+
     if deadline_from:
         query = query.filter(Todo.deadline >= deadline_from)
-    
+
     if deadline_to:
         query = query.filter(Todo.deadline <= deadline_to)
-    
+
     return query.all()
 
 
 def get_todos_by_category(db: Session, user_id: int, category_id: int) -> List[Todo]:
     """Получить все задачи определенной категории"""
-    return db.query(Todo).filter(
-        Todo.user_id == user_id,
-        Todo.category_id == category_id
-    ).all()
+    return (
+        db.query(Todo)
+        .filter(Todo.user_id == user_id, Todo.category_id == category_id)
+        .all()
+    )
@@ -0,0 +1,90 @@
+import csv
+import io
+import tempfile
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Iterable, Iterator
+
+from openpyxl import Workbook
+
+# Заголовки колонок в порядке crud.iter_todos_for_export
+EXPORT_HEADERS = (
+    "ID",
+    "Название",
+    "Описание",
+    "Статус",
+    "Категория",
+    "Дедлайн",
+    "Создана",
+    "Обновлена",
+)
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Сколько строк CSV накапливать перед отправкой клиенту
+CSV_FLUSH_ROWS = 500
+XLSX_CHUNK_SIZE = 64 * 1024
+
+
+def stream_csv(rows: Iterable[tuple]) -> Iterator[bytes]:
+    """Отдавать CSV порциями по мере чтения строк"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открывал UTF-8 с кириллицей без выбора кодировки
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_HEADERS)
+
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % CSV_FLUSH_ROWS == 0:
+            yield _drain(buffer)
+
+    yield _drain(buffer)
+
+
+def stream_xlsx(rows: Iterable[tuple]) -> Iterator[bytes]:
+    """Собрать XLSX в write-only режиме и отдать файл порциями
+
+    Write-only лист пишет строки во временный файл, поэтому память не зависит
+    от числа задач; готовый архив также читается с диска по частям.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Задачи")
+    sheet.append(EXPORT_HEADERS)
+    for row in rows:
+        sheet.append([_xlsx_value(value) for value in row])
+
+    with tempfile.TemporaryFile() as output:
+        workbook.save(output)
+        output.seek(0)
+        while chunk := output.read(XLSX_CHUNK_SIZE):
+            yield chunk
+
+
+def _drain(buffer: io.StringIO) -> bytes:
+    """Забрать накопленный текст из буфера и очистить его"""
+    data = buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def _csv_value(value):
+    """Привести значение к виду для CSV"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _xlsx_value(value):
+    """Привести значение к виду для XLSX (Excel не хранит часовой пояс)"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
@@ -1,7 +1,22 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Enum
+import enum
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    DDL,
+    Column,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    event,
+    text,
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-import enum
+
 from src.utils.db import Base
 
 
@@ -12,9 +27,15 @@ class TodoStatus(str, enum.Enum):
     CANCELLED = "cancelled"
 
 
+# Условие частичного индекса открытых задач с дедлайном (Enum хранится по имени)
+OPEN_DEADLINE_CONDITION = (
+    "deadline IS NOT NULL AND status IN ('PENDING', 'IN_PROGRESS')"
+)
+
+
 class Todo(Base):
     __tablename__ = "todos"
-    
+
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     description = Column(Text, nullable=True)
@@ -22,10 +43,117 @@ class Todo(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
     deadline = Column(DateTime(timezone=True), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    
+    # Значение с микросекундами задается приложением: (created_at, id) служит
+    # ключом keyset-пагинации и должно сравниваться одинаково во всех СУБД
+    created_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        server_default=func.now(),
+    )
+    # Тоже с микросекундами: служит версией строки в ключе кэша элемента списка
+    updated_at = Column(
+        DateTime(timezone=True), onupdate=lambda: datetime.now(timezone.utc)
+    )
+
     # Relationships
     user = relationship("User", back_populates="todos")
     category = relationship("Category", back_populates="todos")
-    notifications = relationship("Notification", back_populates="todo", cascade="all, delete-orphan")
+    notifications = relationship(
+        "Notification", back_populates="todo", cascade="all, delete-orphan"
+    )
+
+    __table_args__ = (
+        # Индексы для keyset-пагинации по (created_at, id) и (deadline, id);
+        # второй также обслуживает выборки по диапазону дедлайнов
+        Index("ix_todos_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_todos_user_deadline_id", "user_id", "deadline", "id"),
+        # Фильтры списка и статистики
+        Index("ix_todos_user_status", "user_id", "status"),
+        Index("ix_todos_user_category", "user_id", "category_id"),
+        # Открытые задачи с дедлайном: просроченные и приближающиеся дедлайны
+        Index(
+            "ix_todos_user_open_deadline",
+            "user_id",
+            "deadline",
+            postgresql_where=text(OPEN_DEADLINE_CONDITION),
+            sqlite_where=text(OPEN_DEADLINE_CONDITION),
+        ),
+    )
+
+
+class TodoCounter(Base):
+    """Счетчики задач пользователя по статусам, обновляются в транзакции изменения задач"""
+
+    __tablename__ = "todo_counters"
+
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    total = Column(Integer, nullable=False, default=0)
+    pending = Column(Integer, nullable=False, default=0)
+    in_progress = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    # Relationships
+    user = relationship("User", back_populates="todo_counter")
+
+
+# Полнотекстовый поиск по названию и описанию.
+# PostgreSQL: generated-колонка tsvector с GIN-индексом, всегда согласована со строкой.
+# SQLite: FTS5-таблица с внешним содержимым, синхронизируемая триггерами.
+TODO_SEARCH_CONFIG = "simple"
+TODO_FTS_TABLE = "todos_fts"
+
+_pg_search_ddl = [
+    DDL(
+        "ALTER TABLE todos ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ("
+        f"setweight(to_tsvector('{TODO_SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('{TODO_SEARCH_CONFIG}', coalesce(description, '')), 'B')"
+        ") STORED"
+    ),
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_todos_search_vector ON todos USING GIN (search_vector)"
+    ),
+]
+
+_sqlite_search_ddl = [
+    DDL(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TODO_FTS_TABLE} USING fts5("
+        "title, description, content='todos', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    ),
+    DDL(
+        "CREATE TRIGGER IF NOT EXISTS todos_fts_ai AFTER INSERT ON todos BEGIN "
+        f"INSERT INTO {TODO_FTS_TABLE}(rowid, title, description) "
+        "VALUES (new.id, new.title, new.description); END"
+    ),
+    DDL(
+        "CREATE TRIGGER IF NOT EXISTS todos_fts_ad AFTER DELETE ON todos BEGIN "
+        f"INSERT INTO {TODO_FTS_TABLE}({TODO_FTS_TABLE}, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END"
+    ),
+    DDL(
+        "CREATE TRIGGER IF NOT EXISTS todos_fts_au AFTER UPDATE OF title, description ON todos BEGIN "
+        f"INSERT INTO {TODO_FTS_TABLE}({TODO_FTS_TABLE}, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        f"INSERT INTO {TODO_FTS_TABLE}(rowid, title, description) "
+        "VALUES (new.id, new.title, new.description); END"
+    ),
+]
+
+for _ddl in _pg_search_ddl:
+    event.listen(Todo.__table__, "after_create", _ddl.execute_if(dialect="postgresql"))
+
+for _ddl in _sqlite_search_ddl:
+    event.listen(Todo.__table__, "after_create", _ddl.execute_if(dialect="sqlite"))
+
+event.listen(
+    Todo.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {TODO_FTS_TABLE}").execute_if(dialect="sqlite"),
+)
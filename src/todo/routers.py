@@ -1,12 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+import itertools
+import logging
+import time
 from typing import List, Optional
-from src.todo import crud, schemas
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi import status  # параметр status в read_todos перекрывает модуль
+from fastapi import status as http_status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from src.config import settings
+from src.todo import async_crud, crud, schemas
+from src.todo.export import EXPORT_MEDIA_TYPES, stream_csv, stream_xlsx
 from src.todo.models import TodoStatus
+from src.user import async_crud as user_async_crud
 from src.user.schemas import User
-from src.utils.db import get_db
+from src.utils.cache import cached
+from src.utils.db import get_async_db, get_session_factory
+from src.utils.etag import data_etag, etag_headers, etag_matches, not_modified
+from src.utils.pagination import InvalidCursorError, decode_cursor, encode_cursor
 from src.utils.permissions import get_current_active_user
-import logging
+from src.utils.responses import ORJSONResponse
 
 logger = logging.getLogger(__name__)
 
@@ -17,120 +33,327 @@ router = APIRouter(prefix="/todos", tags=["todos"])
 async def create_todo(
     todo: schemas.TodoCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Создать новую задачу"""
     try:
         # Проверяем существование категории, если указана
         if todo.category_id:
-            from src.category.crud import get_category
-            category = get_category(db, todo.category_id, current_user.id)
+            from src.category.async_crud import get_category
+
+            category = await get_category(db, todo.category_id, current_user.id)
             if not category:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Указанная категория не существует"
+                    detail="Указанная категория не существует",
                 )
-        
-        db_todo = crud.create_todo(db=db, todo=todo, user_id=current_user.id)
+
+        db_todo = await async_crud.create_todo(
+            db=db, todo=todo, user_id=current_user.id
+        )
         if not db_todo:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Ошибка при создании задачи"
+                detail="Ошибка при создании задачи",
             )
-        
+
         return db_todo
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при создании задачи: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
+@cached(
+    ttl=settings.cache_todo_list_ttl,
+    tags=("user:{user_id}", "user:{user_id}:todos", "user:{user_id}:categories"),
+)
+async def _todo_list_content(
+    db: AsyncSession,
+    user_id: int,
+    limit: int,
+    skip: int,
+    after: Optional[dict],
+    keyset: bool,
+    status: Optional[TodoStatus],
+    category_id: Optional[int],
+    search: Optional[str],
+    sort: str,
+    count: str,
+) -> dict:
+    """Тело ответа списка задач; элементы зависят и от категорий (название, цвет)"""
+    # Страница и количество по тем же фильтрам получаются одним запросом
+    result = await async_crud.list_todos(
+        db=db,
+        user_id=user_id,
+        limit=limit,
+        skip=skip,
+        after=after,
+        keyset=keyset,
+        status=status,
+        category_id=category_id,
+        search=search,
+        sort=sort,
+        count=count,
+        hydrate=settings.todo_list_hydrate,
+    )
+
+    next_cursor = None
+    if result["next_position"] is not None:
+        next_cursor = encode_cursor(sort, *result["next_position"])
+
+    # Вычисляем параметры пагинации
+    total = result["total"]
+    page = None if keyset else (skip // limit) + 1
+    pages = (total + limit - 1) // limit if total is not None else None
+
+    return {
+        "items": result["items"],
+        "total": total,
+        "total_is_estimate": result["total_is_estimate"],
+        "page": page,
+        "size": limit,
+        "pages": pages,
+        "next_cursor": next_cursor,
+    }
+
+
 @router.get("/", response_model=schemas.TodoListResponse)
 async def read_todos(
+    request: Request,
     skip: int = Query(0, ge=0, description="Количество пропущенных записей"),
     limit: int = Query(20, ge=1, le=100, description="Количество записей"),
     status: Optional[TodoStatus] = Query(None, description="Фильтр по статусу"),
     category_id: Optional[int] = Query(None, description="Фильтр по категории"),
     search: Optional[str] = Query(None, description="Поиск по названию или описанию"),
+    sort: str = Query(
+        "created_at",
+        pattern="^(created_at|deadline|relevance)$",
+        description="Поле сортировки (relevance - по релевантности поиска)",
+    ),
+    pagination: str = Query(
+        "offset", pattern="^(offset|cursor)$", description="Режим пагинации"
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Курсор следующей страницы (включает keyset-режим)"
+    ),
+    count: str = Query(
+        "exact",
+        pattern="^(exact|estimate|none)$",
+        description="Режим подсчета общего количества",
+    ),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить список задач пользователя с фильтрацией и пагинацией"""
     try:
-        # Получаем задачи с информацией о категориях
-        todos = crud.get_todos_with_category(
-            db=db,
+        # Данные не менялись с прошлого ответа: 304 без обращения к задачам
+        data_version = await user_async_crud.get_data_version(db, current_user.id)
+        etag = data_etag(request, current_user.id, data_version)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        keyset = pagination == "cursor" or cursor is not None
+        if keyset and sort not in crud.TODO_SORT_FIELDS:
+            raise HTTPException(
+                status_code=http_status.HTTP_400_BAD_REQUEST,
+                detail="Курсорная пагинация не поддерживает сортировку по релевантности",
+            )
+
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor, sort)
+            except InvalidCursorError as e:
+                raise HTTPException(
+                    status_code=http_status.HTTP_400_BAD_REQUEST, detail=str(e)
+                )
+
+        # В keyset-режиме (cursor) skip игнорируется
+        content = await _todo_list_content(
+            db,
             user_id=current_user.id,
-            skip=skip,
             limit=limit,
+            skip=0 if keyset else skip,
+            after=after,
+            keyset=keyset,
             status=status,
             category_id=category_id,
-            search=search
+            search=search,
+            sort=sort,
+            count=count,
         )
-        
-        # Получаем общее количество для пагинации
-        total = crud.get_todos_count(
-            db=db,
-            user_id=current_user.id,
-            status=status,
-            category_id=category_id
-        )
-        
-        # Вычисляем параметры пагинации
-        page = (skip // limit) + 1
-        pages = (total + limit - 1) // limit
-        
-        return schemas.TodoListResponse(
-            items=todos,
-            total=total,
-            page=page,
-            size=limit,
-            pages=pages
-        )
-    
+        # Элементы уже содержат только поля схемы: отдаем их без повторной
+        # валидации (response_model остается для документации)
+        return ORJSONResponse(content, headers=etag_headers(etag))
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка при получении задач: {e}")
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Внутренняя ошибка сервера",
         )
 
 
+@cached(ttl=settings.stats_etag_window, tags=("user:{user_id}", "user:{user_id}:todos"))
+async def _todo_stats(db: AsyncSession, user_id: int, window: int) -> dict:
+    """Статистика задач; окно времени в ключе - как в ETag, из-за просрочки"""
+    return await async_crud.get_todo_stats(db=db, user_id=user_id)
+
+
 @router.get("/stats", response_model=schemas.TodoStats)
 async def get_todo_stats(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить статистику по задачам пользователя"""
     try:
-        stats = crud.get_todo_stats(db=db, user_id=current_user.id)
+        # Просрочка меняется со временем без изменения данных, поэтому ETag
+        # действует в пределах окна settings.stats_etag_window
+        window = int(time.time()) // settings.stats_etag_window
+        data_version = await user_async_crud.get_data_version(db, current_user.id)
+        etag = data_etag(request, current_user.id, data_version, window)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        stats = await _todo_stats(db, user_id=current_user.id, window=window)
+        response.headers.update(etag_headers(etag))
         return schemas.TodoStats(**stats)
     except Exception as e:
         logger.error(f"Ошибка при получении статистики задач: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
+        )
+
+
+def _export_rows(session_factory: sessionmaker, user_id: int, **filters):
+    """Строки экспорта в собственной сессии: поток читается уже после завершения запроса"""
+    with session_factory() as db:
+        try:
+            yield from crud.iter_todos_for_export(db=db, user_id=user_id, **filters)
+        except Exception as e:
+            # Заголовки уже отправлены: остается записать ошибку и оборвать поток
+            logger.error(f"Ошибка при экспорте задач: {e}")
+            raise
+
+
+@router.get("/export")
+async def export_todos(
+    format: str = Query("csv", pattern="^(csv|xlsx)$", description="Формат файла"),
+    status: Optional[TodoStatus] = Query(None, description="Фильтр по статусу"),
+    category_id: Optional[int] = Query(None, description="Фильтр по категории"),
+    search: Optional[str] = Query(None, description="Поиск по названию или описанию"),
+    sort: str = Query(
+        "created_at",
+        pattern="^(created_at|deadline|relevance)$",
+        description="Поле сортировки",
+    ),
+    current_user: User = Depends(get_current_active_user),
+    session_factory: sessionmaker = Depends(get_session_factory),
+):
+    """Экспортировать задачи пользователя в CSV или XLSX потоком"""
+    # Синхронная сессия: StreamingResponse читает синхронный генератор в пуле
+    # потоков, поэтому построчная выборка с yield_per не блокирует event loop
+    export_rows = _export_rows(
+        session_factory,
+        user_id=current_user.id,
+        status=status,
+        category_id=category_id,
+        search=search,
+        sort=sort,
+    )
+    try:
+        # Первая строка читается до ответа: ошибка запроса к БД еще может стать 500
+        first = await run_in_threadpool(next, export_rows, None)
+        rows = (
+            itertools.chain([first], export_rows) if first is not None else export_rows
+        )
+        content = stream_xlsx(rows) if format == "xlsx" else stream_csv(rows)
+
+        return StreamingResponse(
+            content,
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="todos.{format}"'},
+        )
+    except Exception as e:
+        export_rows.close()
+        logger.error(f"Ошибка при экспорте задач: {e}")
+        raise HTTPException(
+            status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Внутренняя ошибка сервера",
+        )
+
+
+@router.post("/bulk", response_model=schemas.TodoBulkResponse)
+async def bulk_create_todos(
+    payload: schemas.TodoBulkCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Создать несколько задач одним запросом"""
+    try:
+        results = await async_crud.bulk_create_todos(
+            db, todos=payload.items, user_id=current_user.id
+        )
+        return _bulk_response(results)
+    except Exception as e:
+        logger.error(f"Ошибка при пакетном создании задач: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Внутренняя ошибка сервера",
         )
 
 
+@router.patch("/bulk", response_model=schemas.TodoBulkResponse)
+async def bulk_update_todos(
+    payload: schemas.TodoBulkUpdate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Пакетно изменить, сменить статус или удалить задачи"""
+    try:
+        results = await async_crud.bulk_update_todos(
+            db, operations=payload.operations, user_id=current_user.id
+        )
+        return _bulk_response(results)
+    except Exception as e:
+        logger.error(f"Ошибка при пакетном обновлении задач: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Внутренняя ошибка сервера",
+        )
+
+
+def _bulk_response(results: List[dict]) -> schemas.TodoBulkResponse:
+    """Собрать ответ пакетного запроса с итогами"""
+    failed = sum(1 for item in results if item["result"] == "error")
+    return schemas.TodoBulkResponse(
+        results=results, succeeded=len(results) - failed, failed=failed
+    )
+
+
 @router.get("/{todo_id}", response_model=schemas.Todo)
 async def read_todo(
     todo_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить задачу по ID"""
     try:
-        todo = crud.get_todo(db, todo_id=todo_id, user_id=current_user.id)
+        todo = await async_crud.get_todo(db, todo_id=todo_id, user_id=current_user.id)
         if todo is None:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Задача не найдена"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Задача не найдена"
             )
         return todo
     except HTTPException:
@@ -139,7 +362,7 @@ async def read_todo(
         logger.error(f"Ошибка при получении задачи: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
@@ -148,41 +371,38 @@ async def update_todo(
     todo_id: int,
     todo_update: schemas.TodoUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Обновить задачу"""
     try:
         # Проверяем существование категории, если изменяется
         if todo_update.category_id:
-            from src.category.crud import get_category
-            category = get_category(db, todo_update.category_id, current_user.id)
+            from src.category.async_crud import get_category
+
+            category = await get_category(db, todo_update.category_id, current_user.id)
             if not category:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Указанная категория не существует"
+                    detail="Указанная категория не существует",
                 )
-        
-        db_todo = crud.update_todo(
-            db=db, 
-            todo_id=todo_id, 
-            todo_update=todo_update, 
-            user_id=current_user.id
+
+        db_todo = await async_crud.update_todo(
+            db=db, todo_id=todo_id, todo_update=todo_update, user_id=current_user.id
         )
         if not db_todo:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Задача не найдена"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Задача не найдена"
             )
-        
+
         return db_todo
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при обновлении задачи: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
@@ -191,31 +411,27 @@ async def update_todo_status(
     todo_id: int,
     status_update: schemas.TodoStatusUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Обновить статус задачи"""
     try:
-        db_todo = crud.update_todo_status(
-            db=db, 
-            todo_id=todo_id, 
-            status=status_update.status, 
-            user_id=current_user.id
+        db_todo = await async_crud.update_todo_status(
+            db=db, todo_id=todo_id, status=status_update.status, user_id=current_user.id
         )
         if not db_todo:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Задача не найдена"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Задача не найдена"
             )
-        
+
         return db_todo
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при обновлении статуса задачи: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
@@ -223,26 +439,27 @@ async def update_todo_status(
 async def delete_todo(
     todo_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Удалить задачу"""
     try:
-        success = crud.delete_todo(db=db, todo_id=todo_id, user_id=current_user.id)
+        success = await async_crud.delete_todo(
+            db=db, todo_id=todo_id, user_id=current_user.id
+        )
         if not success:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Задача не найдена"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Задача не найдена"
             )
-        
+
         return {"message": "Задача успешно удалена"}
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при удалении задачи: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
@@ -250,20 +467,22 @@ async def delete_todo(
 async def read_todos_by_category(
     category_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить все задачи определенной категории"""
     try:
         # Проверяем существование категории
-        from src.category.crud import get_category
-        category = get_category(db, category_id, current_user.id)
+        from src.category.async_crud import get_category
+
+        category = await get_category(db, category_id, current_user.id)
         if not category:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Категория не найдена"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Категория не найдена"
             )
-        
-        todos = crud.get_todos_by_category(db=db, user_id=current_user.id, category_id=category_id)
+
+        todos = await async_crud.get_todos_by_category(
+            db=db, user_id=current_user.id, category_id=category_id
+        )
         return todos
     except HTTPException:
         raise
@@ -271,5 +490,5 @@ async def read_todos_by_category(
         logger.error(f"Ошибка при получении задач по категории: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
@@ -1,12 +1,17 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
 from datetime import datetime
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+from src.config import settings
 from src.todo.models import TodoStatus
 
 
 class TodoBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=200, description="Название задачи")
-    description: Optional[str] = Field(None, max_length=1000, description="Описание задачи")
+    description: Optional[str] = Field(
+        None, max_length=1000, description="Описание задачи"
+    )
     status: TodoStatus = Field(default=TodoStatus.PENDING, description="Статус задачи")
     category_id: Optional[int] = Field(None, description="ID категории")
     deadline: Optional[datetime] = Field(None, description="Дедлайн задачи")
@@ -49,10 +54,14 @@ class TodoWithCategory(Todo):
 
 class TodoListResponse(BaseModel):
     items: List[TodoWithCategory]
-    total: int
-    page: int
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+    page: Optional[int] = None
     size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = Field(
+        None, description="Курсор следующей страницы (keyset-режим)"
+    )
 
 
 class TodoStats(BaseModel):
@@ -62,3 +71,45 @@ class TodoStats(BaseModel):
     completed: int
     cancelled: int
     overdue: int
+
+
+class TodoBulkCreate(BaseModel):
+    items: List[TodoCreate] = Field(
+        ..., min_length=1, max_length=settings.todo_bulk_max_items
+    )
+
+
+class TodoBulkOperation(BaseModel):
+    op: Literal["update", "status", "delete"] = Field(..., description="Тип операции")
+    id: int = Field(..., description="ID задачи")
+    fields: Optional[TodoUpdate] = Field(
+        None, description="Изменяемые поля (op=update)"
+    )
+    status: Optional[TodoStatus] = Field(None, description="Новый статус (op=status)")
+
+    @model_validator(mode="after")
+    def check_payload(self):
+        if self.op == "update" and self.fields is None:
+            raise ValueError("Для op=update требуется fields")
+        if self.op == "status" and self.status is None:
+            raise ValueError("Для op=status требуется status")
+        return self
+
+
+class TodoBulkUpdate(BaseModel):
+    operations: List[TodoBulkOperation] = Field(
+        ..., min_length=1, max_length=settings.todo_bulk_max_items
+    )
+
+
+class TodoBulkItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    result: Literal["created", "updated", "deleted", "error"]
+    detail: Optional[str] = None
+
+
+class TodoBulkResponse(BaseModel):
+    results: List[TodoBulkItemResult]
+    succeeded: int
+    failed: int
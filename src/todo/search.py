@@ -0,0 +1,90 @@
+import re
+from typing import List, Optional
+
+from sqlalchemy import column, func, literal_column, or_, select, table
+from sqlalchemy.orm import Query, Session
+
+from src.config import settings
+from src.todo.models import TODO_FTS_TABLE, TODO_SEARCH_CONFIG, Todo
+
+# FTS5-таблица (SQLite) как выражение для запросов
+_fts = table(TODO_FTS_TABLE, column("rowid"), column(TODO_FTS_TABLE))
+
+# Generated-колонка tsvector (PostgreSQL) не объявлена в модели, чтобы не попадать в INSERT/UPDATE
+_search_vector = literal_column(f"{Todo.__tablename__}.search_vector")
+
+
+def search_terms(search: Optional[str]) -> List[str]:
+    """Разбить строку поиска на слова (все прочие символы отбрасываются)"""
+    if not search:
+        return []
+    return re.findall(r"\w+", search.lower())
+
+
+def get_search_backend(session: Session) -> str:
+    """Определить backend поиска: postgresql, sqlite или like"""
+    if settings.search_backend != "auto":
+        return settings.search_backend
+
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        return dialect
+    return "like"
+
+
+def todo_search_condition(session: Session, search: str):
+    """Условие WHERE для поиска задач по названию и описанию (с префиксами слов)"""
+    terms = search_terms(search)
+    backend = get_search_backend(session)
+
+    if not terms or backend == "like":
+        return or_(
+            Todo.title.ilike(f"%{search}%"), Todo.description.ilike(f"%{search}%")
+        )
+
+    if backend == "postgresql":
+        return _search_vector.op("@@")(_pg_tsquery(terms))
+
+    matched_ids = select(_fts.c.rowid).where(
+        _fts.c[TODO_FTS_TABLE].op("MATCH")(_fts5_query(terms))
+    )
+    return Todo.id.in_(matched_ids)
+
+
+def order_by_relevance(query: Query, search: str) -> Query:
+    """Отсортировать уже отфильтрованный запрос по релевантности поиска"""
+    terms = search_terms(search)
+    backend = get_search_backend(query.session)
+
+    if not terms or backend == "like":
+        return query.order_by(Todo.created_at.desc(), Todo.id.desc())
+
+    if backend == "postgresql":
+        rank = func.ts_rank(_search_vector, _pg_tsquery(terms))
+        return query.order_by(rank.desc(), Todo.id.desc())
+
+    # bm25 возвращает отрицательные значения: чем меньше, тем релевантнее
+    ranked = (
+        select(
+            _fts.c.rowid.label("todo_id"),
+            func.bm25(literal_column(TODO_FTS_TABLE)).label("rank"),
+        )
+        .where(_fts.c[TODO_FTS_TABLE].op("MATCH")(_fts5_query(terms)))
+        .subquery("todo_rank")
+    )
+
+    return query.join(ranked, ranked.c.todo_id == Todo.id).order_by(
+        ranked.c.rank.asc(), Todo.id.desc()
+    )
+
+
+def _pg_tsquery(terms: List[str]):
+    """tsquery вида 'слово1:* & слово2:*'"""
+    return func.to_tsquery(
+        TODO_SEARCH_CONFIG, " & ".join(f"{term}:*" for term in terms)
+    )
+
+
+def _fts5_query(terms: List[str]) -> str:
+    """Запрос FTS5 вида '"слово1"* "слово2"*' (все слова, префиксное совпадение)"""
+    return " ".join(f'"{term}"*' for term in terms)
@@ -0,0 +1,104 @@
+"""Асинхронные версии функций src.user.crud (через AsyncSession.run_sync)"""
+
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.user import crud
+from src.user.models import User
+from src.user.schemas import Principal, UserCreate, UserUpdate
+from src.utils.cache import cache_manager, run_sync_invalidating
+from src.utils.security import (
+    aget_password_hash,
+    averify_and_update_password,
+    averify_password,
+)
+
+
+async def get_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """Получить пользователя по ID"""
+    return await db.run_sync(crud.get_user, user_id)
+
+
+async def get_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    """Пользователь для аутентификации: из кэша, при промахе - из БД с записью в кэш"""
+    key = crud.principal_key(user_id)
+    if settings.cache_principal_ttl:
+        cached = await cache_manager.aget(key)
+        if cached is not None:
+            return Principal.model_validate(cached)
+
+    user = await db.run_sync(crud.get_user, user_id)
+    if user is None:
+        return None
+    principal = Principal.model_validate(user)
+    if settings.cache_principal_ttl:
+        await cache_manager.aset(
+            key, principal.model_dump(mode="json"), ttl=settings.cache_principal_ttl
+        )
+    return principal
+
+
+async def get_data_version(db: AsyncSession, user_id: int) -> int:
+    """Текущая версия данных пользователя для ETag"""
+    return await db.run_sync(crud.get_data_version, user_id)
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    """Получить пользователя по email"""
+    return await db.run_sync(crud.get_user_by_email, email)
+
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> list[User]:
+    """Получить список пользователей с пагинацией"""
+    return await db.run_sync(crud.get_users, skip=skip, limit=limit)
+
+
+async def create_user(db: AsyncSession, user: UserCreate) -> Optional[User]:
+    """Создать нового пользователя (bcrypt - в пуле потоков, вне сессии)"""
+    hashed_password = await aget_password_hash(user.password)
+    return await db.run_sync(crud.create_user, user, hashed_password)
+
+
+async def update_user(
+    db: AsyncSession, user_id: int, user_update: UserUpdate
+) -> Optional[User]:
+    """Обновить пользователя"""
+    return await run_sync_invalidating(db, crud.update_user, user_id, user_update)
+
+
+async def delete_user(db: AsyncSession, user_id: int) -> bool:
+    """Удалить пользователя"""
+    return await run_sync_invalidating(db, crud.delete_user, user_id)
+
+
+async def authenticate_user(
+    db: AsyncSession, email: str, password: str
+) -> Optional[User]:
+    """Аутентификация пользователя (bcrypt - в пуле потоков, вне сессии)
+
+    Хеш с устаревшими схемой или стоимостью пересчитывается при успешном входе.
+    """
+    user = await db.run_sync(crud.get_user_by_email, email)
+    if not user:
+        return None
+    valid, new_hash = await averify_and_update_password(password, user.password_hash)
+    if not valid:
+        return None
+    if new_hash:
+        await db.run_sync(crud.rehash_user_password, user.id, new_hash)
+    return user
+
+
+async def change_user_password(
+    db: AsyncSession, user_id: int, current_password: str, new_password: str
+) -> bool:
+    """Изменить пароль пользователя (bcrypt - в пуле потоков, вне сессии)"""
+    user = await db.run_sync(crud.get_user, user_id)
+    if not user:
+        return False
+    if not await averify_password(current_password, user.password_hash):
+        return False
+    password_hash = await aget_password_hash(new_password)
+    return await db.run_sync(crud.set_user_password_hash, user_id, password_hash)
@@ -1,10 +1,19 @@
-from sqlalchemy.orm import Session
+import logging
+from typing import Optional
+
+from sqlalchemy import select, update
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.todo.models import TodoCounter
 from src.user.models import User
 from src.user.schemas import UserCreate, UserUpdate
-from src.utils.security import get_password_hash, verify_password
-from typing import Optional
-import logging
+from src.utils.cache import invalidate_after_commit
+from src.utils.security import (
+    get_password_hash,
+    verify_and_update_password,
+    verify_password,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -24,13 +33,39 @@ def get_users(db: Session, skip: int = 0, limit: int = 100) -> list[User]:
     return db.query(User).offset(skip).limit(limit).all()
 
 
-def create_user(db: Session, user: UserCreate) -> Optional[User]:
-    """Создать нового пользователя"""
+def principal_key(user_id: int) -> str:
+    """Ключ кэша пользователя для get_current_user"""
+    return f"principal:{user_id}"
+
+
+def get_data_version(db: Session, user_id: int) -> int:
+    """Текущая версия данных пользователя для ETag (из БД, мимо кэша пользователя)"""
+    return db.scalar(select(User.data_version).where(User.id == user_id)) or 0
+
+
+def bump_data_version(db: Session, user_id: int) -> None:
+    """Увеличить версию данных пользователя (без commit, в транзакции изменения)"""
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        # updated_at оставляем прежним: это изменение данных, а не профиля
+        .values(data_version=User.data_version + 1, updated_at=User.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def create_user(
+    db: Session, user: UserCreate, hashed_password: Optional[str] = None
+) -> Optional[User]:
+    """Создать нового пользователя (hashed_password - если хеш уже вычислен вне сессии)"""
     try:
-        hashed_password = get_password_hash(user.password)
+        hashed_password = hashed_password or get_password_hash(user.password)
         db_user = User(
             email=user.email,
-            password_hash=hashed_password
+            password_hash=hashed_password,
+            # Счетчики задач создаются вместе с пользователем: первые изменения
+            # задач сразу обновляют существующую строку
+            todo_counter=TodoCounter(),
         )
         db.add(db_user)
         db.commit()
@@ -39,7 +74,9 @@ def create_user(db: Session, user: UserCreate) -> Optional[User]:
         return db_user
     except IntegrityError:
         db.rollback()
-        logger.warning(f"Попытка создать пользователя с существующим email: {user.email}")
+        logger.warning(
+            f"Попытка создать пользователя с существующим email: {user.email}"
+        )
         return None
     except Exception as e:
         db.rollback()
@@ -53,11 +90,12 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[
         db_user = get_user(db, user_id)
         if not db_user:
             return None
-        
+
         update_data = user_update.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_user, field, value)
-        
+
+        invalidate_after_commit(db, keys=[principal_key(user_id)])
         db.commit()
         db.refresh(db_user)
         logger.info(f"Обновлен пользователь: {db_user.email}")
@@ -74,8 +112,9 @@ def delete_user(db: Session, user_id: int) -> bool:
         db_user = get_user(db, user_id)
         if not db_user:
             return False
-        
+
         db.delete(db_user)
+        invalidate_after_commit(db, keys=[principal_key(user_id)])
         db.commit()
         logger.info(f"Удален пользователь: {db_user.email}")
         return True
@@ -90,21 +129,65 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     user = get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    valid, new_hash = verify_and_update_password(password, user.password_hash)
+    if not valid:
         return None
+    if new_hash:
+        rehash_user_password(db, user.id, new_hash)
     return user
 
 
-def change_user_password(db: Session, user_id: int, current_password: str, new_password: str) -> bool:
+def rehash_user_password(db: Session, user_id: int, password_hash: str) -> None:
+    """Сохранить хеш пароля, пересчитанный с текущими схемой и стоимостью
+
+    Ошибка не мешает входу: хеш будет пересчитан при следующем.
+    """
+    try:
+        db.execute(
+            update(User)
+            .where(User.id == user_id)
+            # updated_at оставляем прежним: профиль не менялся
+            .values(password_hash=password_hash, updated_at=User.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        logger.info(
+            f"Хеш пароля пользователя {user_id} пересчитан с текущими параметрами"
+        )
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"Не удалось пересчитать хеш пароля пользователя {user_id}: {e}")
+
+
+def set_user_password_hash(db: Session, user_id: int, password_hash: str) -> bool:
+    """Сохранить новый хеш пароля пользователя"""
+    try:
+        user = get_user(db, user_id)
+        if not user:
+            return False
+
+        user.password_hash = password_hash
+        db.commit()
+        logger.info(f"Изменен пароль для пользователя: {user.email}")
+        return True
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ошибка при изменении пароля пользователя {user_id}: {e}")
+        raise
+
+
+def change_user_password(
+    db: Session, user_id: int, current_password: str, new_password: str
+) -> bool:
     """Изменить пароль пользователя"""
     try:
         user = get_user(db, user_id)
         if not user:
             return False
-        
+
         if not verify_password(current_password, user.password_hash):
             return False
-        
+
         user.password_hash = get_password_hash(new_password)
         db.commit()
         logger.info(f"Изменен пароль для пользователя: {user.email}")
@@ -1,13 +1,16 @@
+import logging
+from typing import List
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from typing import List
-from src.user import crud, schemas
-from src.utils.db import get_db
-from src.utils.security import create_access_token, create_refresh_token, get_current_user
-from src.utils.permissions import get_current_active_user
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from src.config import settings
-import logging
+from src.user import async_crud, schemas
+from src.utils.db import get_async_db
+from src.utils.permissions import get_current_active_user
+from src.utils.security import create_token_pair, verify_token
+from src.utils.token_revocation import RevocationStoreUnavailable, token_revocations
 
 logger = logging.getLogger(__name__)
 
@@ -15,113 +18,145 @@ router = APIRouter(prefix="/users", tags=["users"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.api_v1_prefix}/users/login")
 
 
-@router.post("/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
-async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+@router.post(
+    "/register", response_model=schemas.User, status_code=status.HTTP_201_CREATED
+)
+async def register_user(
+    user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)
+):
     """Регистрация нового пользователя"""
     try:
-        db_user = crud.get_user_by_email(db, email=user.email)
+        db_user = await async_crud.get_user_by_email(db, email=user.email)
         if db_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Пользователь с таким email уже существует"
+                detail="Пользователь с таким email уже существует",
             )
-        
-        user_created = crud.create_user(db=db, user=user)
+
+        user_created = await async_crud.create_user(db=db, user=user)
         if not user_created:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Ошибка при создании пользователя"
+                detail="Ошибка при создании пользователя",
             )
-        
+
         logger.info(f"Зарегистрирован новый пользователь: {user.email}")
         return user_created
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при регистрации пользователя: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
 @router.post("/login", response_model=schemas.Token)
-async def login_user(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_user(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+):
     """Авторизация пользователя"""
     try:
-        user = crud.authenticate_user(db, form_data.username, form_data.password)
+        user = await async_crud.authenticate_user(
+            db, form_data.username, form_data.password
+        )
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверный email или пароль",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        
+
         if not user.is_active:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Пользователь неактивен"
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Пользователь неактивен"
             )
-        
-        access_token_expires = settings.access_token_expire_minutes * 60
-        refresh_token_expires = settings.refresh_token_expire_days * 24 * 60 * 60
-        
-        access_token = create_access_token(
-            data={"sub": user.email, "user_id": user.id},
-            expires_delta=access_token_expires
-        )
-        refresh_token = create_refresh_token(
-            data={"sub": user.email, "user_id": user.id},
-            expires_delta=refresh_token_expires
-        )
-        
+
         logger.info(f"Успешная авторизация пользователя: {user.email}")
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
-            "expires_in": access_token_expires,
-            "refresh_token": refresh_token
-        }
-    
+        return create_token_pair(user.id)
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при авторизации пользователя: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
+def _invalid_refresh_token(
+    detail: str = "Недействительный refresh токен",
+) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
 @router.post("/refresh", response_model=schemas.Token)
 async def refresh_token(
-    refresh_token: str,
-    current_user: schemas.User = Depends(get_current_user)
+    token_refresh: schemas.TokenRefresh, db: AsyncSession = Depends(get_async_db)
 ):
-    """Обновление токена доступа"""
+    """Обновление токенов: refresh токен одноразовый, взамен выдается новая пара того же семейства"""
     try:
-        # Здесь должна быть логика проверки refresh token
-        # Для простоты просто создаем новый access token
-        access_token_expires = settings.access_token_expire_minutes * 60
-        
-        access_token = create_access_token(
-            data={"sub": current_user.email, "user_id": current_user.id},
-            expires_delta=access_token_expires
+        payload = verify_token(token_refresh.refresh_token, "refresh")
+        if payload is None or not {"sub", "fam", "jti"} <= payload.keys():
+            raise _invalid_refresh_token()
+
+        if not await token_revocations.consume_refresh_token(payload):
+            raise _invalid_refresh_token("Refresh токен отозван или уже использован")
+
+        user = await async_crud.get_principal(db, int(payload["sub"]))
+        if user is None or not user.is_active:
+            raise _invalid_refresh_token("Пользователь не найден или неактивен")
+
+        return create_token_pair(user.id, family=payload["fam"])
+
+    except HTTPException:
+        raise
+    except RevocationStoreUnavailable as e:
+        logger.error(f"Хранилище отзывов токенов недоступно: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис временно недоступен",
         )
-        
-        return {
-            "access_token": access_token,
-            "token_type": "bearer",
-            "expires_in": access_token_expires,
-            "refresh_token": refresh_token
-        }
-    
     except Exception as e:
         logger.error(f"Ошибка при обновлении токена: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Ошибка при обновлении токена"
+            detail="Ошибка при обновлении токена",
+        )
+
+
+@router.post("/logout")
+async def logout(token_refresh: schemas.TokenRefresh):
+    """Выход: отзыв всех токенов сессии (семейства refresh токена)"""
+    try:
+        payload = verify_token(token_refresh.refresh_token, "refresh")
+        if payload is None or "fam" not in payload:
+            raise _invalid_refresh_token()
+
+        await token_revocations.revoke_family(payload["fam"])
+        return {"message": "Сессия завершена"}
+
+    except HTTPException:
+        raise
+    except RevocationStoreUnavailable as e:
+        logger.error(f"Хранилище отзывов токенов недоступно: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис временно недоступен",
+        )
+    except Exception as e:
+        logger.error(f"Ошибка при выходе пользователя: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Внутренняя ошибка сервера",
         )
 
 
@@ -135,25 +170,26 @@ async def read_users_me(current_user: schemas.User = Depends(get_current_active_
 async def update_users_me(
     user_update: schemas.UserUpdate,
     current_user: schemas.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Обновить информацию о текущем пользователе"""
     try:
-        updated_user = crud.update_user(db=db, user_id=current_user.id, user_update=user_update)
+        updated_user = await async_crud.update_user(
+            db=db, user_id=current_user.id, user_update=user_update
+        )
         if not updated_user:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Пользователь не найден"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден"
             )
         return updated_user
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при обновлении пользователя: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
@@ -161,32 +197,32 @@ async def update_users_me(
 async def change_password(
     password_change: schemas.PasswordChange,
     current_user: schemas.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Изменить пароль текущего пользователя"""
     try:
-        success = crud.change_user_password(
+        success = await async_crud.change_user_password(
             db=db,
             user_id=current_user.id,
             current_password=password_change.current_password,
-            new_password=password_change.new_password
+            new_password=password_change.new_password,
         )
-        
+
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Неверный текущий пароль"
+                detail="Неверный текущий пароль",
             )
-        
+
         return {"message": "Пароль успешно изменен"}
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при изменении пароля: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
 
 
@@ -195,11 +231,11 @@ async def read_users(
     skip: int = 0,
     limit: int = 100,
     current_user: schemas.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить список пользователей (только для администраторов)"""
     # Здесь можно добавить проверку на администратора
-    users = crud.get_users(db, skip=skip, limit=limit)
+    users = await async_crud.get_users(db, skip=skip, limit=limit)
     return users
 
 
@@ -207,11 +243,11 @@ async def read_users(
 async def read_user(
     user_id: int,
     current_user: schemas.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Получить пользователя по ID (только для администраторов)"""
     # Здесь можно добавить проверку на администратора
-    user = crud.get_user(db, user_id=user_id)
+    user = await async_crud.get_user(db, user_id=user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     return user
@@ -221,24 +257,23 @@ async def read_user(
 async def delete_user(
     user_id: int,
     current_user: schemas.User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Удалить пользователя (только для администраторов)"""
     # Здесь можно добавить проверку на администратора
     try:
-        success = crud.delete_user(db=db, user_id=user_id)
+        success = await async_crud.delete_user(db=db, user_id=user_id)
         if not success:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Пользователь не найден"
+                status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден"
             )
         return {"message": "Пользователь успешно удален"}
-    
+
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Ошибка при удалении пользователя: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Внутренняя ошибка сервера"
+            detail="Внутренняя ошибка сервера",
         )
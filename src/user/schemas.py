@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional
 from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, EmailStr, Field
 
 
 class UserBase(BaseModel):
@@ -30,6 +31,10 @@ class User(UserInDB):
     pass
 
 
+class Principal(User):
+    """Аутентифицированный пользователь из get_current_user (кэшируется по id)"""
+
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -42,6 +47,10 @@ class Token(BaseModel):
     refresh_token: str
 
 
+class TokenRefresh(BaseModel):
+    refresh_token: str = Field(..., description="Refresh токен (одноразовый)")
+
+
 class TokenData(BaseModel):
     email: Optional[str] = None
     user_id: Optional[int] = None
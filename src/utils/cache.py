@@ -1,187 +1,1506 @@
-import redis
+import asyncio
+import functools
+import hashlib
+import inspect
 import json
-import pickle
-from typing import Any, Optional, Union, Callable
+import math
+import random
+import re
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter, OrderedDict
+from enum import Enum
+from fnmatch import fnmatchcase
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import orjson
+import redis
+import redis.asyncio as aioredis
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
 from src.config import settings
+from src.utils.cache_metrics import CacheMetrics
+from src.utils.circuit_breaker import STATE_CLOSED, STATE_OPEN, CircuitBreaker
 from src.utils.logger import cache_logger
-import time
+from src.utils.serializers import CacheCodec, SerializationError, get_codec
+
+
+class LocalCache:
+    """Ограниченный in-process LRU-кэш с TTL на запись (L1 перед Redis)
+
+    Значения хранятся как есть и разделяются между вызовами - их нельзя изменять.
+    Размер записи - длина ее сериализованного представления в Redis.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        # key -> (expires_at, size, value); порядок - от давно использованных к недавним
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Значение из L1 или None, если записи нет или она истекла"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[float] = None):
+        """Сохранить значение; TTL не больше собственного TTL L1"""
+        ttl = min(ttl, self.ttl) if ttl else self.ttl
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes or ttl <= 0:
+                return
+            self._entries[key] = (time.monotonic() + ttl, size, value)
+            self.size_bytes += size
+            # Вытесняем давно неиспользованные записи до выполнения обоих лимитов
+            while (
+                len(self._entries) > self.max_entries
+                or self.size_bytes > self.max_bytes
+            ):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size_bytes -= evicted_size
+
+    def delete(self, keys: Iterable[str]):
+        """Удалить записи"""
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def delete_pattern(self, pattern: str):
+        """Удалить записи по glob-паттерну (как KEYS/SCAN в Redis)"""
+        with self._lock:
+            for key in [key for key in self._entries if fnmatchcase(key, pattern)]:
+                self._remove(key)
+
+    def clear(self):
+        """Очистить L1"""
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
+
+
+STAT_COUNTERS = (
+    "l1_hits",
+    "l1_misses",
+    "l2_hits",
+    "l2_misses",
+    "recomputes",
+    "stale_hits",
+    "lease_waits",
+)
+
+# Состояние записи get_or_set
+ENTRY_MISSING = "missing"
+ENTRY_FRESH = "fresh"
+ENTRY_REFRESH = "refresh"  # Еще не истекла, но выпала ранняя перепроверка (XFetch)
+ENTRY_STALE = "stale"  # Истекла, но еще в окне stale_ttl
+
+# Интервал опроса значения, пока его вычисляет владелец аренды, с
+LEASE_POLL_MIN = 0.01
+LEASE_POLL_MAX = 0.2
+
+# Снять аренду, только если она все еще наша (могла истечь и достаться другому)
+RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 
 
 class CacheManager:
-    """Менеджер кэширования для приложения"""
-    
-    def __init__(self, default_ttl: int = None):
+    """Менеджер кэширования для приложения
+
+    Опционально держит L1 (LocalCache) перед Redis. Изменения публикуются в
+    канал settings.cache_invalidation_channel, и остальные воркеры удаляют
+    свои копии из L1.
+    """
+
+    def __init__(
+        self,
+        default_ttl: int = None,
+        client: Optional[redis.Redis] = None,
+        local_cache: Optional[bool] = None,
+        async_client: Optional[aioredis.Redis] = None,
+        codec: Optional[CacheCodec] = None,
+    ):
         self.default_ttl = default_ttl or settings.cache_default_ttl
+        self.codec = codec or get_codec(
+            settings.cache_serializer, settings.cache_compress_min_size
+        )
         self.enabled = settings.cache_enabled
-        
-        if self.enabled:
-            try:
-                self.client = redis.from_url(settings.redis_url, decode_responses=False)
-                # Проверяем соединение
-                self.client.ping()
-                cache_logger.info("Redis соединение установлено успешно")
-            except Exception as e:
-                cache_logger.error(f"Ошибка подключения к Redis: {e}")
-                self.enabled = False
-                self.client = None
-        else:
-            self.client = None
+        self.instance_id = uuid.uuid4().hex
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        self.metrics = CacheMetrics(
+            enabled=settings.cache_metrics_enabled,
+            top_keys_capacity=settings.cache_top_keys_capacity,
+            top_keys_sample_rate=settings.cache_top_keys_sample_rate,
+        )
+        self._pubsub = None
+        self._listener = None
+        # Блокировки пересчета по ключу (single-flight внутри процесса); Semaphore,
+        # а не Lock - на threading.Lock нельзя сослаться через weakref
+        self._key_locks = weakref.WeakValueDictionary()
+        self._async_key_locks = weakref.WeakValueDictionary()
+        self._key_locks_guard = threading.Lock()
+        self.async_client = None
+        self.client = None
+        # Инвалидации, не дошедшие до Redis: повторяются после восстановления
+        self._missed_namespaces = set()
+        self._missed_keys = set()
+        self._missed_overflow = False
+        self._missed_lock = threading.Lock()
+        self._replay_thread = None
+        self.breaker = CircuitBreaker(
+            "redis",
+            probe=self._probe_redis,
+            failure_rate=settings.cache_breaker_failure_rate,
+            min_calls=settings.cache_breaker_min_calls,
+            window=settings.cache_breaker_window,
+            open_timeout=settings.cache_breaker_open_timeout,
+            max_open_timeout=settings.cache_breaker_max_open_timeout,
+            on_state_change=self._on_breaker_state_change,
+        )
+
+        use_local = settings.cache_local_enabled if local_cache is None else local_cache
+        self.local = (
+            LocalCache(
+                max_entries=settings.cache_local_max_entries,
+                max_bytes=settings.cache_local_max_bytes,
+                ttl=settings.cache_local_ttl,
+            )
+            if use_local
+            else None
+        )
+
+        if not self.enabled:
             cache_logger.info("Кэширование отключено")
-    
+            return
+
+        # Клиенты создаются без соединения; соединения асинхронного пула
+        # открываются лениво в event loop приложения
+        self.client = client or redis.Redis(
+            connection_pool=redis.BlockingConnectionPool.from_url(
+                settings.redis_url, **_pool_options()
+            )
+        )
+        self.async_client = async_client or aioredis.Redis(
+            connection_pool=aioredis.BlockingConnectionPool.from_url(
+                settings.redis_url, **_pool_options()
+            )
+        )
+        try:
+            self.client.ping()
+            cache_logger.info("Redis соединение установлено успешно")
+            if self.local is not None:
+                self._start_invalidation_listener()
+        except Exception as e:
+            # Кэш не отключается навсегда: автомат защиты включит его, когда Redis ответит
+            cache_logger.error(f"Ошибка подключения к Redis: {e}")
+            self.breaker.trip()
+
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
         """Установка значения в кэш"""
-        if not self.enabled or not self.client:
+        if not self._ready():
             return False
-        
+
         try:
-            if isinstance(value, (dict, list)):
-                serialized_value = pickle.dumps(value)
-            else:
-                serialized_value = str(value).encode('utf-8')
-            
+            serialized_value = self.codec.dumps(value)
             ttl = ttl or self.default_ttl
-            result = self.client.setex(key, ttl, serialized_value)
-            
+            started = time.perf_counter()
+            result = self.client.set(key, serialized_value, ex=ttl)
+            self.metrics.observe_latency("set", time.perf_counter() - started)
+            self.metrics.record_write(key, len(serialized_value))
+
             if result:
                 cache_logger.debug(f"Значение установлено в кэш: {key}, TTL: {ttl}s")
+                if self.local is not None:
+                    # L1 заполняется при чтении: там значение в том же виде, что вернет Redis
+                    self.local.delete([key])
+                    self._publish_invalidation(keys=[key])
             return bool(result)
         except Exception as e:
+            self._record_failure(e)
+            self.metrics.record_error(key)
             cache_logger.error(f"Ошибка при установке кэша {key}: {e}")
             return False
-    
+
     def get(self, key: str) -> Optional[Any]:
         """Получение значения из кэша"""
-        if not self.enabled or not self.client:
+        return self._fetch(key)
+
+    def _fetch(self, key: str, record: bool = True) -> Optional[Any]:
+        """Чтение L1 и Redis; record=False - повторное чтение, не учитываемое в метриках"""
+        if not self._ready():
             return None
-        
+
+        result = self._get_local(key, record)
+        if result is not None:
+            return result
+
         try:
-            value = self.client.get(key)
-            if value is None:
-                cache_logger.debug(f"Кэш-промах для ключа: {key}")
-                return None
-            
-            # Пытаемся десериализовать как pickle, если не получилось - как строку
-            try:
-                result = pickle.loads(value)
-                cache_logger.debug(f"Значение получено из кэша: {key}")
-                return result
-            except:
-                result = value.decode('utf-8')
-                cache_logger.debug(f"Строковое значение получено из кэша: {key}")
-                return result
+            started = time.perf_counter()
+            if self.local is not None:
+                # Оставшийся TTL нужен, чтобы запись в L1 не пережила запись в Redis
+                pipe = self.client.pipeline(transaction=False)
+                pipe.get(key)
+                pipe.pttl(key)
+                value, pttl = pipe.execute()
+            else:
+                value, pttl = self.client.get(key), None
+            self.metrics.observe_latency("get", time.perf_counter() - started)
+            return self._on_fetched(key, value, pttl, record)
         except Exception as e:
+            self._record_failure(e)
+            self.metrics.record_error(key)
             cache_logger.error(f"Ошибка при получении кэша {key}: {e}")
             return None
-    
+
     def delete(self, key: str) -> bool:
         """Удаление значения из кэша"""
-        if not self.enabled or not self.client:
+        if not self._ready():
+            self._remember_missed(keys=[key])
             return False
-        
+
         try:
             result = bool(self.client.delete(key))
+            if self.local is not None:
+                self.local.delete([key])
+                self._publish_invalidation(keys=[key])
             if result:
                 cache_logger.debug(f"Ключ удален из кэша: {key}")
             return result
         except Exception as e:
+            self._record_failure(e)
+            self._remember_missed(keys=[key])
+            self.metrics.record_error(key)
             cache_logger.error(f"Ошибка при удалении кэша {key}: {e}")
             return False
-    
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Значения нескольких ключей: L1, затем один MGET; промахов в результате нет"""
+        if not self._ready():
+            return {}
+
+        found, missing = self._get_many_local(keys)
+        if not missing:
+            return found
+
+        try:
+            started = time.perf_counter()
+            if self.local is not None:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.mget(missing)
+                for key in missing:
+                    pipe.pttl(key)
+                values, *pttls = pipe.execute()
+            else:
+                values, pttls = self.client.mget(missing), [None] * len(missing)
+            self.metrics.observe_latency("mget", time.perf_counter() - started)
+        except Exception as e:
+            self._record_failure(e)
+            self._record_errors(missing)
+            cache_logger.error(
+                f"Ошибка при получении {len(missing)} ключей из кэша: {e}"
+            )
+            return found
+
+        return self._collect_fetched(found, missing, values, pttls)
+
+    def set_many(
+        self, mapping: Dict[str, Any], ttl: Union[int, Dict[str, int], None] = None
+    ) -> bool:
+        """Установка нескольких значений одним конвейером; ttl - общий или по ключам"""
+        if not mapping or not self._ready():
+            return False
+
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.set(
+                    key, self._dumps_recorded(key, value), ex=self._ttl_for(key, ttl)
+                )
+            started = time.perf_counter()
+            result = all(pipe.execute())
+            self.metrics.observe_latency("mset", time.perf_counter() - started)
+
+            if self.local is not None:
+                self.local.delete(mapping)
+                self._publish_invalidation(keys=list(mapping))
+            cache_logger.debug(f"Установлено {len(mapping)} значений в кэш")
+            return result
+        except Exception as e:
+            self._record_failure(e)
+            self._record_errors(mapping)
+            cache_logger.error(
+                f"Ошибка при установке {len(mapping)} значений в кэш: {e}"
+            )
+            return False
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """Удаление нескольких ключей одной командой UNLINK"""
+        keys = list(keys)
+        if not keys:
+            return 0
+        if not self._ready():
+            self._remember_missed(keys=keys)
+            return 0
+
+        try:
+            deleted_count = self.client.unlink(*keys)
+            if self.local is not None:
+                self.local.delete(keys)
+                self._publish_invalidation(keys=keys)
+            return deleted_count
+        except Exception as e:
+            self._record_failure(e)
+            self._remember_missed(keys=keys)
+            self._record_errors(keys)
+            cache_logger.error(f"Ошибка при удалении {len(keys)} ключей из кэша: {e}")
+            return 0
+
     def exists(self, key: str) -> bool:
         """Проверка существования ключа"""
-        if not self.enabled or not self.client:
+        if not self._ready():
             return False
-        
+
         try:
             return bool(self.client.exists(key))
         except Exception as e:
+            self._record_failure(e)
             cache_logger.error(f"Ошибка при проверке кэша {key}: {e}")
             return False
-    
+
     def clear_pattern(self, pattern: str) -> int:
-        """Очистка кэша по паттерну"""
-        if not self.enabled or not self.client:
+        """Очистка кэша по паттерну
+
+        Обходит ключи через SCAN порциями, не блокируя Redis, как KEYS. Для
+        данных пользователя используйте invalidate_user_cache (один INCR).
+        """
+        if not self._ready():
             return 0
-        
+
         try:
-            keys = self.client.keys(pattern)
-            if keys:
-                deleted_count = self.client.delete(*keys)
-                cache_logger.info(f"Удалено {deleted_count} ключей по паттерну: {pattern}")
-                return deleted_count
-            return 0
+            deleted_count = 0
+            for keys in self._scan_batches(pattern):
+                deleted_count += self.client.unlink(*keys)
+            if self.local is not None:
+                self.local.delete_pattern(pattern)
+                self._publish_invalidation(pattern=pattern)
+            if deleted_count:
+                cache_logger.info(
+                    f"Удалено {deleted_count} ключей по паттерну: {pattern}"
+                )
+            return deleted_count
         except Exception as e:
+            self._record_failure(e)
             cache_logger.error(f"Ошибка при очистке кэша по паттерну {pattern}: {e}")
             return 0
-    
-    def get_or_set(self, key: str, callback: Callable, ttl: Optional[int] = None) -> Any:
-        """Получение из кэша или установка через callback"""
-        if not self.enabled:
+
+    def get_or_set(
+        self,
+        key: str,
+        callback: Callable,
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+    ) -> Any:
+        """Получение из кэша или установка через callback
+
+        Пересчитывает один вызывающий: блокировка ключа в процессе и аренда
+        SET NX в Redis между воркерами, остальные ждут результат. Запись может
+        обновиться до истечения (XFetch), а stale_ttl секунд после истечения
+        отдается старое значение, пока один воркер пересчитывает. Ключ хранит
+        служебную обертку, поэтому читать его нужно через get_or_set.
+        """
+        if not self._ready():
             return callback()
-        
-        cached_value = self.get(key)
-        if cached_value is not None:
-            return cached_value
-        
-        # Выполняем callback и кэшируем результат
-        value = callback()
-        if value is not None:
-            self.set(key, value, ttl)
-        
-        return value
-    
+
+        ttl = ttl or self.default_ttl
+        stale_ttl = settings.cache_stale_ttl if stale_ttl is None else stale_ttl
+        entry = _unwrap_entry(self.get(key))
+        state = _entry_state(entry)
+        if state == ENTRY_FRESH:
+            return entry["v"]
+
+        if state != ENTRY_MISSING:
+            # Старое значение есть: пересчитывает только владелец аренды
+            lock = self._key_lock(key)
+            if not lock.acquire(blocking=False):
+                return self._serve_stale(entry)
+            try:
+                token = self._acquire_lease(key)
+                if token is None:
+                    return self._serve_stale(entry)
+                try:
+                    return self._recompute(key, callback, ttl, stale_ttl)
+                finally:
+                    self._release_lease(key, token)
+            finally:
+                lock.release()
+
+        with self._key_lock(key):
+            # Пока ждали блокировку, значение мог вычислить другой поток
+            entry = _unwrap_entry(self._fetch(key, record=False))
+            if entry is not None:
+                return entry["v"]
+
+            token = self._acquire_lease(key)
+            if token is None:
+                entry = self._wait_for_entry(key)
+                if entry is not None:
+                    return entry["v"]
+                # Владелец аренды не успел (или упал): вычисляем сами
+            try:
+                return self._recompute(key, callback, ttl, stale_ttl)
+            finally:
+                if token:
+                    self._release_lease(key, token)
+
     def increment(self, key: str, amount: int = 1) -> Optional[int]:
         """Увеличение числового значения"""
-        if not self.enabled or not self.client:
+        if not self._ready():
             return None
-        
+
         try:
             result = self.client.incr(key, amount)
+            if self.local is not None:
+                self.local.delete([key])
+                self._publish_invalidation(keys=[key])
             cache_logger.debug(f"Значение увеличено для ключа {key}: {result}")
             return result
         except Exception as e:
+            self._record_failure(e)
             cache_logger.error(f"Ошибка при увеличении значения для ключа {key}: {e}")
             return None
-    
+
     def expire(self, key: str, ttl: int) -> bool:
         """Установка TTL для существующего ключа"""
-        if not self.enabled or not self.client:
+        if not self._ready():
             return False
-        
+
         try:
             result = bool(self.client.expire(key, ttl))
             if result:
                 cache_logger.debug(f"TTL установлен для ключа {key}: {ttl}s")
             return result
         except Exception as e:
+            self._record_failure(e)
             cache_logger.error(f"Ошибка при установке TTL для ключа {key}: {e}")
             return False
-    
+
     def get_ttl(self, key: str) -> Optional[int]:
         """Получение оставшегося TTL для ключа"""
-        if not self.enabled or not self.client:
+        if not self._ready():
             return None
-        
+
         try:
             ttl = self.client.ttl(key)
             return ttl if ttl > 0 else None
         except Exception as e:
+            self._record_failure(e)
             cache_logger.error(f"Ошибка при получении TTL для ключа {key}: {e}")
             return None
-    
+
     def flush_all(self) -> bool:
         """Очистка всего кэша"""
-        if not self.enabled or not self.client:
+        if not self._ready():
             return False
-        
+
         try:
+            if self.local is not None:
+                self.local.clear()
+                self._publish_invalidation(clear=True)
             result = self.client.flushdb()
             cache_logger.info("Весь кэш очищен")
             return bool(result)
         except Exception as e:
+            self._record_failure(e)
             cache_logger.error(f"Ошибка при очистке всего кэша: {e}")
             return False
 
+    def get_generation(self, namespace: str) -> int:
+        """Текущее поколение пространства имен"""
+        return self.get_generations([namespace])[0]
+
+    def get_generations(self, namespaces: List[str]) -> List[int]:
+        """Текущие поколения нескольких пространств имен за один запрос"""
+        if not namespaces or not self._ready():
+            return [0] * len(namespaces)
+
+        known, missing = self._local_generations(namespaces)
+        if missing:
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                self._queue_generation_reads(pipe, missing)
+                values = pipe.execute()[-1]
+            except Exception as e:
+                self._record_failure(e)
+                cache_logger.error(f"Ошибка при получении поколений {missing}: {e}")
+                return [0] * len(namespaces)
+            self._remember_generations(missing, values, known)
+        return [known[namespace] for namespace in namespaces]
+
+    def bump_generation(self, namespace: str) -> Optional[int]:
+        """Инвалидировать все ключи пространства имен одним INCR
+
+        Ключи прежних поколений становятся недостижимыми и истекают по TTL
+        или удаляются sweep_stale_generations.
+        """
+        if not self._ready():
+            self._remember_missed(namespaces=[namespace])
+            return None
+
+        key = generation_key(namespace)
+        try:
+            pipe = self.client.pipeline(transaction=True)
+            pipe.set(key, _initial_generation(), nx=True)
+            pipe.incr(key)
+            generation = pipe.execute()[1]
+            if self.local is not None:
+                self.local.delete([key])
+                self._publish_invalidation(keys=[key])
+            cache_logger.debug(f"Новое поколение {namespace}: {generation}")
+            return generation
+        except Exception as e:
+            self._record_failure(e)
+            self._remember_missed(namespaces=[namespace])
+            cache_logger.error(
+                f"Ошибка при инвалидации пространства имен {namespace}: {e}"
+            )
+            return None
+
+    def namespaced_key(self, namespace: str, key: str) -> str:
+        """Ключ в текущем поколении пространства имен"""
+        return versioned_key(namespace, self.get_generation(namespace), key)
+
+    def sweep_stale_generations(
+        self, match: str = "*:v*:*", batch_size: Optional[int] = None
+    ) -> int:
+        """Удалить ключи устаревших поколений (SCAN порциями, UNLINK)
+
+        Такие ключи и так истекут по TTL; уборка нужна, чтобы они не занимали
+        память до истечения. Безопасна при запуске с нескольких воркеров.
+        """
+        if not self._ready():
+            return 0
+
+        deleted_count = 0
+        try:
+            for keys in self._scan_batches(match, batch_size):
+                versioned = []
+                for key in keys:
+                    parsed = _VERSIONED_KEY.match(key)
+                    if parsed:
+                        versioned.append((key, parsed.group(1), int(parsed.group(2))))
+                if not versioned:
+                    continue
+
+                namespaces = sorted({namespace for _, namespace, _ in versioned})
+                current = dict(
+                    zip(
+                        namespaces,
+                        self.client.mget(
+                            [generation_key(namespace) for namespace in namespaces]
+                        ),
+                    )
+                )
+                # Без счетчика поколения ключ недостижим: get_generation начнет новое
+                stale = [
+                    key
+                    for key, namespace, generation in versioned
+                    if current[namespace] is None
+                    or generation < int(current[namespace])
+                ]
+                if stale:
+                    deleted_count += self.client.unlink(*stale)
+        except Exception as e:
+            self._record_failure(e)
+            cache_logger.error(f"Ошибка при уборке устаревших поколений кэша: {e}")
+
+        if deleted_count:
+            cache_logger.info(f"Удалено {deleted_count} ключей устаревших поколений")
+        return deleted_count
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """Получение значения из кэша (async)"""
+        return await self._afetch(key)
+
+    async def _afetch(self, key: str, record: bool = True) -> Optional[Any]:
+        if not self._aready():
+            return None
+
+        result = self._get_local(key, record)
+        if result is not None:
+            return result
+
+        try:
+            started = time.perf_counter()
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                value, pttl = await pipe.execute()
+            self.metrics.observe_latency("get", time.perf_counter() - started)
+            return self._on_fetched(key, value, pttl, record)
+        except Exception as e:
+            self._record_failure(e)
+            self.metrics.record_error(key)
+            cache_logger.error(f"Ошибка при получении кэша {key}: {e}")
+            return None
+
+    async def aset(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        """Установка значения в кэш (async)"""
+        if not self._aready():
+            return False
+
+        try:
+            serialized_value = self.codec.dumps(value)
+            ttl = ttl or self.default_ttl
+            started = time.perf_counter()
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                pipe.set(key, serialized_value, ex=ttl)
+                if self.local is not None:
+                    pipe.publish(
+                        settings.cache_invalidation_channel,
+                        self._invalidation_message(keys=[key]),
+                    )
+                result = (await pipe.execute())[0]
+            self.metrics.observe_latency("set", time.perf_counter() - started)
+            self.metrics.record_write(key, len(serialized_value))
+
+            if result:
+                cache_logger.debug(f"Значение установлено в кэш: {key}, TTL: {ttl}s")
+                if self.local is not None:
+                    self.local.delete([key])
+            return bool(result)
+        except Exception as e:
+            self._record_failure(e)
+            self.metrics.record_error(key)
+            cache_logger.error(f"Ошибка при установке кэша {key}: {e}")
+            return False
+
+    async def adelete(self, *keys: str) -> int:
+        """Удаление значений из кэша одним запросом (async)"""
+        if not keys:
+            return 0
+        if not self._aready():
+            self._remember_missed(keys=keys)
+            return 0
+
+        try:
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                pipe.unlink(*keys)
+                if self.local is not None:
+                    pipe.publish(
+                        settings.cache_invalidation_channel,
+                        self._invalidation_message(keys=list(keys)),
+                    )
+                deleted_count = (await pipe.execute())[0]
+            if self.local is not None:
+                self.local.delete(keys)
+            return deleted_count
+        except Exception as e:
+            self._record_failure(e)
+            self._remember_missed(keys=keys)
+            self._record_errors(keys)
+            cache_logger.error(f"Ошибка при удалении кэша {keys}: {e}")
+            return 0
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Значения нескольких ключей одним MGET (async)"""
+        if not self._aready():
+            return {}
+
+        found, missing = self._get_many_local(keys)
+        if not missing:
+            return found
+
+        try:
+            started = time.perf_counter()
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                pipe.mget(missing)
+                if self.local is not None:
+                    for key in missing:
+                        pipe.pttl(key)
+                values, *pttls = await pipe.execute()
+            self.metrics.observe_latency("mget", time.perf_counter() - started)
+        except Exception as e:
+            self._record_failure(e)
+            self._record_errors(missing)
+            cache_logger.error(
+                f"Ошибка при получении {len(missing)} ключей из кэша: {e}"
+            )
+            return found
+
+        return self._collect_fetched(
+            found, missing, values, pttls or [None] * len(missing)
+        )
+
+    async def aset_many(
+        self, mapping: Dict[str, Any], ttl: Union[int, Dict[str, int], None] = None
+    ) -> bool:
+        """Установка нескольких значений одним конвейером (async)"""
+        if not mapping or not self._aready():
+            return False
+
+        try:
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.set(
+                        key,
+                        self._dumps_recorded(key, value),
+                        ex=self._ttl_for(key, ttl),
+                    )
+                if self.local is not None:
+                    pipe.publish(
+                        settings.cache_invalidation_channel,
+                        self._invalidation_message(keys=list(mapping)),
+                    )
+                started = time.perf_counter()
+                results = await pipe.execute()
+            self.metrics.observe_latency("mset", time.perf_counter() - started)
+
+            if self.local is not None:
+                self.local.delete(mapping)
+                results = results[:-1]
+            cache_logger.debug(f"Установлено {len(mapping)} значений в кэш")
+            return all(results)
+        except Exception as e:
+            self._record_failure(e)
+            self._record_errors(mapping)
+            cache_logger.error(
+                f"Ошибка при установке {len(mapping)} значений в кэш: {e}"
+            )
+            return False
+
+    async def adelete_many(self, keys: Iterable[str]) -> int:
+        """Удаление нескольких ключей одной командой UNLINK (async)"""
+        return await self.adelete(*keys)
+
+    async def aexists(self, key: str) -> bool:
+        """Проверка существования ключа (async)"""
+        if not self._aready():
+            return False
+
+        try:
+            return bool(await self.async_client.exists(key))
+        except Exception as e:
+            self._record_failure(e)
+            cache_logger.error(f"Ошибка при проверке существования ключа {key}: {e}")
+            return False
+
+    async def aget_or_set(
+        self,
+        key: str,
+        callback: Callable,
+        ttl: Optional[int] = None,
+        stale_ttl: Optional[int] = None,
+    ) -> Any:
+        """Получение из кэша или установка через callback (обычный или async)
+
+        Та же защита от одновременного пересчета, что и в get_or_set.
+        """
+        if not self._aready():
+            return await _resolve(callback())
+
+        ttl = ttl or self.default_ttl
+        stale_ttl = settings.cache_stale_ttl if stale_ttl is None else stale_ttl
+        entry = _unwrap_entry(await self.aget(key))
+        state = _entry_state(entry)
+        if state == ENTRY_FRESH:
+            return entry["v"]
+
+        if state != ENTRY_MISSING:
+            lock = self._async_key_lock(key)
+            if lock.locked():
+                return self._serve_stale(entry)
+            async with lock:
+                token = await self._aacquire_lease(key)
+                if token is None:
+                    return self._serve_stale(entry)
+                try:
+                    return await self._arecompute(key, callback, ttl, stale_ttl)
+                finally:
+                    await self._arelease_lease(key, token)
+
+        async with self._async_key_lock(key):
+            entry = _unwrap_entry(await self._afetch(key, record=False))
+            if entry is not None:
+                return entry["v"]
+
+            token = await self._aacquire_lease(key)
+            if token is None:
+                entry = await self._await_entry(key)
+                if entry is not None:
+                    return entry["v"]
+            try:
+                return await self._arecompute(key, callback, ttl, stale_ttl)
+            finally:
+                if token:
+                    await self._arelease_lease(key, token)
+
+    async def aincrement(self, key: str, amount: int = 1) -> Optional[int]:
+        """Увеличение числового значения (async)"""
+        if not self._aready():
+            return None
+
+        try:
+            async with self.async_client.pipeline(transaction=False) as pipe:
+                pipe.incr(key, amount)
+                if self.local is not None:
+                    pipe.publish(
+                        settings.cache_invalidation_channel,
+                        self._invalidation_message(keys=[key]),
+                    )
+                result = (await pipe.execute())[0]
+            if self.local is not None:
+                self.local.delete([key])
+            return result
+        except Exception as e:
+            self._record_failure(e)
+            cache_logger.error(f"Ошибка при увеличении значения для ключа {key}: {e}")
+            return None
+
+    async def aget_generation(self, namespace: str) -> int:
+        """Текущее поколение пространства имен (async)"""
+        return (await self.aget_generations([namespace]))[0]
+
+    async def aget_generations(self, namespaces: List[str]) -> List[int]:
+        """Текущие поколения нескольких пространств имен за один запрос (async)"""
+        if not namespaces or not self._aready():
+            return [0] * len(namespaces)
+
+        known, missing = self._local_generations(namespaces)
+        if missing:
+            try:
+                async with self.async_client.pipeline(transaction=False) as pipe:
+                    self._queue_generation_reads(pipe, missing)
+                    values = (await pipe.execute())[-1]
+            except Exception as e:
+                self._record_failure(e)
+                cache_logger.error(f"Ошибка при получении поколений {missing}: {e}")
+                return [0] * len(namespaces)
+            self._remember_generations(missing, values, known)
+        return [known[namespace] for namespace in namespaces]
+
+    async def abump_generation(self, namespace: str) -> Optional[int]:
+        """Инвалидировать все ключи пространства имен одним INCR (async)"""
+        if not self._aready():
+            self._remember_missed(namespaces=[namespace])
+            return None
+
+        key = generation_key(namespace)
+        try:
+            async with self.async_client.pipeline(transaction=True) as pipe:
+                pipe.set(key, _initial_generation(), nx=True)
+                pipe.incr(key)
+                generation = (await pipe.execute())[1]
+            if self.local is not None:
+                self.local.delete([key])
+                await self.async_client.publish(
+                    settings.cache_invalidation_channel,
+                    self._invalidation_message(keys=[key]),
+                )
+            cache_logger.debug(f"Новое поколение {namespace}: {generation}")
+            return generation
+        except Exception as e:
+            self._record_failure(e)
+            self._remember_missed(namespaces=[namespace])
+            cache_logger.error(
+                f"Ошибка при инвалидации пространства имен {namespace}: {e}"
+            )
+            return None
+
+    async def anamespaced_key(self, namespace: str, key: str) -> str:
+        """Ключ в текущем поколении пространства имен (async)"""
+        return versioned_key(namespace, await self.aget_generation(namespace), key)
+
+    async def aclose(self):
+        """Закрыть асинхронный пул соединений"""
+        if self.async_client is not None:
+            await self.async_client.aclose()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Счетчики попаданий/промахов по уровням, пересчетов и размер L1"""
+        with self._stats_lock:
+            stats = {name: self.stats[name] for name in STAT_COUNTERS}
+        if self.local is not None:
+            stats["l1_entries"] = len(self.local)
+            stats["l1_bytes"] = self.local.size_bytes
+        return stats
+
+    def get_metrics(self, top_keys: int = 20) -> dict:
+        """Счетчики, метрики по пространствам имен, задержки и выборка ключей"""
+        return {
+            "enabled": self.enabled,
+            "circuit_breaker": self.breaker.snapshot(),
+            "stats": self.get_stats(),
+            **self.metrics.snapshot(),
+            "top_keys": self.metrics.top_keys_report(top_keys),
+        }
+
+    def render_metrics(self) -> str:
+        """Метрики кэша в текстовом формате Prometheus"""
+        lines = []
+        for name, value in self.get_stats().items():
+            kind = "counter" if name in STAT_COUNTERS else "gauge"
+            metric = f"cache_{name}_total" if kind == "counter" else f"cache_{name}"
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {value}")
+        breaker = self.breaker.snapshot()
+        lines.append("# TYPE cache_circuit_open gauge")
+        lines.append(f"cache_circuit_open {int(breaker['state'] != STATE_CLOSED)}")
+        lines.append("# TYPE cache_circuit_rejected_total counter")
+        lines.append(f"cache_circuit_rejected_total {breaker['rejected']}")
+        lines.append("# TYPE cache_circuit_trips_total counter")
+        lines.append(f"cache_circuit_trips_total {breaker['trips']}")
+        lines.extend(self.metrics.render_prometheus())
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        """Остановить подписку на инвалидацию"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener.join(timeout=2.0)
+            self._listener = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def _scan_batches(
+        self, match: str, batch_size: Optional[int] = None
+    ) -> Iterator[List[str]]:
+        """Ключи по паттерну порциями через SCAN"""
+        batch_size = batch_size or settings.cache_scan_batch_size
+        batch = []
+        for key in self.client.scan_iter(match=match, count=batch_size):
+            batch.append(key.decode("utf-8") if isinstance(key, bytes) else key)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _key_lock(self, key: str) -> threading.Semaphore:
+        with self._key_locks_guard:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Semaphore(1)
+            return lock
+
+    def _async_key_lock(self, key: str) -> asyncio.Lock:
+        with self._key_locks_guard:
+            lock = self._async_key_locks.get(key)
+            if lock is None:
+                lock = self._async_key_locks[key] = asyncio.Lock()
+            return lock
+
+    def _serve_stale(self, entry: dict) -> Any:
+        self._count("stale_hits")
+        return entry["v"]
+
+    def _acquire_lease(self, key: str) -> Optional[str]:
+        """Аренда пересчета ключа между воркерами; "" - Redis недоступен, считаем без аренды"""
+        token = uuid.uuid4().hex
+        try:
+            if self.client.set(lease_key(key), token, nx=True, px=_lease_ttl_ms()):
+                return token
+            return None
+        except Exception as e:
+            self._record_failure(e)
+            cache_logger.error(f"Ошибка при получении аренды {key}: {e}")
+            return ""
+
+    def _release_lease(self, key: str, token: str):
+        try:
+            self.client.eval(RELEASE_LEASE_SCRIPT, 1, lease_key(key), token)
+        except Exception as e:
+            self._record_failure(e)
+            cache_logger.error(f"Ошибка при снятии аренды {key}: {e}")
+
+    def _wait_for_entry(self, key: str) -> Optional[dict]:
+        """Дождаться значения, которое вычисляет владелец аренды"""
+        self._count("lease_waits")
+        deadline = time.monotonic() + settings.cache_lease_ttl
+        delay = LEASE_POLL_MIN
+        while time.monotonic() < deadline:
+            time.sleep(delay)
+            entry = _unwrap_entry(self._fetch(key, record=False))
+            if entry is not None:
+                return entry
+            delay = min(delay * 2, LEASE_POLL_MAX)
+        return None
+
+    def _recompute(self, key: str, callback: Callable, ttl: int, stale_ttl: int) -> Any:
+        started = time.perf_counter()
+        value = callback()
+        self._count("recomputes")
+        if value is not None:
+            self.set(
+                key,
+                _wrap_entry(value, time.perf_counter() - started, ttl),
+                ttl + stale_ttl,
+            )
+        return value
+
+    async def _aacquire_lease(self, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        try:
+            if await self.async_client.set(
+                lease_key(key), token, nx=True, px=_lease_ttl_ms()
+            ):
+                return token
+            return None
+        except Exception as e:
+            self._record_failure(e)
+            cache_logger.error(f"Ошибка при получении аренды {key}: {e}")
+            return ""
+
+    async def _arelease_lease(self, key: str, token: str):
+        try:
+            await self.async_client.eval(RELEASE_LEASE_SCRIPT, 1, lease_key(key), token)
+        except Exception as e:
+            self._record_failure(e)
+            cache_logger.error(f"Ошибка при снятии аренды {key}: {e}")
+
+    async def _await_entry(self, key: str) -> Optional[dict]:
+        self._count("lease_waits")
+        deadline = time.monotonic() + settings.cache_lease_ttl
+        delay = LEASE_POLL_MIN
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            entry = _unwrap_entry(await self._afetch(key, record=False))
+            if entry is not None:
+                return entry
+            delay = min(delay * 2, LEASE_POLL_MAX)
+        return None
+
+    async def _arecompute(
+        self, key: str, callback: Callable, ttl: int, stale_ttl: int
+    ) -> Any:
+        started = time.perf_counter()
+        value = await _resolve(callback())
+        self._count("recomputes")
+        if value is not None:
+            await self.aset(
+                key,
+                _wrap_entry(value, time.perf_counter() - started, ttl),
+                ttl + stale_ttl,
+            )
+        return value
+
+    def _local_generations(
+        self, namespaces: List[str]
+    ) -> Tuple[Dict[str, int], List[str]]:
+        """Поколения, найденные в L1, и пространства имен, которые нужно прочитать из Redis"""
+        known = {}
+        if self.local is not None:
+            for namespace in namespaces:
+                generation = self.local.get(generation_key(namespace))
+                if generation is not None:
+                    known[namespace] = generation
+        return known, [
+            namespace
+            for namespace in dict.fromkeys(namespaces)
+            if namespace not in known
+        ]
+
+    def _queue_generation_reads(self, pipe, namespaces: List[str]):
+        # Счетчик стартует с текущего времени: если его вытеснят из Redis,
+        # новое поколение все равно окажется больше всех прежних
+        initial = _initial_generation()
+        for namespace in namespaces:
+            pipe.set(generation_key(namespace), initial, nx=True)
+        pipe.mget([generation_key(namespace) for namespace in namespaces])
+
+    def _remember_generations(
+        self, namespaces: List[str], values: List[bytes], known: Dict[str, int]
+    ):
+        for namespace, value in zip(namespaces, values):
+            known[namespace] = int(value)
+            if self.local is not None:
+                self.local.set(generation_key(namespace), known[namespace], len(value))
+
+    def _get_many_local(self, keys: Iterable[str]) -> Tuple[Dict[str, Any], List[str]]:
+        """Найденные в L1 значения и ключи, которые нужно прочитать из Redis"""
+        found, missing = {}, []
+        for key in dict.fromkeys(keys):
+            value = self._get_local(key)
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+        return found, missing
+
+    def _collect_fetched(
+        self, found: Dict[str, Any], keys: List[str], values: list, pttls: list
+    ) -> Dict[str, Any]:
+        for key, value, pttl in zip(keys, values, pttls):
+            result = self._on_fetched(key, value, pttl)
+            if result is not None:
+                found[key] = result
+        return found
+
+    def _ttl_for(self, key: str, ttl: Union[int, Dict[str, int], None]) -> int:
+        if isinstance(ttl, dict):
+            return ttl.get(key) or self.default_ttl
+        return ttl or self.default_ttl
+
+    def _get_local(self, key: str, record: bool = True) -> Optional[Any]:
+        """Значение из L1 с учетом в статистике"""
+        if self.local is None:
+            return None
+        result = self.local.get(key)
+        if result is not None:
+            self._count("l1_hits")
+            if record:
+                self.metrics.record_hit(key)
+        else:
+            self._count("l1_misses")
+        return result
+
+    def _on_fetched(
+        self, key: str, value: Optional[bytes], pttl: Optional[int], record: bool = True
+    ) -> Optional[Any]:
+        """Разобрать значение, прочитанное из Redis, и положить его в L1"""
+        if value is None:
+            self._count("l2_misses")
+            if record:
+                self.metrics.record_miss(key)
+            cache_logger.debug(f"Кэш-промах для ключа: {key}")
+            return None
+
+        try:
+            result = self.codec.loads(value)
+        except SerializationError as e:
+            # Запись в неизвестном формате считается промахом и будет перезаписана
+            self._count("l2_misses")
+            if record:
+                self.metrics.record_miss(key)
+            cache_logger.warning(f"Запись кэша {key} не декодирована: {e}")
+            return None
+        self._count("l2_hits")
+        if record:
+            self.metrics.record_hit(key, len(value))
+        cache_logger.debug(f"Значение получено из кэша: {key}")
+        if self.local is not None:
+            self.local.set(
+                key, result, len(value), pttl / 1000 if pttl and pttl > 0 else None
+            )
+        return result
+
+    def _dumps_recorded(self, key: str, value: Any) -> bytes:
+        serialized_value = self.codec.dumps(value)
+        self.metrics.record_write(key, len(serialized_value))
+        return serialized_value
+
+    def _record_errors(self, keys: Iterable[str]):
+        for key in keys:
+            self.metrics.record_error(key)
+
+    def _ready(self) -> bool:
+        """Можно ли обращаться к Redis: кэш включен, автомат защиты замкнут
+        и пропущенные инвалидации повторены"""
+        if not (self.enabled and self.client is not None and self.breaker.allow()):
+            return False
+        return not self._has_missed() or self._try_replay_missed()
+
+    def _aready(self) -> bool:
+        if not (
+            self.enabled and self.async_client is not None and self.breaker.allow()
+        ):
+            return False
+        if self._has_missed():
+            # Повтор - синхронным клиентом в фоновом потоке, чтобы не блокировать
+            # event loop; до его завершения кэш обходится
+            self._start_replay()
+            return False
+        return True
+
+    def _record_failure(self, error: Exception):
+        """Учесть в автомате защиты ошибку Redis (но не ошибку сериализации значения)"""
+        if isinstance(error, (redis.RedisError, OSError, asyncio.TimeoutError)):
+            self.breaker.record_failure()
+
+    def _probe_redis(self):
+        """Проба восстановления (фоновый поток): переподключиться, выполнить PING
+        и повторить пропущенные инвалидации до того, как кэш снова начнут читать"""
+        self.client.connection_pool.disconnect()
+        self.client.ping()
+        self._replay_missed_invalidations()
+
+    def _has_missed(self) -> bool:
+        """Есть ли инвалидации, не дошедшие до Redis
+
+        Сбой, после которого автомат защиты остался замкнутым (мало вызовов или
+        низкая доля ошибок), не запускает пробу: такие инвалидации повторяются
+        при следующем обращении к кэшу.
+        """
+        return bool(
+            self._missed_namespaces or self._missed_keys or self._missed_overflow
+        )
+
+    def _try_replay_missed(self) -> bool:
+        try:
+            self._replay_missed_invalidations()
+            return True
+        except Exception as e:
+            self._record_failure(e)
+            cache_logger.error(f"Не удалось повторить пропущенные инвалидации: {e}")
+            return False
+
+    def _start_replay(self):
+        with self._missed_lock:
+            if self._replay_thread is not None and self._replay_thread.is_alive():
+                return
+            self._replay_thread = threading.Thread(
+                target=self._try_replay_missed, name="redis-replay", daemon=True
+            )
+            self._replay_thread.start()
+
+    def _remember_missed(
+        self, namespaces: Iterable[str] = (), keys: Iterable[str] = ()
+    ):
+        """Запомнить инвалидацию, не дошедшую до Redis, чтобы повторить ее после восстановления"""
+        if not self.enabled:
+            return
+        with self._missed_lock:
+            self._missed_namespaces.update(namespaces)
+            self._missed_keys.update(keys)
+            if (
+                len(self._missed_namespaces) + len(self._missed_keys)
+                > settings.cache_breaker_replay_limit
+            ):
+                self._missed_namespaces.clear()
+                self._missed_keys.clear()
+                self._missed_overflow = True
+
+    def _replay_missed_invalidations(self):
+        """Повторить пропущенные инвалидации: иначе после сбоя отдавались бы устаревшие записи"""
+        with self._missed_lock:
+            namespaces, self._missed_namespaces = self._missed_namespaces, set()
+            keys, self._missed_keys = self._missed_keys, set()
+            overflow, self._missed_overflow = self._missed_overflow, False
+
+        try:
+            if overflow:
+                # Пропущенных инвалидаций больше лимита: сбрасываем все записи с поколениями
+                cache_logger.warning(
+                    "Пропущено слишком много инвалидаций кэша, записи с поколениями удаляются"
+                )
+                for batch in self._scan_batches("*:v*:*"):
+                    self.client.unlink(*batch)
+            if namespaces or keys:
+                pipe = self.client.pipeline(transaction=False)
+                for namespace in namespaces:
+                    pipe.set(generation_key(namespace), _initial_generation(), nx=True)
+                    pipe.incr(generation_key(namespace))
+                if keys:
+                    pipe.unlink(*keys)
+                pipe.execute()
+                cache_logger.info(
+                    f"Повторены пропущенные инвалидации: {len(namespaces)} пространств имен, {len(keys)} ключей"
+                )
+        except Exception:
+            self._remember_missed(namespaces, keys)
+            self._missed_overflow = self._missed_overflow or overflow
+            raise
+
+    def _on_breaker_state_change(self, previous: str, state: str):
+        if state == STATE_OPEN:
+            cache_logger.error(
+                "Redis недоступен: кэш обходится до восстановления соединения"
+            )
+        elif state == STATE_CLOSED:
+            cache_logger.info(
+                "Соединение с Redis восстановлено, кэш снова используется"
+            )
+            if self.local is not None and self._listener is None:
+                self._start_invalidation_listener()
+        # Пока Redis был недоступен, сообщения об инвалидации могли быть потеряны
+        if self.local is not None:
+            self.local.clear()
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _start_invalidation_listener(self):
+        """Подписаться на инвалидацию L1 от других воркеров (фоновый поток)"""
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(
+            **{settings.cache_invalidation_channel: self._on_invalidation}
+        )
+        self._listener = self._pubsub.run_in_thread(
+            sleep_time=0.2, daemon=True, exception_handler=self._on_listener_error
+        )
+
+    def _publish_invalidation(
+        self,
+        keys: Optional[list] = None,
+        pattern: Optional[str] = None,
+        clear: bool = False,
+    ):
+        """Сообщить остальным воркерам, какие записи L1 устарели"""
+        try:
+            self.client.publish(
+                settings.cache_invalidation_channel,
+                self._invalidation_message(keys, pattern, clear),
+            )
+        except Exception as e:
+            self._record_failure(e)
+            cache_logger.error(f"Ошибка публикации инвалидации кэша: {e}")
+
+    def _invalidation_message(
+        self,
+        keys: Optional[list] = None,
+        pattern: Optional[str] = None,
+        clear: bool = False,
+    ) -> str:
+        return json.dumps(
+            {
+                "source": self.instance_id,
+                "keys": keys,
+                "pattern": pattern,
+                "clear": clear,
+            }
+        )
+
+    def _on_invalidation(self, message: dict):
+        """Обработать сообщение об инвалидации из канала"""
+        try:
+            data = json.loads(message["data"])
+        except (TypeError, ValueError):
+            cache_logger.warning(
+                f"Некорректное сообщение инвалидации: {message.get('data')!r}"
+            )
+            return
+
+        if data.get("source") == self.instance_id:
+            return
+        if data.get("clear"):
+            self.local.clear()
+        if data.get("keys"):
+            self.local.delete(data["keys"])
+        if data.get("pattern"):
+            self.local.delete_pattern(data["pattern"])
+
+    def _on_listener_error(self, error: Exception, pubsub, thread):
+        """Потеря подписки: сообщения могли быть пропущены, поэтому L1 сбрасывается"""
+        cache_logger.error(f"Ошибка подписки на инвалидацию кэша: {error}")
+        self.local.clear()
+        time.sleep(1.0)
+
+
+# Ключ с поколением: <пространство имен>:v<поколение>:<ключ>
+_VERSIONED_KEY = re.compile(r"^(.+?):v(\d+):")
+
+
+# Ключи Session.info: (теги, ключи) кэша, ожидающие коммита и уже закоммиченные
+PENDING_INVALIDATION_KEY = "cache_pending_invalidation"
+COMMITTED_INVALIDATION_KEY = "cache_committed_invalidation"
+
+
+def generation_key(namespace: str) -> str:
+    """Ключ счетчика поколений пространства имен"""
+    return f"{namespace}:gen"
+
+
+def versioned_key(namespace: str, generation: int, key: str) -> str:
+    """Ключ в заданном поколении пространства имен"""
+    return f"{namespace}:v{generation}:{key}"
+
+
+def _initial_generation() -> int:
+    return int(time.time() * 1000)
+
+
+def lease_key(key: str) -> str:
+    """Ключ аренды пересчета значения"""
+    return f"{key}:lease"
+
+
+def _lease_ttl_ms() -> int:
+    return int(settings.cache_lease_ttl * 1000)
+
+
+def _wrap_entry(value: Any, delta: float, ttl: int) -> dict:
+    """Обертка значения get_or_set: время вычисления и момент логического истечения"""
+    return {"v": value, "d": delta, "x": time.time() + ttl}
+
+
+def _unwrap_entry(raw: Any) -> Optional[dict]:
+    if isinstance(raw, dict) and raw.keys() == {"v", "d", "x"}:
+        return raw
+    return None
+
+
+def _entry_state(entry: Optional[dict]) -> str:
+    """Свежесть записи; XFetch: чем дольше пересчет, тем раньше его начинают"""
+    if entry is None:
+        return ENTRY_MISSING
+    now = time.time()
+    if now >= entry["x"]:
+        return ENTRY_STALE
+    # 1 - random() лежит в (0, 1], логарифм определен
+    if (
+        now - entry["d"] * settings.cache_xfetch_beta * math.log(1.0 - random.random())
+        >= entry["x"]
+    ):
+        return ENTRY_REFRESH
+    return ENTRY_FRESH
+
+
+def _pool_options() -> Dict[str, Any]:
+    """Параметры пула соединений: размер, ожидание свободного соединения, таймауты"""
+    return {
+        "max_connections": settings.redis_max_connections,
+        "timeout": settings.redis_pool_timeout,
+        "socket_timeout": settings.redis_socket_timeout,
+        "socket_connect_timeout": settings.redis_connect_timeout,
+        "health_check_interval": settings.redis_health_check_interval,
+    }
+
+
+async def _resolve(value: Any) -> Any:
+    """Дождаться результата, если callback асинхронный"""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
 
 # Создаем глобальный экземпляр менеджера кэша
 cache_manager = CacheManager()
@@ -196,37 +1515,220 @@ def get_cache_key(prefix: str, **kwargs) -> str:
     return ":".join(key_parts)
 
 
+def user_namespace(user_id: int) -> str:
+    """Пространство имен кэша пользователя"""
+    return f"user:{user_id}"
+
+
+def user_cache_key(user_id: int, prefix: str, **kwargs) -> str:
+    """Ключ кэша данных пользователя в текущем поколении"""
+    return cache_manager.namespaced_key(
+        user_namespace(user_id), get_cache_key(prefix, **kwargs)
+    )
+
+
 def invalidate_user_cache(user_id: int):
-    """Инвалидация кэша пользователя"""
+    """Инвалидация всего кэша пользователя (задачи, категории, статистика...)"""
     if not cache_manager.enabled:
         return
-    
-    patterns = [
-        f"user:{user_id}:todos:*",
-        f"user:{user_id}:categories:*",
-        f"user:{user_id}:statistics:*",
-        f"user:{user_id}:timeline:*"
-    ]
-    
-    total_deleted = 0
-    for pattern in patterns:
-        deleted = cache_manager.clear_pattern(pattern)
-        total_deleted += deleted
-    
-    if total_deleted > 0:
-        cache_logger.info(f"Инвалидирован кэш пользователя {user_id}: удалено {total_deleted} ключей")
 
+    generation = cache_manager.bump_generation(user_namespace(user_id))
+    if generation is not None:
+        cache_logger.info(
+            f"Инвалидирован кэш пользователя {user_id}: поколение {generation}"
+        )
+
+
+async def auser_cache_key(user_id: int, prefix: str, **kwargs) -> str:
+    """Ключ кэша данных пользователя в текущем поколении (async)"""
+    return await cache_manager.anamespaced_key(
+        user_namespace(user_id), get_cache_key(prefix, **kwargs)
+    )
+
+
+async def ainvalidate_user_cache(user_id: int):
+    """Инвалидация всего кэша пользователя (async)"""
+    if not cache_manager.enabled:
+        return
+
+    generation = await cache_manager.abump_generation(user_namespace(user_id))
+    if generation is not None:
+        cache_logger.info(
+            f"Инвалидирован кэш пользователя {user_id}: поколение {generation}"
+        )
+
+
+async def run_cache_janitor(interval: int):
+    """Периодическая уборка ключей устаревших поколений в фоне"""
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(cache_manager.sweep_stale_generations)
+
+
+def stable_digest(value: Any) -> str:
+    """Дайджест, одинаковый во всех процессах (в отличие от hash(), который рандомизирован)"""
+    data = orjson.dumps(
+        value,
+        default=_key_default,
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+    )
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _key_default(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    raise TypeError(
+        f"Аргумент типа {type(value).__name__} не участвует в ключе кэша - добавьте его в ignore"
+    )
+
+
+def user_tag(user_id: int, section: str) -> str:
+    """Тег раздела данных пользователя (todos, categories) для @cached и инвалидации"""
+    return f"user:{user_id}:{section}"
+
+
+def invalidate_after_commit(db: Session, *tags: str, keys: Iterable[str] = ()):
+    """Инвалидировать теги и удалить ключи после успешного коммита сессии; при откате - ничего"""
+    pending_tags, pending_keys = db.info.setdefault(
+        PENDING_INVALIDATION_KEY, (set(), set())
+    )
+    pending_tags.update(tags)
+    pending_keys.update(keys)
+
+
+async def ainvalidate_committed(db: AsyncSession):
+    """Инвалидировать теги и ключи, закоммиченные внутри AsyncSession.run_sync"""
+    committed = db.sync_session.info.pop(COMMITTED_INVALIDATION_KEY, None)
+    if committed:
+        tags, keys = committed
+        await ainvalidate_tags(*sorted(tags))
+        await cache_manager.adelete_many(sorted(keys))
+
+
+async def run_sync_invalidating(db: AsyncSession, fn: Callable, *args, **kwargs) -> Any:
+    """AsyncSession.run_sync для изменяющей функции crud с инвалидацией ее тегов после коммита"""
+    try:
+        return await db.run_sync(fn, *args, **kwargs)
+    finally:
+        await ainvalidate_committed(db)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session):
+    pending = session.info.pop(PENDING_INVALIDATION_KEY, None)
+    if not pending:
+        return
+    tags, keys = pending
+    if _in_event_loop():
+        # Сессия внутри AsyncSession.run_sync: синхронный запрос в Redis заблокировал
+        # бы event loop, инвалидацию выполнит ainvalidate_committed
+        committed_tags, committed_keys = session.info.setdefault(
+            COMMITTED_INVALIDATION_KEY, (set(), set())
+        )
+        committed_tags.update(tags)
+        committed_keys.update(keys)
+    else:
+        invalidate_tags(*sorted(tags))
+        cache_manager.delete_many(sorted(keys))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_invalidation(session: Session):
+    session.info.pop(PENDING_INVALIDATION_KEY, None)
+
+
+def _in_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def invalidate_tags(*tags: str):
+    """Инвалидировать все записи @cached с этими тегами"""
+    for tag in tags:
+        cache_manager.bump_generation(tag)
+
+
+async def ainvalidate_tags(*tags: str):
+    """Инвалидировать все записи @cached с этими тегами (async)"""
+    for tag in tags:
+        await cache_manager.abump_generation(tag)
+
+
+def cached(
+    ttl: int = None,
+    key_prefix: Optional[str] = None,
+    ignore: Sequence[str] = ("db",),
+    tags: Sequence[str] = (),
+    stale_ttl: Optional[int] = None,
+):
+    """Декоратор кэширования результата обычной или async функции
+
+    Ключ - дайджест имени функции, аргументов (кроме ignore) и текущих поколений
+    тегов. Теги - шаблоны по аргументам, например "user:{user_id}"; тег
+    user:{id} совпадает с пространством имен invalidate_user_cache. Результат
+    должен сериализоваться кодеком кэша (словари, списки, скаляры).
+    """
 
-def cache_with_ttl(ttl: int = None):
-    """Декоратор для кэширования функций"""
     def decorator(func: Callable):
+        signature = inspect.signature(func)
+        name = key_prefix or f"{func.__module__}.{func.__qualname__}"
+
+        def key_parts(args, kwargs) -> Tuple[Dict[str, Any], List[str]]:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {
+                key: value
+                for key, value in bound.arguments.items()
+                if key not in ignore
+            }
+            return arguments, [tag.format(**bound.arguments) for tag in tags]
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not cache_manager.enabled:
+                    return await func(*args, **kwargs)
+
+                arguments, tag_names = key_parts(args, kwargs)
+                generations = await cache_manager.aget_generations(tag_names)
+                if 0 in generations:
+                    # Поколения не прочитаны (Redis недоступен): ключ мог бы указать на устаревшую запись
+                    return await func(*args, **kwargs)
+                cache_key = f"cache:{name}:{stable_digest([arguments, generations])}"
+                return await cache_manager.aget_or_set(
+                    cache_key, lambda: func(*args, **kwargs), ttl, stale_ttl
+                )
+
+            return async_wrapper
+
+        @functools.wraps(func)
         def wrapper(*args, **kwargs):
             if not cache_manager.enabled:
                 return func(*args, **kwargs)
-            
-            # Создаем ключ кэша на основе имени функции и аргументов
-            cache_key = f"{func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
-            
-            return cache_manager.get_or_set(cache_key, lambda: func(*args, **kwargs), ttl)
+
+            arguments, tag_names = key_parts(args, kwargs)
+            generations = cache_manager.get_generations(tag_names)
+            if 0 in generations:
+                return func(*args, **kwargs)
+            cache_key = f"cache:{name}:{stable_digest([arguments, generations])}"
+            return cache_manager.get_or_set(
+                cache_key, lambda: func(*args, **kwargs), ttl, stale_ttl
+            )
+
         return wrapper
+
     return decorator
+
+
+def cache_with_ttl(ttl: int = None):
+    """Декоратор для кэширования функций (см. cached)"""
+    return cached(ttl=ttl)
@@ -0,0 +1,246 @@
+"""Метрики кэша: попадания и ошибки по пространствам имен, гистограммы
+задержек и размеров, выборочный отчет о самых частых и крупных ключах"""
+
+import bisect
+import random
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# Границы корзин гистограмм (как le в Prometheus); последняя корзина - +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+NAMESPACE_COUNTERS = ("hits", "misses", "errors")
+
+# Числовые части ключа (id пользователя, поколение) не входят в пространство
+# имен, чтобы число меток не росло вместе с данными
+_VARIABLE_SEGMENT = re.compile(r"^v?\d+$")
+
+
+def key_namespace(key: str) -> str:
+    """Пространство имен ключа для метрик: user:1:v5:notifications -> user:notifications"""
+    parts = key.split(":")
+    if parts[0] == "cache" and len(parts) > 2:
+        # Ключи @cached: cache:{модуль.функция}:{хеш аргументов}
+        return f"cache:{parts[1]}"
+    static = [part for part in parts[:4] if not _VARIABLE_SEGMENT.match(part)]
+    return ":".join(static[:2]) or "other"
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        cumulative, seen = {}, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            cumulative[str(bound)] = seen
+        cumulative["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": cumulative,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class TopKeys:
+    """Выборочный учет частых и крупных ключей (алгоритм Space-Saving)
+
+    Учитывается доля sample_rate обращений; при заполнении вытесняется ключ
+    с наименьшим счетчиком, а новый наследует его счетчик как оценку сверху.
+    """
+
+    def __init__(self, capacity: int = 1000, sample_rate: float = 0.01):
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.counts: Dict[str, int] = {}
+        self.sizes: Dict[str, int] = {}
+
+    def record(self, key: str, size: int):
+        if self.sample_rate <= 0 or (
+            self.sample_rate < 1 and random.random() >= self.sample_rate
+        ):
+            return
+        if key not in self.counts and len(self.counts) >= self.capacity:
+            evicted = min(self.counts, key=self.counts.get)
+            self.counts[key] = self.counts.pop(evicted)
+            self.sizes.pop(evicted, None)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.sizes[key] = max(size, self.sizes.get(key, 0))
+
+    def report(self, limit: int = 20) -> dict:
+        """Самые частые и самые крупные ключи среди учтенных"""
+
+        def entry(key: str) -> dict:
+            return {
+                "key": key,
+                "sampled_count": self.counts[key],
+                "max_size": self.sizes.get(key, 0),
+            }
+
+        hottest = sorted(self.counts, key=self.counts.get, reverse=True)[:limit]
+        largest = sorted(self.sizes, key=self.sizes.get, reverse=True)[:limit]
+        return {
+            "sample_rate": self.sample_rate,
+            "hot": [entry(key) for key in hottest],
+            "large": [entry(key) for key in largest],
+        }
+
+
+class CacheMetrics:
+    """Потокобезопасный набор метрик одного CacheManager"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        top_keys_capacity: int = 1000,
+        top_keys_sample_rate: float = 0.01,
+    ):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._top_keys_options = (top_keys_capacity, top_keys_sample_rate)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters: Dict[str, Counter] = defaultdict(Counter)
+            self.sizes: Dict[str, Histogram] = {}
+            self.latency: Dict[str, Histogram] = {}
+            self.top_keys = TopKeys(*self._top_keys_options)
+
+    def record_hit(self, key: str, size: Optional[int] = None):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[key_namespace(key)]["hits"] += 1
+            if size is not None:
+                self.top_keys.record(key, size)
+
+    def record_miss(self, key: str):
+        if self.enabled:
+            with self._lock:
+                self.counters[key_namespace(key)]["misses"] += 1
+
+    def record_error(self, key: str):
+        if self.enabled:
+            with self._lock:
+                self.counters[key_namespace(key)]["errors"] += 1
+
+    def record_write(self, key: str, size: int):
+        """Размер записанного (сериализованного) значения"""
+        if not self.enabled:
+            return
+        namespace = key_namespace(key)
+        with self._lock:
+            histogram = self.sizes.get(namespace)
+            if histogram is None:
+                histogram = self.sizes[namespace] = Histogram(SIZE_BUCKETS)
+            histogram.observe(size)
+            self.top_keys.record(key, size)
+
+    def observe_latency(self, operation: str, seconds: float):
+        """Задержка запроса к Redis: get, set, mget, mset"""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.latency.get(operation)
+            if histogram is None:
+                histogram = self.latency[operation] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def snapshot(self) -> dict:
+        """Метрики в виде словаря (для административного эндпоинта)"""
+        with self._lock:
+            namespaces = {}
+            for namespace in sorted(set(self.counters) | set(self.sizes)):
+                counters = self.counters.get(namespace, Counter())
+                lookups = counters["hits"] + counters["misses"]
+                namespaces[namespace] = {
+                    **{name: counters[name] for name in NAMESPACE_COUNTERS},
+                    "hit_ratio": counters["hits"] / lookups if lookups else None,
+                    "value_size": (
+                        self.sizes[namespace].snapshot()
+                        if namespace in self.sizes
+                        else None
+                    ),
+                }
+            return {
+                "namespaces": namespaces,
+                "latency": {
+                    operation: histogram.snapshot()
+                    for operation, histogram in sorted(self.latency.items())
+                },
+            }
+
+    def top_keys_report(self, limit: int = 20) -> dict:
+        with self._lock:
+            return self.top_keys.report(limit)
+
+    def render_prometheus(self, prefix: str = "cache") -> List[str]:
+        """Строки в текстовом формате Prometheus"""
+        lines = []
+        with self._lock:
+            for name in NAMESPACE_COUNTERS:
+                lines.append(f"# TYPE {prefix}_{name}_total counter")
+                for namespace, counters in sorted(self.counters.items()):
+                    lines.append(
+                        f'{prefix}_{name}_total{{namespace="{namespace}"}} {counters[name]}'
+                    )
+
+            lines.append(f"# TYPE {prefix}_operation_duration_seconds histogram")
+            for operation, histogram in sorted(self.latency.items()):
+                lines.extend(
+                    histogram_lines(
+                        f"{prefix}_operation_duration_seconds",
+                        f'operation="{operation}"',
+                        histogram,
+                    )
+                )
+
+            lines.append(f"# TYPE {prefix}_value_size_bytes histogram")
+            for namespace, histogram in sorted(self.sizes.items()):
+                lines.extend(
+                    histogram_lines(
+                        f"{prefix}_value_size_bytes",
+                        f'namespace="{namespace}"',
+                        histogram,
+                    )
+                )
+        return lines
+
+
+def histogram_lines(name: str, labels: str, histogram: Histogram) -> List[str]:
+    lines = [
+        f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+        for bound, count in histogram.snapshot()["buckets"].items()
+    ]
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
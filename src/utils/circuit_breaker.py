@@ -0,0 +1,170 @@
+"""Автомат защиты (circuit breaker) для внешней зависимости
+
+Закрыт - вызовы идут в зависимость, ошибки считаются в скользящем окне.
+Когда доля ошибок превышает порог, автомат размыкается: вызовы сразу
+отклоняются, пока фоновая проверка (half-open) не подтвердит, что
+зависимость снова доступна.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+from src.utils.logger import cache_logger
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Автомат защиты с порогом доли ошибок и фоновой пробой восстановления
+
+    Вызов учитывается при допуске (allow), ошибка - через record_failure,
+    поэтому успешные вызовы не требуют отдельной отметки. После открытия
+    через open_timeout секунд в фоновом потоке выполняется probe; при
+    неудаче таймаут удваивается до max_open_timeout.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        probe: Callable[[], Any],
+        failure_rate: float = 0.5,
+        min_calls: int = 20,
+        window: float = 10.0,
+        open_timeout: float = 5.0,
+        max_open_timeout: float = 60.0,
+        on_state_change: Optional[Callable[[str, str], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.probe = probe
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.base_open_timeout = open_timeout
+        self.max_open_timeout = max_open_timeout
+        self.on_state_change = on_state_change
+        self.clock = clock
+        self.state = STATE_CLOSED
+        self.open_timeout = open_timeout
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.trips = 0
+        self._lock = threading.Lock()
+        # Окно из секундных корзин [секунда, вызовы, ошибки]: допуск вызова - O(1)
+        self._buckets = deque()
+        self._calls = 0
+        self._failures = 0
+        self._probe_thread: Optional[threading.Thread] = None
+
+    def allow(self) -> bool:
+        """Можно ли обращаться к зависимости; при разомкнутом автомате - False без ожидания"""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                self._bucket()[1] += 1
+                self._calls += 1
+                return True
+            self.rejected += 1
+            if (
+                self.state == STATE_OPEN
+                and self.clock() - self.opened_at >= self.open_timeout
+            ):
+                self._start_probe()
+            return False
+
+    def record_failure(self):
+        """Учесть ошибку вызова; при превышении порога автомат размыкается"""
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                return
+            self._bucket()[2] += 1
+            self._failures += 1
+            if (
+                self._calls < self.min_calls
+                or self._failures < self.failure_rate * self._calls
+            ):
+                return
+            self._open()
+        self._notify(STATE_CLOSED, STATE_OPEN)
+
+    def trip(self):
+        """Разомкнуть автомат немедленно (например, зависимость недоступна при старте)"""
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                return
+            self._open()
+        self._notify(STATE_CLOSED, STATE_OPEN)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._expire_buckets()
+            return {
+                "state": self.state,
+                "calls": self._calls,
+                "failures": self._failures,
+                "rejected": self.rejected,
+                "trips": self.trips,
+                "open_timeout": self.open_timeout,
+            }
+
+    def wait_for_probe(self, timeout: Optional[float] = None):
+        """Дождаться завершения текущей пробы (для тестов и остановки)"""
+        thread = self._probe_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _bucket(self) -> list:
+        second = int(self.clock())
+        self._expire_buckets(second)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        return self._buckets[-1]
+
+    def _expire_buckets(self, second: Optional[int] = None):
+        oldest = (int(self.clock()) if second is None else second) - self.window
+        while self._buckets and self._buckets[0][0] <= oldest:
+            _, calls, failures = self._buckets.popleft()
+            self._calls -= calls
+            self._failures -= failures
+
+    def _open(self):
+        self.state = STATE_OPEN
+        self.opened_at = self.clock()
+        self.trips += 1
+
+    def _start_probe(self):
+        self.state = STATE_HALF_OPEN
+        self._probe_thread = threading.Thread(
+            target=self._run_probe, name=f"{self.name}-probe", daemon=True
+        )
+        self._probe_thread.start()
+
+    def _run_probe(self):
+        try:
+            self.probe()
+        except Exception as e:
+            cache_logger.warning(f"{self.name}: проба восстановления не прошла: {e}")
+            with self._lock:
+                self.open_timeout = min(self.open_timeout * 2, self.max_open_timeout)
+                self.state = STATE_OPEN
+                self.opened_at = self.clock()
+            return
+        with self._lock:
+            self.state = STATE_CLOSED
+            self.open_timeout = self.base_open_timeout
+            self._buckets.clear()
+            self._calls = self._failures = 0
+        self._notify(STATE_HALF_OPEN, STATE_CLOSED)
+
+    def _notify(self, previous: str, state: str):
+        """Обработчик смены состояния вызывается вне блокировки: он может обращаться к зависимости"""
+        if self.on_state_change is not None:
+            try:
+                self.on_state_change(previous, state)
+            except Exception as e:
+                cache_logger.error(
+                    f"{self.name}: ошибка обработчика смены состояния: {e}"
+                )
@@ -1,11 +1,14 @@
+import time
+
 from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.pool import QueuePool
+
 from src.config import settings
 from src.utils.logger import db_logger
-import time
-
 
 # Создаем engine с настройками пула соединений
 engine = create_engine(
@@ -15,12 +18,53 @@ engine = create_engine(
     max_overflow=20,
     pool_pre_ping=True,
     pool_recycle=3600,
-    echo=settings.debug
+    echo=settings.debug,
 )
 
 # Создаем фабрику сессий
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# Асинхронные драйверы для каждой СУБД
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_database_url(database_url: str) -> URL:
+    """URL базы данных с асинхронным драйвером (asyncpg / aiosqlite)"""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Нет асинхронного драйвера для СУБД: {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+ASYNC_DATABASE_URL = get_async_database_url(settings.database_url)
+
+# Для SQLite пул выбирает драйвер (StaticPool для :memory:)
+_async_pool_options = (
+    {}
+    if ASYNC_DATABASE_URL.get_backend_name() == "sqlite"
+    else {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_recycle": 3600,
+    }
+)
+
+# Асинхронный engine: запросы не блокируют event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, pool_pre_ping=True, echo=settings.debug, **_async_pool_options
+)
+
+# Объекты остаются загруженными после commit: обращение к истекшим
+# атрибутам вне await привело бы к синхронному запросу
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, expire_on_commit=False, autoflush=False
+)
+
 # Базовый класс для моделей
 Base = declarative_base()
 
@@ -34,6 +78,17 @@ def get_db() -> Session:
         db.close()
 
 
+def get_session_factory() -> sessionmaker:
+    """Dependency для фабрики сессий: для потоковых ответов, читающих БД после завершения запроса"""
+    return SessionLocal
+
+
+async def get_async_db() -> AsyncSession:
+    """Dependency для получения асинхронной сессии базы данных"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def init_db():
     """Инициализация базы данных"""
     try:
@@ -59,15 +114,20 @@ def check_db_connection():
 
 # Логирование SQL запросов в debug режиме
 if settings.debug:
-    @event.listens_for(engine, "before_cursor_execute")
-    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
-        conn.info.setdefault('query_start_time', []).append(time.time())
+
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_start_time", []).append(time.time())
         db_logger.debug(f"SQL: {statement}")
 
-    @event.listens_for(engine, "after_cursor_execute")
     def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
-        total = time.time() - conn.info['query_start_time'].pop(-1)
+        total = time.time() - conn.info["query_start_time"].pop(-1)
         if total > 0.1:  # Логируем медленные запросы
             db_logger.warning(f"Slow query ({total:.3f}s): {statement}")
         else:
             db_logger.debug(f"Query executed in {total:.3f}s")
+
+    for _engine in (engine, async_engine.sync_engine):
+        event.listen(_engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(_engine, "after_cursor_execute", after_cursor_execute)
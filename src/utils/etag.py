@@ -0,0 +1,49 @@
+import hashlib
+
+from fastapi import Request, Response, status
+
+# Клиент обязан перепроверять ответ (If-None-Match), кэшировать может только у себя
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+
+def data_etag(request: Request, user_id: int, data_version: int, *extra) -> str:
+    """ETag ответа из версии данных пользователя, пути и параметров запроса
+
+    Версия читается из БД (не из кэша пользователя) до выборки данных: при
+    параллельном изменении ETag окажется старее данных, а не наоборот.
+    """
+    params = "&".join(
+        f"{key}={value}" for key, value in sorted(request.query_params.multi_items())
+    )
+    raw = ":".join(
+        str(part) for part in (user_id, data_version, request.url.path, params, *extra)
+    )
+    return f'W/"{hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Совпадает ли ETag с If-None-Match запроса (слабое сравнение)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return _opaque(etag) in {_opaque(tag) for tag in header.split(",")}
+
+
+def etag_headers(etag: str) -> dict:
+    """Заголовки ответа с ETag"""
+    return {"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL, "Vary": "Authorization"}
+
+
+def not_modified(etag: str) -> Response:
+    """Ответ 304 Not Modified без тела"""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED, headers=etag_headers(etag)
+    )
+
+
+def _opaque(tag: str) -> str:
+    """ETag без префикса слабого сравнения W/"""
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
@@ -0,0 +1,41 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+class InvalidCursorError(ValueError):
+    """Курсор пагинации поврежден или не соответствует запросу"""
+
+
+def encode_cursor(sort: str, value: Any, last_id: int) -> str:
+    """Кодирование позиции (значение сортировки, id) в непрозрачный курсор"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+
+    payload = json.dumps({"s": sort, "v": value, "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Dict[str, Any]:
+    """Декодирование курсора, созданного encode_cursor для той же сортировки"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_id = int(payload["id"])
+        value: Optional[str] = payload["v"]
+        cursor_sort = payload["s"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Некорректный курсор: {e}") from e
+
+    if cursor_sort != sort:
+        raise InvalidCursorError(
+            f"Курсор создан для сортировки '{cursor_sort}', запрошена '{sort}'"
+        )
+
+    try:
+        parsed_value = datetime.fromisoformat(value) if value is not None else None
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Некорректное значение курсора: {e}") from e
+
+    return {"value": parsed_value, "id": last_id}
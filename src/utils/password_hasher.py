@@ -0,0 +1,148 @@
+"""Хеширование и проверка паролей вне event loop
+
+bcrypt занимает сотни миллисекунд CPU; вызванный в async-обработчике, он
+останавливает весь воркер. Здесь вызовы выполняются в ограниченном пуле
+потоков (bcrypt освобождает GIL), а очередь к пулу ограничена: при ее
+переполнении или слишком долгом ожидании клиент сразу получает 503.
+"""
+
+import asyncio
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List
+
+from fastapi import HTTPException, status
+
+from src.config import settings
+from src.utils.cache_metrics import LATENCY_BUCKETS, Histogram, histogram_lines
+from src.utils.logger import security_logger
+
+# bcrypt дольше операций кэша: корзины до нескольких секунд
+HASH_BUCKETS = LATENCY_BUCKETS + (2.5, 5.0)
+
+
+class PasswordHasher:
+    """Ограниченный пул потоков для bcrypt с учетом глубины очереди
+
+    Одновременно выполняется не больше workers вызовов, ожидают не больше
+    max_queue; ожидавший дольше queue_timeout вызов не выполняется.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queue: int = 64,
+        queue_timeout: float = 2.0,
+        retry_after: int = 1,
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hasher"
+        )
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = Counter()
+        self.wait = Histogram(HASH_BUCKETS)
+        self.duration = Histogram(HASH_BUCKETS)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Выполнить fn(*args) в пуле; при перегрузке - HTTPException 503"""
+        with self._lock:
+            if self.queued + self.running >= self.workers + self.max_queue:
+                self.rejected["queue_full"] += 1
+                raise self._busy("очередь заполнена")
+            self.queued += 1
+        submitted = time.perf_counter()
+        try:
+            future = self._executor.submit(self._call, submitted, fn, args)
+        except Exception:
+            with self._lock:
+                self.queued -= 1
+            raise
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future):
+        # Отмененный до начала вызов (клиент отключился) не дойдет до _call
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def _call(self, submitted: float, fn: Callable, args: tuple) -> Any:
+        started = time.perf_counter()
+        waited = started - submitted
+        with self._lock:
+            self.queued -= 1
+            self.wait.observe(waited)
+            if waited > self.queue_timeout:
+                # Клиент ждал слишком долго: не тратим CPU на ответ, который уже не нужен
+                self.rejected["timeout"] += 1
+                raise self._busy(f"ожидание в очереди {waited:.2f}s")
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.duration.observe(time.perf_counter() - started)
+
+    def _busy(self, reason: str) -> HTTPException:
+        security_logger.warning(f"Пул хеширования паролей перегружен: {reason}")
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис перегружен, повторите попытку позже",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": dict(self.rejected),
+                "wait": self.wait.snapshot(),
+                "duration": self.duration.snapshot(),
+            }
+
+    def render_prometheus(self, prefix: str = "password_hasher") -> List[str]:
+        """Строки в текстовом формате Prometheus"""
+        with self._lock:
+            lines = [
+                f"# TYPE {prefix}_queue_depth gauge",
+                f"{prefix}_queue_depth {self.queued}",
+                f"# TYPE {prefix}_running gauge",
+                f"{prefix}_running {self.running}",
+                f"# TYPE {prefix}_completed_total counter",
+                f"{prefix}_completed_total {self.completed}",
+                f"# TYPE {prefix}_rejected_total counter",
+            ]
+            for reason in ("queue_full", "timeout"):
+                lines.append(
+                    f'{prefix}_rejected_total{{reason="{reason}"}} {self.rejected[reason]}'
+                )
+            for name, histogram in (("wait", self.wait), ("duration", self.duration)):
+                lines.append(f"# TYPE {prefix}_{name}_seconds histogram")
+                lines.extend(
+                    histogram_lines(
+                        f"{prefix}_{name}_seconds", 'pool="bcrypt"', histogram
+                    )
+                )
+        return lines
+
+
+password_hasher = PasswordHasher(
+    workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+    queue_timeout=settings.password_hash_queue_timeout,
+    retry_after=settings.password_hash_retry_after,
+)
@@ -0,0 +1,17 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON-ответ, сериализуемый orjson без промежуточной валидации Pydantic
+
+    Содержимое должно состоять из dict/list/str/int/datetime/Enum; даты в UTC
+    кодируются с суффиксом Z, как это делает Pydantic.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
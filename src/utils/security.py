@@ -1,19 +1,87 @@
+import hashlib
+import math
+import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import HTTPException, status, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from passlib.registry import get_crypt_handler
+
 from src.config import settings
+from src.utils.cache import LocalCache
 from src.utils.logger import security_logger
+from src.utils.password_hasher import password_hasher
+
 # from src.user.crud import get_user_by_id  # Убираем для избежания циклического импорта
 
-# Контекст для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Пароль для замеров калибровки
+CALIBRATION_PASSWORD = "calibration-password"
+
+
+def _available_schemes() -> list:
+    """Схемы из настроек, для которых установлен backend"""
+    schemes = []
+    for scheme in settings.password_schemes:
+        handler = get_crypt_handler(scheme)
+        if hasattr(handler, "has_backend") and not handler.has_backend():
+            security_logger.warning(
+                f"Схема паролей {scheme} недоступна: не установлен backend"
+            )
+            continue
+        schemes.append(scheme)
+    return schemes or ["bcrypt"]
+
+
+def _rounds_bounds(handler) -> Tuple[int, int]:
+    low = max(
+        settings.password_min_rounds.get(handler.name, handler.min_rounds),
+        handler.min_rounds,
+    )
+    high = min(
+        settings.password_max_rounds.get(handler.name, handler.max_rounds),
+        handler.max_rounds,
+    )
+    return low, max(low, high)
+
+
+def _context_config(rounds: Optional[Dict[str, int]] = None) -> dict:
+    """Настройки CryptContext: схемы, стоимость новых хешей и допустимые границы"""
+    schemes = _available_schemes()
+    config = {"schemes": schemes, "deprecated": "auto"}
+    for scheme in schemes:
+        handler = get_crypt_handler(scheme)
+        low, high = _rounds_bounds(handler)
+        default = (rounds or {}).get(scheme, handler.default_rounds)
+        config[f"{scheme}__min_rounds"] = low
+        config[f"{scheme}__max_rounds"] = high
+        config[f"{scheme}__default_rounds"] = min(max(default, low), high)
+    return config
+
+
+# Контекст для хеширования паролей; стоимость уточняется калибровкой при старте
+pwd_context = CryptContext(**_context_config())
+
+# Результат калибровки по схемам: {"bcrypt": {"rounds": 12, "ms": 240.0}}
+password_costs: Dict[str, dict] = {}
 
 # Схема аутентификации
 security = HTTPBearer()
 
+# Проверенные токены: digest -> payload до exp (не дольше token_cache_ttl)
+verified_tokens: Optional[LocalCache] = (
+    LocalCache(
+        max_entries=settings.token_cache_max_entries,
+        max_bytes=settings.token_cache_max_entries * 1024,
+        ttl=settings.token_cache_ttl,
+    )
+    if settings.token_cache_max_entries > 0
+    else None
+)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Проверка пароля"""
@@ -32,10 +100,93 @@ def get_password_hash(password: str) -> str:
         security_logger.error(f"Ошибка при хешировании пароля: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Ошибка при обработке пароля"
+            detail="Ошибка при обработке пароля",
         )
 
 
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Проверка пароля; при устаревших схеме или стоимости - новый хеш с текущими параметрами"""
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except Exception as e:
+        security_logger.error(f"Ошибка при проверке пароля: {e}")
+        return False, None
+
+
+def _time_hash(handler, rounds: int, samples: int = 1) -> float:
+    """Лучшее время хеширования (секунды) из samples попыток"""
+    best = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.using(rounds=rounds).hash(CALIBRATION_PASSWORD)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _calibrated_rounds(handler, target: float) -> int:
+    """Стоимость, при которой хеширование ближе всего к target секунд
+
+    Замер на минимальной стоимости экстраполируется: у bcrypt время растет
+    вдвое с каждым rounds (log2), у argon2 - линейно.
+    """
+    low, high = _rounds_bounds(handler)
+    elapsed = _time_hash(handler, low, samples=3)
+    if handler.rounds_cost == "log2":
+        rounds = low + round(math.log2(target / elapsed))
+    else:
+        rounds = round(low * target / elapsed)
+    return min(max(rounds, low), high)
+
+
+def calibrate_password_hashing(target_ms: Optional[float] = None) -> Dict[str, dict]:
+    """Подобрать стоимость схем паролей под целевое время и перенастроить pwd_context"""
+    target_ms = settings.password_hash_target_ms if target_ms is None else target_ms
+    rounds = {}
+    for scheme in _available_schemes():
+        handler = get_crypt_handler(scheme)
+        rounds[scheme] = (
+            _calibrated_rounds(handler, target_ms / 1000) if target_ms > 0 else None
+        )
+    config = _context_config(
+        {scheme: value for scheme, value in rounds.items() if value is not None}
+    )
+    pwd_context.load(config)
+
+    costs = {}
+    for scheme in config["schemes"]:
+        chosen = config[f"{scheme}__default_rounds"]
+        elapsed_ms = _time_hash(get_crypt_handler(scheme), chosen) * 1000
+        costs[scheme] = {"rounds": chosen, "ms": round(elapsed_ms, 1)}
+        security_logger.info(
+            f"Хеширование паролей {scheme}: rounds={chosen}, {elapsed_ms:.0f} мс "
+            f"(цель {target_ms:.0f} мс, границы {config[f'{scheme}__min_rounds']}-{config[f'{scheme}__max_rounds']})"
+        )
+    password_costs.clear()
+    password_costs.update(costs)
+    return costs
+
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """Проверка пароля в пуле потоков, без блокировки event loop"""
+    return await password_hasher.run(verify_password, plain_password, hashed_password)
+
+
+async def averify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """verify_and_update_password в пуле потоков"""
+    return await password_hasher.run(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def aget_password_hash(password: str) -> str:
+    """Получение хеша пароля в пуле потоков, без блокировки event loop"""
+    return await password_hasher.run(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Создание access токена"""
     try:
@@ -43,63 +194,107 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
-            expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
-        
-        to_encode.update({
-            "exp": expire,
-            "type": "access",
-            "iat": datetime.utcnow()
-        })
-        
-        encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+            expire = datetime.utcnow() + timedelta(
+                minutes=settings.access_token_expire_minutes
+            )
+
+        to_encode.update({"exp": expire, "type": "access", "iat": datetime.utcnow()})
+
+        encoded_jwt = jwt.encode(
+            to_encode, settings.secret_key, algorithm=settings.algorithm
+        )
         security_logger.info(f"Access токен создан для пользователя: {data.get('sub')}")
         return encoded_jwt
     except Exception as e:
         security_logger.error(f"Ошибка при создании access токена: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Ошибка при создании токена"
+            detail="Ошибка при создании токена",
         )
 
 
-def create_refresh_token(data: dict) -> str:
-    """Создание refresh токена"""
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    """Создание refresh токена (одноразового: уникальный jti)"""
     try:
         to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
-        
-        to_encode.update({
-            "exp": expire,
-            "type": "refresh",
-            "iat": datetime.utcnow()
-        })
-        
-        encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
-        security_logger.info(f"Refresh токен создан для пользователя: {data.get('sub')}")
+        if expires_delta:
+            expire = datetime.utcnow() + expires_delta
+        else:
+            expire = datetime.utcnow() + timedelta(
+                days=settings.refresh_token_expire_days
+            )
+
+        to_encode.update(
+            {
+                "exp": expire,
+                "type": "refresh",
+                "iat": datetime.utcnow(),
+                "jti": uuid.uuid4().hex,
+            }
+        )
+
+        encoded_jwt = jwt.encode(
+            to_encode, settings.secret_key, algorithm=settings.algorithm
+        )
+        security_logger.info(
+            f"Refresh токен создан для пользователя: {data.get('sub')}"
+        )
         return encoded_jwt
     except Exception as e:
         security_logger.error(f"Ошибка при создании refresh токена: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Ошибка при создании refresh токена"
+            detail="Ошибка при создании refresh токена",
         )
 
 
+def create_token_pair(user_id: int, family: Optional[str] = None) -> Dict[str, Any]:
+    """Access и refresh токены одного семейства (сессии входа); без family - новое семейство"""
+    data = {"sub": str(user_id), "fam": family or uuid.uuid4().hex}
+    expires_delta = timedelta(minutes=settings.access_token_expire_minutes)
+    return {
+        "access_token": create_access_token(data, expires_delta=expires_delta),
+        "token_type": "bearer",
+        "expires_in": int(expires_delta.total_seconds()),
+        "refresh_token": create_refresh_token(data),
+    }
+
+
+def _token_digest(token: str) -> str:
+    """Ключ кэша проверенных токенов: в памяти не держим сами токены"""
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+
 def verify_token(token: str, token_type: str = "access") -> Optional[Dict[str, Any]]:
-    """Проверка токена"""
+    """Проверка токена
+
+    Проверенный payload кэшируется до exp: повторные запросы с тем же токеном
+    не декодируют его заново. Payload разделяется между вызовами - не изменять.
+    Отзыв токена здесь не проверяется: это делает get_current_user.
+    """
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        
+        key = _token_digest(token)
+        payload = verified_tokens.get(key) if verified_tokens is not None else None
+        if payload is None:
+            # Подпись и срок действия (exp) проверяет jwt.decode
+            payload = jwt.decode(
+                token, settings.secret_key, algorithms=[settings.algorithm]
+            )
+            if "exp" not in payload:
+                security_logger.warning("Токен без срока действия")
+                return None
+            if verified_tokens is not None:
+                verified_tokens.set(
+                    key, payload, size=len(token), ttl=payload["exp"] - time.time()
+                )
+
         # Проверяем тип токена
         if payload.get("type") != token_type:
-            security_logger.warning(f"Неверный тип токена: ожидался {token_type}, получен {payload.get('type')}")
-            return None
-        
-        # Проверяем срок действия
-        if datetime.fromtimestamp(payload.get("exp", 0)) < datetime.utcnow():
-            security_logger.warning("Токен истек")
+            security_logger.warning(
+                f"Неверный тип токена: ожидался {token_type}, получен {payload.get('type')}"
+            )
             return None
-        
+
         return payload
     except JWTError as e:
         security_logger.warning(f"JWT ошибка: {e}")
@@ -109,34 +304,16 @@ def verify_token(token: str, token_type: str = "access") -> Optional[Dict[str, A
         return None
 
 
-def refresh_access_token(refresh_token: str) -> Optional[str]:
-    """Обновление access токена"""
-    try:
-        payload = verify_token(refresh_token, "refresh")
-        if not payload:
-            return None
-        
-        # Создаем новый access токен
-        user_id = payload.get("sub")
-        if not user_id:
-            return None
-        
-        return create_access_token(data={"sub": user_id})
-    except Exception as e:
-        security_logger.error(f"Ошибка при обновлении access токена: {e}")
-        return None
-
-
 def validate_password_strength(password: str) -> bool:
     """Валидация сложности пароля"""
     if len(password) < 8:
         return False
-    
+
     has_upper = any(c.isupper() for c in password)
     has_lower = any(c.islower() for c in password)
     has_digit = any(c.isdigit() for c in password)
     has_special = any(c in "!@#$%^&*()_+-=[]{}|;:,.<>?" for c in password)
-    
+
     return has_upper and has_lower and has_digit and has_special
 
 
@@ -146,14 +323,14 @@ def generate_password_reset_token(email: str) -> str:
         data = {
             "sub": email,
             "type": "password_reset",
-            "exp": datetime.utcnow() + timedelta(hours=1)
+            "exp": datetime.utcnow() + timedelta(hours=1),
         }
         return jwt.encode(data, settings.secret_key, algorithm=settings.algorithm)
     except Exception as e:
         security_logger.error(f"Ошибка при создании токена сброса пароля: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Ошибка при создании токена сброса пароля"
+            detail="Ошибка при создании токена сброса пароля",
         )
 
 
@@ -168,7 +345,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
                 detail="Неверный или истекший токен",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        
+
         user_id = payload.get("sub")
         if not user_id:
             raise HTTPException(
@@ -176,7 +353,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
                 detail="Неверный токен",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        
+
         # Здесь можно добавить получение пользователя из базы данных
         # user = get_user_by_id(user_id)
         # if not user:
@@ -185,7 +362,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         #         detail="Пользователь не найден",
         #         headers={"WWW-Authenticate": "Bearer"},
         #     )
-        
+
         return {"id": user_id, "token_data": payload}
     except Exception as e:
         security_logger.error(f"Ошибка при получении текущего пользователя: {e}")
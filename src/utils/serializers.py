@@ -0,0 +1,163 @@
+import zlib
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, Optional
+
+import orjson
+
+try:
+    import msgpack
+except ImportError:  # msgpack необязателен: без него доступен только orjson
+    msgpack = None
+
+# Первый байт записи: кодек в младших битах, флаг сжатия. Значения ниже 0x20
+# не встречаются в начале прежних записей (pickle начинается с 0x80, строки -
+# с печатного символа), поэтому такие записи распознаются как чужие.
+TAG_COMPRESSED = 0x10
+CODEC_MASK = 0x0F
+
+# Типы расширения msgpack для datetime без часового пояса и date (ISO 8601);
+# datetime с часовым поясом кодируется встроенным Timestamp
+MSGPACK_EXT_DATETIME = 1
+MSGPACK_EXT_DATE = 2
+
+
+class SerializationError(ValueError):
+    """Значение из кэша не удалось декодировать (чужой формат или поврежденная запись)"""
+
+
+class Serializer:
+    """Кодек значений кэша"""
+
+    name: str = ""
+    tag: int = 0
+
+    def encode(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class OrjsonSerializer(Serializer):
+    """JSON через orjson: datetime возвращаются строками ISO 8601 (как в ответах API)"""
+
+    name = "orjson"
+    tag = 0x01
+
+    def encode(self, value: Any) -> bytes:
+        return orjson.dumps(value, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+    def decode(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    """msgpack: datetime и date сохраняют тип (datetime с часовым поясом - в UTC)"""
+
+    name = "msgpack"
+    tag = 0x02
+
+    def encode(self, value: Any) -> bytes:
+        return msgpack.packb(
+            value, default=_msgpack_default, use_bin_type=True, datetime=True
+        )
+
+    def decode(self, data: bytes) -> Any:
+        return msgpack.unpackb(
+            data,
+            ext_hook=_msgpack_ext_hook,
+            raw=False,
+            strict_map_key=False,
+            timestamp=3,
+        )
+
+
+class CacheCodec:
+    """Кодирование записей кэша: байт-тег, опциональное сжатие zlib, тело кодека
+
+    Декодирует записи любого зарегистрированного кодека, поэтому смена
+    CACHE_SERIALIZER не требует очистки Redis. Значения INCR (целые без тега)
+    возвращаются как int.
+    """
+
+    def __init__(
+        self,
+        serializer: Serializer,
+        compress_min_size: int = 1024,
+        compress_level: int = 1,
+    ):
+        self.serializer = serializer
+        self.compress_min_size = compress_min_size
+        self.compress_level = compress_level
+
+    def dumps(self, value: Any) -> bytes:
+        body = self.serializer.encode(value)
+        tag = self.serializer.tag
+        if self.compress_min_size and len(body) >= self.compress_min_size:
+            compressed = zlib.compress(body, self.compress_level)
+            if len(compressed) < len(body):
+                body, tag = compressed, tag | TAG_COMPRESSED
+        return bytes((tag,)) + body
+
+    def loads(self, data: bytes) -> Any:
+        if not data:
+            raise SerializationError("Пустая запись кэша")
+
+        tag = data[0]
+        serializer = SERIALIZERS_BY_TAG.get(tag & CODEC_MASK) if tag < 0x20 else None
+        if serializer is None:
+            return _decode_untagged(data)
+
+        body = data[1:]
+        try:
+            if tag & TAG_COMPRESSED:
+                body = zlib.decompress(body)
+            return serializer.decode(body)
+        except Exception as e:
+            raise SerializationError(
+                f"Не удалось декодировать запись {serializer.name}: {e}"
+            ) from e
+
+
+def _decode_untagged(data: bytes) -> int:
+    """Целое, записанное INCR; прочие записи без тега не декодируются (в т.ч. pickle)"""
+    try:
+        return int(data)
+    except ValueError:
+        raise SerializationError("Запись кэша без тега формата") from None
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return msgpack.ExtType(MSGPACK_EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, date):
+        return msgpack.ExtType(MSGPACK_EXT_DATE, value.isoformat().encode())
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Тип {type(value).__name__} не поддерживается msgpack")
+
+
+def _msgpack_ext_hook(code: int, data: bytes) -> Any:
+    if code == MSGPACK_EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == MSGPACK_EXT_DATE:
+        return date.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+SERIALIZERS: Dict[str, Serializer] = {OrjsonSerializer.name: OrjsonSerializer()}
+if msgpack is not None:
+    SERIALIZERS[MsgpackSerializer.name] = MsgpackSerializer()
+SERIALIZERS_BY_TAG: Dict[int, Serializer] = {
+    serializer.tag: serializer for serializer in SERIALIZERS.values()
+}
+
+
+def get_codec(name: str, compress_min_size: Optional[int] = 1024) -> CacheCodec:
+    """Кодек записей кэша по имени сериализатора"""
+    if name not in SERIALIZERS:
+        raise ValueError(f"Неизвестный или недоступный сериализатор кэша: {name}")
+    return CacheCodec(SERIALIZERS[name], compress_min_size=compress_min_size or 0)
@@ -0,0 +1,242 @@
+"""Отзыв токенов: семейства refresh-токенов и одноразовое использование
+
+Вход создает семейство (claim fam) - все токены, выпущенные при обновлении
+в этой сессии. Refresh-токен одноразовый (claim jti): повторное предъявление
+означает утечку, и отзывается все семейство, включая access-токены.
+
+Отзывы хранятся в Redis с TTL, равным сроку жизни токенов. Проверка на каждом
+запросе сначала смотрит в локальный фильтр Блума: для неотозванного семейства
+(обычный случай) ответ получается без обращения к Redis. Отзыв публикуется
+в канал инвалидации кэша, и остальные воркеры сразу добавляют семейство в свои
+фильтры. Периодическая пересборка фильтра из Redis забывает истекшие отзывы
+и восполняет сообщения, потерянные при разрыве подписки.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import time
+from typing import Any, Dict, Optional
+
+import redis
+
+from src.config import settings
+from src.utils.cache import cache_manager
+from src.utils.logger import security_logger
+
+REVOKED_FAMILY_PREFIX = "revoked:family:"
+USED_REFRESH_PREFIX = "refresh:used:"
+
+
+class RevocationStoreUnavailable(Exception):
+    """Хранилище отзывов (Redis) недоступно: одноразовость refresh-токена не проверить"""
+
+
+class BloomFilter:
+    """Фильтр Блума: ложные срабатывания с долей error_rate, пропусков нет"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Двойное хеширование: k позиций из двух половин одного дайджеста
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+def revoked_family_key(family: str) -> str:
+    return f"{REVOKED_FAMILY_PREFIX}{family}"
+
+
+def used_refresh_key(jti: str) -> str:
+    return f"{USED_REFRESH_PREFIX}{jti}"
+
+
+class TokenRevocationStore:
+    """Отзывы семейств токенов в Redis с локальным фильтром Блума"""
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bloom = BloomFilter(capacity, error_rate)
+        # Семейства, отозванные во время пересборки фильтра
+        self._added_during_sync: Optional[set] = None
+        self._pubsub = None
+        self._listener = None
+
+    @staticmethod
+    def _client():
+        if not cache_manager.enabled or cache_manager.async_client is None:
+            raise RevocationStoreUnavailable("Redis не настроен")
+        return cache_manager.async_client
+
+    async def is_revoked(self, payload: Dict[str, Any]) -> bool:
+        """Отозвано ли семейство токена; без обращения к Redis, если его нет в фильтре"""
+        family = payload.get("fam")
+        if not family or family not in self.bloom:
+            return False
+        try:
+            return bool(await self._client().exists(revoked_family_key(family)))
+        except (
+            RevocationStoreUnavailable,
+            redis.RedisError,
+            OSError,
+            asyncio.TimeoutError,
+        ) as e:
+            # Семейство в фильтре, а подтвердить нельзя: безопаснее считать отозванным
+            security_logger.error(f"Не удалось проверить отзыв семейства {family}: {e}")
+            return True
+
+    async def revoke_family(self, family: str, ttl: Optional[int] = None):
+        """Отозвать все токены семейства; запись живет, пока могут жить его токены"""
+        ttl = ttl or settings.refresh_token_expire_days * 24 * 60 * 60
+        try:
+            async with self._client().pipeline(transaction=False) as pipe:
+                pipe.set(revoked_family_key(family), 1, ex=ttl)
+                pipe.publish(
+                    settings.cache_invalidation_channel,
+                    json.dumps({"revoked_families": [family]}),
+                )
+                await pipe.execute()
+        except (redis.RedisError, OSError, asyncio.TimeoutError) as e:
+            raise RevocationStoreUnavailable(str(e)) from e
+        self._add(family)
+        security_logger.warning(f"Отозвано семейство токенов {family}")
+
+    def _add(self, family: str):
+        self.bloom.add(family)
+        if self._added_during_sync is not None:
+            self._added_during_sync.add(family)
+
+    def start_listener(self):
+        """Подписаться на отзывы других воркеров (фоновый поток); без Redis - позже, при sync"""
+        if (
+            self._listener is not None
+            or not cache_manager.enabled
+            or cache_manager.client is None
+        ):
+            return
+        try:
+            cache_manager.client.ping()
+            self._pubsub = cache_manager.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(
+                **{settings.cache_invalidation_channel: self._on_message}
+            )
+            self._listener = self._pubsub.run_in_thread(
+                sleep_time=0.2, daemon=True, exception_handler=self._on_listener_error
+            )
+        except (redis.RedisError, OSError) as e:
+            security_logger.error(f"Не удалось подписаться на отзывы токенов: {e}")
+            self.stop_listener()
+
+    def stop_listener(self):
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener.join(timeout=2.0)
+            self._listener = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def _on_message(self, message: dict):
+        """Отзыв из канала: в канале есть и сообщения инвалидации кэша, их пропускаем"""
+        try:
+            families = json.loads(message["data"]).get("revoked_families")
+        except (TypeError, ValueError, AttributeError):
+            return
+        for family in families or ():
+            self._add(family)
+
+    def _on_listener_error(self, error: Exception, pubsub, thread):
+        """Потеря подписки: пропущенные отзывы восполнит следующая пересборка фильтра"""
+        security_logger.error(f"Ошибка подписки на отзывы токенов: {error}")
+        time.sleep(1.0)
+
+    async def consume_refresh_token(self, payload: Dict[str, Any]) -> bool:
+        """Отметить refresh-токен использованным
+
+        False - семейство отозвано или токен уже предъявлялся; во втором случае
+        семейство отзывается (токен мог быть украден).
+        """
+        family, jti = payload["fam"], payload["jti"]
+        ttl = max(1, math.ceil(payload["exp"] - time.time()))
+        try:
+            async with self._client().pipeline(transaction=False) as pipe:
+                pipe.exists(revoked_family_key(family))
+                pipe.set(used_refresh_key(jti), 1, nx=True, ex=ttl)
+                revoked, first_use = await pipe.execute()
+        except (redis.RedisError, OSError, asyncio.TimeoutError) as e:
+            raise RevocationStoreUnavailable(str(e)) from e
+
+        if revoked:
+            self._add(family)
+            return False
+        if not first_use:
+            security_logger.warning(
+                f"Повторное использование refresh-токена {jti} семейства {family}"
+            )
+            await self.revoke_family(family)
+            return False
+        return True
+
+    async def sync(self):
+        """Пересобрать фильтр из Redis: отзывы других воркеров, без истекших записей"""
+        self._added_during_sync = set()
+        try:
+            bloom = BloomFilter(self.capacity, self.error_rate)
+            async for key in self._client().scan_iter(
+                match=f"{REVOKED_FAMILY_PREFIX}*", count=settings.cache_scan_batch_size
+            ):
+                key = key.decode() if isinstance(key, bytes) else key
+                bloom.add(key[len(REVOKED_FAMILY_PREFIX) :])
+            for family in self._added_during_sync:
+                bloom.add(family)
+            if bloom.count > self.capacity:
+                security_logger.warning(
+                    f"Отозванных семейств {bloom.count} больше емкости фильтра {self.capacity}: "
+                    f"доля ложных срабатываний растет"
+                )
+            self.bloom = bloom
+        except (
+            RevocationStoreUnavailable,
+            redis.RedisError,
+            OSError,
+            asyncio.TimeoutError,
+        ) as e:
+            security_logger.error(f"Не удалось синхронизировать отзывы токенов: {e}")
+        finally:
+            self._added_during_sync = None
+
+
+async def run_revocation_sync(interval: int):
+    """Периодическая пересборка фильтра отзывов в фоне (и подписка, если Redis вернулся)"""
+    while True:
+        await asyncio.sleep(interval)
+        await token_revocations.sync()
+        token_revocations.start_listener()
+
+
+token_revocations = TokenRevocationStore(
+    capacity=settings.token_revocation_bloom_capacity,
+    error_rate=settings.token_revocation_bloom_error_rate,
+)
@@ -1,18 +1,30 @@
+import os
+import sys
+import tempfile
+
+import fakeredis
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool, StaticPool
 
 from main import app
-from src.utils.db import Base, get_db
-from src.user.models import User
 from src.category.models import Category
 from src.todo.models import Todo
+from src.user.crud import create_user
+from src.user.models import User
+from src.user.schemas import UserCreate
+from src.utils import cache as cache_module
+from src.utils.cache import CacheManager
+from src.utils.db import Base, get_async_db, get_db, get_session_factory
+from src.utils.security import create_access_token
 
-
-# Создаем тестовую базу данных в памяти
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# Тестовая база во временном файле: синхронная сессия тестов и асинхронная
+# сессия приложения (aiosqlite) должны видеть одни и те же данные
+TEST_DB_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{TEST_DB_PATH}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
@@ -21,6 +33,14 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: TestClient запускает каждый тест в своем event loop
+async_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{TEST_DB_PATH}", poolclass=NullPool
+)
+TestingAsyncSessionLocal = async_sessionmaker(
+    async_engine, expire_on_commit=False, autoflush=False
+)
+
 
 def override_get_db():
     """Переопределение зависимости для тестов"""
@@ -31,6 +51,12 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db():
+    """Переопределение асинхронной зависимости для тестов"""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 @pytest.fixture(scope="function")
 def db_session():
     """Фикстура для тестовой сессии БД"""
@@ -43,10 +69,30 @@ def db_session():
         Base.metadata.drop_all(bind=engine)
 
 
+@pytest.fixture
+def cache(monkeypatch):
+    """Включенный кэш поверх fakeredis (Redis в тестах недоступен)"""
+    server = fakeredis.FakeServer()
+    manager = CacheManager(
+        client=fakeredis.FakeRedis(server=server),
+        async_client=fakeredis.FakeAsyncRedis(server=server),
+        local_cache=False,
+    )
+    # Модули импортируют cache_manager по имени: подменяем во всех
+    original = cache_module.cache_manager
+    for module in list(sys.modules.values()):
+        if getattr(module, "cache_manager", None) is original:
+            monkeypatch.setattr(module, "cache_manager", manager)
+    yield manager
+    manager.close()
+
+
 @pytest.fixture(scope="function")
 def client(db_session):
     """Фикстура для тестового клиента"""
     app.dependency_overrides[get_db] = lambda: db_session
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
     with TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
@@ -55,19 +101,13 @@ def client(db_session):
 @pytest.fixture
 def test_user_data():
     """Тестовые данные пользователя"""
-    return {
-        "email": "test@example.com",
-        "password": "testpassword123"
-    }
+    return {"email": "test@example.com", "password": "testpassword123"}
 
 
 @pytest.fixture
 def test_category_data():
     """Тестовые данные категории"""
-    return {
-        "name": "Test Category",
-        "color": "#FF5733"
-    }
+    return {"name": "Test Category", "color": "#FF5733"}
 
 
 @pytest.fixture
@@ -76,5 +116,18 @@ def test_todo_data():
     return {
         "title": "Test Todo",
         "description": "Test description",
-        "deadline": "2024-12-31T23:59:59"
+        "deadline": "2024-12-31T23:59:59",
     }
+
+
+@pytest.fixture
+def test_user(db_session, test_user_data):
+    """Пользователь, созданный напрямую в БД"""
+    return create_user(db_session, UserCreate(**test_user_data))
+
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Заголовки авторизации для test_user"""
+    token = create_access_token(data={"sub": str(test_user.id)})
+    return {"Authorization": f"Bearer {token}"}
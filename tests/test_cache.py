@@ -0,0 +1,884 @@
+import asyncio
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+import fakeredis
+import pytest
+import redis
+
+from src.config import settings
+from src.todo.models import TodoStatus
+from src.utils.cache import (
+    CacheManager,
+    LocalCache,
+    ainvalidate_tags,
+    ainvalidate_user_cache,
+    auser_cache_key,
+    cached,
+    generation_key,
+    invalidate_tags,
+    invalidate_user_cache,
+    lease_key,
+    user_cache_key,
+    user_namespace,
+)
+from src.utils.cache_metrics import TopKeys, key_namespace
+from src.utils.circuit_breaker import STATE_CLOSED, STATE_OPEN, CircuitBreaker
+from src.utils.serializers import SERIALIZERS, SerializationError, get_codec
+
+
+@pytest.fixture
+def redis_server():
+    """Общий in-memory Redis для нескольких менеджеров (воркеров)"""
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def make_manager(redis_server):
+    """Фабрика менеджеров кэша поверх общего сервера"""
+    managers = []
+
+    def factory(local_cache: bool = True) -> CacheManager:
+        manager = CacheManager(
+            client=fakeredis.FakeRedis(server=redis_server),
+            local_cache=local_cache,
+            async_client=fakeredis.FakeAsyncRedis(server=redis_server),
+        )
+        managers.append(manager)
+        return manager
+
+    yield factory
+    for manager in managers:
+        manager.close()
+
+
+def wait_for(condition, timeout: float = 3.0) -> bool:
+    """Дождаться выполнения условия (доставка pub/sub асинхронна)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class TestLocalCache:
+    """Тесты in-process LRU"""
+
+    def test_evicts_least_recently_used(self):
+        """Тест вытеснения по числу записей"""
+        cache = LocalCache(max_entries=2, max_bytes=1024, ttl=60)
+        cache.set("a", 1, size=1)
+        cache.set("b", 2, size=1)
+        cache.get("a")
+        cache.set("c", 3, size=1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_byte_budget(self):
+        """Тест ограничения по объему и пропуска слишком больших значений"""
+        cache = LocalCache(max_entries=100, max_bytes=10, ttl=60)
+        cache.set("a", "x", size=6)
+        cache.set("b", "y", size=6)
+        cache.set("huge", "z", size=11)
+
+        assert cache.get("a") is None
+        assert cache.get("b") == "y"
+        assert cache.get("huge") is None
+        assert cache.size_bytes == 6
+
+    def test_ttl_and_pattern(self):
+        """Тест истечения записей и удаления по паттерну"""
+        cache = LocalCache(max_entries=100, max_bytes=1024, ttl=60)
+        cache.set("short", 1, size=1, ttl=0.01)
+        cache.set("user:1:todos", 2, size=1)
+        cache.set("user:2:todos", 3, size=1)
+        time.sleep(0.02)
+        cache.delete_pattern("user:1:*")
+
+        assert cache.get("short") is None
+        assert cache.get("user:1:todos") is None
+        assert cache.get("user:2:todos") == 3
+
+
+class TestTwoTierCache:
+    """Тесты двухуровневого кэша L1 + Redis"""
+
+    def test_repeated_reads_served_from_l1(self, make_manager):
+        """Тест что повторное чтение не идет в Redis"""
+        writer, reader = make_manager(), make_manager()
+        writer.set("todos:1", {"items": [1, 2]})
+
+        assert reader.get("todos:1") == {"items": [1, 2]}
+        assert reader.get("todos:1") == {"items": [1, 2]}
+        stats = reader.get_stats()
+        assert stats["l2_hits"] == 1
+        assert stats["l1_hits"] == 1
+        assert stats["l1_entries"] == 1
+
+    def test_scalar_values_keep_type(self, make_manager):
+        """Тест что скаляры возвращаются своего типа из Redis и из L1"""
+        manager = make_manager()
+        manager.set("counter", 5)
+
+        assert manager.get("counter") == 5
+        assert manager.get("counter") == 5
+        assert manager.get_stats()["l1_hits"] == 1
+
+    def test_foreign_entries_are_misses(self, make_manager):
+        """Тест что записи без тега формата (прежний pickle) не десериализуются"""
+        manager = make_manager()
+        manager.client.set("legacy", pickle.dumps({"a": 1}))
+        manager.client.incr("hits")
+
+        assert manager.get("legacy") is None
+        assert manager.get("hits") == 1
+        assert manager.get_or_set("legacy", lambda: {"a": 2}) == {"a": 2}
+
+    def test_invalidation_reaches_other_workers(self, make_manager):
+        """Тест согласованности L1 между воркерами через pub/sub"""
+        first, second = make_manager(), make_manager()
+        first.set("stats:1", {"total": 1})
+        assert second.get("stats:1") == {"total": 1}
+
+        first.set("stats:1", {"total": 2})
+        assert wait_for(lambda: second.get("stats:1") == {"total": 2})
+
+        first.delete("stats:1")
+        assert wait_for(lambda: second.get("stats:1") is None)
+
+    def test_pattern_invalidation(self, make_manager):
+        """Тест инвалидации L1 по паттерну на другом воркере"""
+        first, second = make_manager(), make_manager()
+        first.set("user:1:todos", [1])
+        first.set("user:2:todos", [2])
+        second.get("user:1:todos")
+        second.get("user:2:todos")
+
+        first.clear_pattern("user:1:*")
+
+        assert wait_for(lambda: second.get("user:1:todos") is None)
+        assert second.get("user:2:todos") == [2]
+
+    def test_l1_entry_does_not_outlive_redis_ttl(self, make_manager):
+        """Тест что запись L1 истекает не позже записи в Redis"""
+        manager = make_manager()
+        manager.set("short", [1], ttl=1)
+
+        assert manager.get("short") == [1]
+        time.sleep(1.1)
+        assert manager.get("short") is None
+
+    def test_without_local_cache(self, make_manager):
+        """Тест что без L1 все чтения идут в Redis"""
+        manager = make_manager(local_cache=False)
+        manager.set("key", [1])
+
+        assert manager.get("key") == [1]
+        assert manager.get("key") == [1]
+        assert manager.get_stats()["l2_hits"] == 2
+        assert "l1_entries" not in manager.get_stats()
+
+
+class TestNamespaceGenerations:
+    """Тесты инвалидации через поколения пространств имен"""
+
+    @pytest.fixture(autouse=True)
+    def manager(self, make_manager, monkeypatch):
+        """Глобальный менеджер поверх fakeredis"""
+        manager = make_manager(local_cache=False)
+        monkeypatch.setattr("src.utils.cache.cache_manager", manager)
+        return manager
+
+    def test_invalidation_switches_keys(self, manager):
+        """Тест что инвалидация делает прежние ключи недостижимыми одним INCR"""
+        key = user_cache_key(1, "todos", page=1)
+        manager.set(key, {"items": [1]})
+        other_user_key = user_cache_key(2, "todos", page=1)
+
+        invalidate_user_cache(1)
+
+        assert user_cache_key(1, "todos", page=1) != key
+        assert manager.get(user_cache_key(1, "todos", page=1)) is None
+        assert user_cache_key(2, "todos", page=1) == other_user_key
+
+    def test_generation_survives_counter_eviction(self, manager):
+        """Тест что после потери счетчика поколение не возвращается к старым ключам"""
+        key = user_cache_key(1, "stats")
+        manager.client.delete(generation_key(user_namespace(1)))
+
+        time.sleep(0.002)
+        assert user_cache_key(1, "stats") != key
+
+    def test_sweep_removes_only_stale_generations(self, manager):
+        """Тест уборки ключей устаревших поколений"""
+        stale = [user_cache_key(1, "todos", page=page) for page in range(5)]
+        for key in stale:
+            manager.set(key, [1])
+        invalidate_user_cache(1)
+        current = user_cache_key(1, "todos", page=1)
+        manager.set(current, [2])
+        manager.set("plain:key", [3])
+
+        assert manager.sweep_stale_generations(batch_size=2) == 5
+        assert not any(manager.exists(key) for key in stale)
+        assert manager.get(current) == [2]
+        assert manager.get("plain:key") == [3]
+
+    def test_clear_pattern_uses_scan(self, manager, monkeypatch):
+        """Тест очистки по паттерну без KEYS"""
+        for i in range(25):
+            manager.set(f"report:{i}", [i])
+        manager.set("other", [0])
+        monkeypatch.setattr(
+            manager.client, "keys", lambda *args: pytest.fail("KEYS блокирует Redis")
+        )
+
+        assert manager.clear_pattern("report:*") == 25
+        assert manager.get("other") == [0]
+
+
+class TestAsyncCache:
+    """Тесты асинхронного API кэша"""
+
+    def test_roundtrip_shared_with_sync_api(self, make_manager):
+        """Тест что async и sync API читают данные друг друга"""
+        manager = make_manager(local_cache=False)
+
+        async def scenario():
+            assert await manager.aset("async:key", {"a": 1})
+            manager.set("sync:key", [1, 2])
+            return (
+                await manager.aget("async:key"),
+                await manager.aget("sync:key"),
+                await manager.aget("missing"),
+            )
+
+        assert asyncio.run(scenario()) == ({"a": 1}, [1, 2], None)
+        assert manager.get("async:key") == {"a": 1}
+
+    def test_get_or_set_with_async_callback(self, make_manager):
+        """Тест что значение вычисляется один раз, callback может быть корутиной"""
+        manager = make_manager()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            return {"total": 3}
+
+        async def scenario():
+            first = await manager.aget_or_set("stats", load)
+            second = await manager.aget_or_set("stats", load)
+            return first, second
+
+        assert asyncio.run(scenario()) == ({"total": 3}, {"total": 3})
+        assert len(calls) == 1
+
+    def test_delete_many_and_increment(self, make_manager):
+        """Тест удаления нескольких ключей одним запросом и счетчика"""
+        manager = make_manager()
+
+        async def scenario():
+            for i in range(3):
+                await manager.aset(f"key:{i}", [i])
+            deleted = await manager.adelete("key:0", "key:1", "missing")
+            counter = await manager.aincrement("counter", 5)
+            return (
+                deleted,
+                counter,
+                await manager.aget("key:0"),
+                await manager.aget("key:2"),
+            )
+
+        assert asyncio.run(scenario()) == (2, 5, None, [2])
+
+    def test_async_write_invalidates_other_workers(self, make_manager):
+        """Тест что async-запись публикует инвалидацию L1"""
+        writer, reader = make_manager(), make_manager()
+        writer.set("todos", [1])
+        assert reader.get("todos") == [1]
+
+        asyncio.run(writer.aset("todos", [2]))
+
+        assert wait_for(lambda: reader.get("todos") == [2])
+
+    def test_async_generations(self, make_manager, monkeypatch):
+        """Тест поколений пространства имен через async API"""
+        manager = make_manager(local_cache=False)
+        monkeypatch.setattr("src.utils.cache.cache_manager", manager)
+
+        async def scenario():
+            before = await auser_cache_key(1, "todos", page=1)
+            await ainvalidate_user_cache(1)
+            return before, await auser_cache_key(1, "todos", page=1)
+
+        before, after = asyncio.run(scenario())
+        assert before != after
+        assert after == user_cache_key(1, "todos", page=1)
+
+    def test_disabled_cache_calls_through(self, make_manager):
+        """Тест что без Redis aget_or_set просто вызывает callback"""
+        manager = make_manager()
+        manager.enabled = False
+
+        assert asyncio.run(manager.aget_or_set("key", lambda: [1])) == [1]
+        assert asyncio.run(manager.aget("key")) is None
+
+
+class TestCacheCodec:
+    """Тесты кодеков записей кэша"""
+
+    PAYLOAD = {
+        "items": [
+            {
+                "id": i,
+                "title": f"Задача {i}",
+                "status": TodoStatus.PENDING,
+                "deadline": datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc),
+                "category_id": None,
+            }
+            for i in range(50)
+        ],
+        "total": 50,
+    }
+
+    @pytest.mark.parametrize("name", sorted(SERIALIZERS))
+    def test_roundtrip_and_compression(self, name):
+        """Тест кодирования, сжатия больших записей и тега формата"""
+        codec = get_codec(name, compress_min_size=256)
+        data = codec.dumps(self.PAYLOAD)
+        small = codec.dumps({"total": 1})
+
+        assert data[0] == SERIALIZERS[name].tag | 0x10
+        assert small[0] == SERIALIZERS[name].tag
+        decoded = codec.loads(data)
+        assert decoded["total"] == 50
+        assert decoded["items"][0]["status"] == "pending"
+        assert codec.loads(small) == {"total": 1}
+
+    def test_datetime_types(self):
+        """Тест что msgpack сохраняет datetime, а orjson отдает строку как API"""
+        value = {"deadline": datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)}
+
+        assert get_codec("orjson").loads(get_codec("orjson").dumps(value)) == {
+            "deadline": "2025-01-02T03:04:05Z"
+        }
+        assert get_codec("msgpack").loads(get_codec("msgpack").dumps(value)) == value
+
+    def test_reads_entries_of_other_codec(self):
+        """Тест что смена сериализатора не ломает уже записанные значения"""
+        assert get_codec("orjson").loads(get_codec("msgpack").dumps([1, "a"])) == [
+            1,
+            "a",
+        ]
+
+    @pytest.mark.parametrize(
+        "data", [b"", pickle.dumps([1]), b"plain text", b"\x01{broken"]
+    )
+    def test_rejects_foreign_data(self, data):
+        """Тест отказа декодировать чужие и поврежденные записи"""
+        with pytest.raises(SerializationError):
+            get_codec("orjson").loads(data)
+
+    def test_unknown_serializer(self):
+        """Тест неизвестного имени сериализатора"""
+        with pytest.raises(ValueError):
+            get_codec("pickle")
+
+
+class TestStampedeProtection:
+    """Тесты защиты от одновременного пересчета в get_or_set"""
+
+    @staticmethod
+    def slow_callback(calls: list, value: Any = "value", delay: float = 0.2):
+        def callback():
+            calls.append(1)
+            time.sleep(delay)
+            return value
+
+        return callback
+
+    def test_single_flight_across_threads_and_workers(self, make_manager):
+        """Тест что при промахе значение вычисляется один раз на все воркеры"""
+        workers = [make_manager(local_cache=False), make_manager(local_cache=False)]
+        calls, results = [], []
+        callback = self.slow_callback(calls)
+
+        def request(manager):
+            results.append(manager.get_or_set("hot", callback))
+
+        threads = [
+            threading.Thread(target=request, args=(workers[i % 2],)) for i in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == ["value"] * 10
+        assert not workers[0].exists(lease_key("hot"))
+
+    def test_stale_while_revalidate(self, make_manager):
+        """Тест что во время чужого пересчета отдается истекшее значение"""
+        manager = make_manager(local_cache=False)
+        manager.set("summary", {"v": "old", "d": 0.01, "x": time.time() - 1}, ttl=60)
+        calls = []
+
+        manager.client.set(lease_key("summary"), "other-worker")
+        assert (
+            manager.get_or_set(
+                "summary", self.slow_callback(calls, "new", 0), stale_ttl=60
+            )
+            == "old"
+        )
+        assert calls == []
+
+        manager.client.delete(lease_key("summary"))
+        assert (
+            manager.get_or_set(
+                "summary", self.slow_callback(calls, "new", 0), stale_ttl=60
+            )
+            == "new"
+        )
+        assert (
+            manager.get_or_set(
+                "summary", self.slow_callback(calls, "newer", 0), stale_ttl=60
+            )
+            == "new"
+        )
+        assert len(calls) == 1
+        assert manager.get_stats()["stale_hits"] == 1
+
+    def test_probabilistic_early_refresh(self, make_manager, monkeypatch):
+        """Тест XFetch: долгий пересчет начинается до истечения записи"""
+        manager = make_manager(local_cache=False)
+        monkeypatch.setattr("src.utils.cache.random.random", lambda: 0.5)
+        calls = []
+        manager.set("cheap", {"v": "cached", "d": 0.001, "x": time.time() + 30}, ttl=60)
+        manager.set("costly", {"v": "cached", "d": 60.0, "x": time.time() + 30}, ttl=60)
+
+        assert (
+            manager.get_or_set("cheap", self.slow_callback(calls, "new", 0)) == "cached"
+        )
+        assert (
+            manager.get_or_set("costly", self.slow_callback(calls, "new", 0)) == "new"
+        )
+        assert len(calls) == 1
+
+    def test_abandoned_lease_times_out(self, make_manager, monkeypatch):
+        """Тест что при упавшем владельце аренды значение вычисляется после ожидания"""
+        manager = make_manager(local_cache=False)
+        monkeypatch.setattr(settings, "cache_lease_ttl", 0.1)
+        manager.client.set(lease_key("orphan"), "crashed-worker")
+
+        assert manager.get_or_set("orphan", lambda: [1]) == [1]
+        assert manager.get_stats()["lease_waits"] == 1
+
+    def test_async_single_flight(self, make_manager):
+        """Тест single-flight для конкурентных корутин"""
+        manager = make_manager()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return {"total": 1}
+
+        async def scenario():
+            return await asyncio.gather(
+                *(manager.aget_or_set("hot", load) for _ in range(10))
+            )
+
+        assert asyncio.run(scenario()) == [{"total": 1}] * 10
+        assert len(calls) == 1
+
+
+class TestCachedDecorator:
+    """Тесты декоратора @cached"""
+
+    @pytest.fixture(autouse=True)
+    def manager(self, make_manager, monkeypatch):
+        manager = make_manager()
+        monkeypatch.setattr("src.utils.cache.cache_manager", manager)
+        return manager
+
+    def test_key_is_stable_across_processes(self):
+        """Тест что ключ не зависит от рандомизации hash() в процессе"""
+        code = (
+            "from src.utils.cache import stable_digest;"
+            "print(stable_digest([{'user_id': 1, 'status': 'pending', 'tags': {'a', 'b'}}, [5]]))"
+        )
+        digests = {
+            subprocess.run(
+                [sys.executable, "-c", code],
+                capture_output=True,
+                text=True,
+                check=True,
+                env={**os.environ, "PYTHONHASHSEED": seed, "CACHE_ENABLED": "false"},
+            ).stdout.splitlines()[-1]
+            for seed in ("1", "2")
+        }
+
+        assert len(digests) == 1
+
+    def test_sync_function_ignores_session(self):
+        """Тест кэширования обычной функции без учета сессии БД"""
+        calls = []
+
+        @cached(ttl=60, tags=("user:{user_id}",))
+        def summary(db, user_id: int, status: TodoStatus = TodoStatus.PENDING):
+            calls.append(user_id)
+            return {"user_id": user_id, "status": status}
+
+        assert summary(object(), 1) == {"user_id": 1, "status": "pending"}
+        assert summary(object(), user_id=1) == {"user_id": 1, "status": "pending"}
+        summary(object(), 2)
+
+        assert calls == [1, 2]
+        assert summary.__name__ == "summary"
+
+    def test_async_function(self):
+        """Тест кэширования async функции"""
+        calls = []
+
+        @cached(ttl=60)
+        async def load(user_id: int):
+            calls.append(user_id)
+            return [user_id]
+
+        async def scenario():
+            return await load(1), await load(1)
+
+        assert asyncio.run(scenario()) == ([1], [1])
+        assert calls == [1]
+
+    def test_tags_invalidate_precisely(self):
+        """Тест что инвалидация тега затрагивает только помеченные им записи"""
+        calls = []
+
+        @cached(ttl=60, tags=("user:{user_id}", "category:{category_id}"))
+        def todos_in_category(db, user_id: int, category_id: int):
+            calls.append(category_id)
+            return {"category_id": category_id}
+
+        todos_in_category(None, 1, 10)
+        todos_in_category(None, 1, 20)
+        invalidate_tags("category:10")
+        todos_in_category(None, 1, 10)
+        todos_in_category(None, 1, 20)
+        assert calls == [10, 20, 10]
+
+        invalidate_user_cache(1)
+        todos_in_category(None, 1, 20)
+        asyncio.run(ainvalidate_tags("category:20"))
+        todos_in_category(None, 1, 20)
+        assert calls == [10, 20, 10, 20, 20]
+
+    def test_unhashable_argument_must_be_ignored(self):
+        """Тест что аргумент без стабильного представления требует ignore"""
+
+        @cached()
+        def load(session, user_id: int):
+            return [user_id]
+
+        with pytest.raises(TypeError):
+            load(object(), 1)
+        assert cached(ignore=("session",))(load.__wrapped__)(object(), 1) == [1]
+
+
+class TestBatchOperations:
+    """Тесты пакетных операций get_many / set_many / delete_many"""
+
+    def test_get_many_returns_only_hits(self, make_manager):
+        """Тест что get_many читает L1 и Redis и не возвращает промахи"""
+        manager = make_manager()
+        manager.set("a", 1)
+        manager.get("a")  # в L1
+        manager.client.set("b", manager.codec.dumps([2]))
+        manager.client.set("foreign", b"\x80pickle")
+
+        assert manager.get_many(["a", "b", "missing", "foreign", "a"]) == {
+            "a": 1,
+            "b": [2],
+        }
+
+    def test_set_many_with_per_key_ttl(self, make_manager):
+        """Тест конвейерной установки с общим и индивидуальным TTL"""
+        manager = make_manager(local_cache=False)
+
+        assert manager.set_many({"a": 1, "b": {"x": 2}}, ttl={"a": 10})
+
+        assert manager.get_many(["a", "b"]) == {"a": 1, "b": {"x": 2}}
+        assert 0 < manager.client.ttl("a") <= 10
+        assert manager.client.ttl("b") > 10
+
+    def test_writes_invalidate_other_workers(self, make_manager):
+        """Тест что set_many и delete_many сбрасывают L1 других воркеров"""
+        writer, reader = make_manager(), make_manager()
+        writer.set_many({"a": 1, "b": 2})
+        assert reader.get_many(["a", "b"]) == {"a": 1, "b": 2}
+
+        writer.set_many({"a": 10})
+        assert wait_for(lambda: reader.get_many(["a", "b"]) == {"a": 10, "b": 2})
+
+        assert writer.delete_many(["a", "b", "missing"]) == 2
+        assert wait_for(lambda: reader.get_many(["a", "b"]) == {})
+
+    def test_async_batch(self, make_manager):
+        """Тест async-версий пакетных операций"""
+        manager = make_manager()
+
+        async def scenario():
+            await manager.aset_many({f"key:{i}": [i] for i in range(3)}, ttl=30)
+            found = await manager.aget_many(f"key:{i}" for i in range(4))
+            deleted = await manager.adelete_many(["key:0", "key:1"])
+            return found, deleted, await manager.aget_many(["key:0", "key:2"])
+
+        assert asyncio.run(scenario()) == (
+            {"key:0": [0], "key:1": [1], "key:2": [2]},
+            2,
+            {"key:2": [2]},
+        )
+
+
+class TestCacheMetrics:
+    """Тесты метрик кэша"""
+
+    @pytest.mark.parametrize(
+        "key, namespace",
+        [
+            ("user:1:v1700000000000:notifications", "user:notifications"),
+            (
+                "cache:src.todo.routers._todo_stats:3f2a",
+                "cache:src.todo.routers._todo_stats",
+            ),
+            ("todo:42", "todo"),
+            ("user:7:gen", "user:gen"),
+        ],
+    )
+    def test_key_namespace(self, key, namespace):
+        """Тест что id и поколения не попадают в пространство имен"""
+        assert key_namespace(key) == namespace
+
+    def test_hits_misses_and_sizes_per_namespace(self, make_manager):
+        """Тест hit ratio, размеров и задержек по пространствам имен"""
+        manager = make_manager()
+        manager.set("todo:1", {"title": "x" * 100})
+        manager.get("todo:1")  # Redis
+        manager.get("todo:1")  # L1
+        manager.get("todo:2")
+        manager.get_many(["category:1", "todo:1"])
+
+        metrics = manager.get_metrics()
+        todo = metrics["namespaces"]["todo"]
+        assert (todo["hits"], todo["misses"], todo["errors"]) == (3, 1, 0)
+        assert todo["hit_ratio"] == 0.75
+        assert todo["value_size"]["count"] == 1
+        assert (
+            todo["value_size"]["buckets"]["64"] == 0
+            and todo["value_size"]["buckets"]["256"] == 1
+        )
+        assert metrics["namespaces"]["category"]["misses"] == 1
+        assert {"get", "set", "mget"} <= set(metrics["latency"])
+        assert metrics["stats"]["l1_hits"] >= 1
+
+    def test_errors_are_counted(self, make_manager):
+        """Тест учета ошибок Redis"""
+        manager = make_manager(local_cache=False)
+        # Порт, на котором никто не слушает
+        manager.client = redis.Redis(port=1, socket_connect_timeout=0.1)
+
+        assert manager.get("todo:1") is None
+        assert not manager.set_many({"todo:1": 1, "todo:2": 2})
+
+        assert manager.get_metrics()["namespaces"]["todo"]["errors"] == 3
+
+    def test_top_keys_report(self, make_manager):
+        """Тест отчета о частых и крупных ключах"""
+        manager = make_manager(local_cache=False)
+        manager.metrics.top_keys = TopKeys(capacity=2, sample_rate=1.0)
+        manager.set("big", "x" * 5000)
+        for _ in range(5):
+            manager.set("hot", 1)
+        manager.set("rare", 2)
+
+        report = manager.get_metrics(top_keys=1)["top_keys"]
+        assert [entry["key"] for entry in report["hot"]] == ["hot"]
+        # "rare" вытеснил наименее частый "big" и унаследовал его счетчик
+        assert report["hot"][0]["sampled_count"] == 5
+        assert len(manager.metrics.top_keys.counts) == 2
+
+    def test_prometheus_output(self, make_manager):
+        """Тест текстового формата Prometheus"""
+        manager = make_manager(local_cache=False)
+        manager.set("todo:1", [1])
+        manager.get("todo:1")
+
+        output = manager.render_metrics()
+        assert 'cache_hits_total{namespace="todo"} 1' in output
+        assert (
+            'cache_operation_duration_seconds_bucket{operation="get",le="+Inf"} 1'
+            in output
+        )
+        assert 'cache_value_size_bytes_count{namespace="todo"} 1' in output
+        assert "cache_l2_hits_total 1" in output
+
+
+class TestCircuitBreaker:
+    """Тесты автомата защиты Redis"""
+
+    class Clock:
+        def __init__(self):
+            self.now = 1000.0
+
+        def __call__(self):
+            return self.now
+
+    def test_opens_on_failure_rate_and_recovers(self):
+        """Тест порога доли ошибок, отказа без ожидания и восстановления пробой"""
+        clock, probe_results = self.Clock(), [ConnectionError("down"), None]
+
+        def probe():
+            result = probe_results.pop(0)
+            if result is not None:
+                raise result
+
+        breaker = CircuitBreaker(
+            "test", probe, failure_rate=0.5, min_calls=4, open_timeout=1.0, clock=clock
+        )
+        for ok in (True, False, True):
+            assert breaker.allow()
+            if not ok:
+                breaker.record_failure()
+        assert breaker.state == STATE_CLOSED  # мало вызовов для оценки
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == STATE_OPEN
+        assert not breaker.allow()
+
+        clock.now += 1.0
+        assert not breaker.allow()  # запускает пробу, которая не проходит
+        breaker.wait_for_probe(1.0)
+        assert breaker.state == STATE_OPEN and breaker.open_timeout == 2.0
+
+        clock.now += 2.0
+        breaker.allow()
+        breaker.wait_for_probe(1.0)
+        assert breaker.state == STATE_CLOSED and breaker.open_timeout == 1.0
+        assert breaker.allow()
+
+    def test_failures_outside_window_are_forgotten(self):
+        """Тест скользящего окна"""
+        clock = self.Clock()
+        breaker = CircuitBreaker(
+            "test", lambda: None, min_calls=2, window=10.0, clock=clock
+        )
+        breaker.allow()
+        breaker.record_failure()
+        clock.now += 11
+        breaker.allow()
+        breaker.allow()
+
+        assert breaker.snapshot()["failures"] == 0
+        assert breaker.state == STATE_CLOSED
+
+    @pytest.fixture
+    def fast_breaker(self, monkeypatch):
+        monkeypatch.setattr(settings, "cache_breaker_min_calls", 3)
+        monkeypatch.setattr(settings, "cache_breaker_open_timeout", 0.05)
+
+    def test_redis_outage_is_bypassed_and_cache_comes_back(
+        self, fast_breaker, make_manager, redis_server
+    ):
+        """Тест что при сбое Redis вызовы не ждут, а после восстановления кэш включается сам"""
+        manager = make_manager()
+        manager.set("key", 1)
+        namespace_generation = manager.get_generation("user:1")
+
+        redis_server.connected = False
+        for _ in range(3):
+            assert manager.get("missing") is None
+        assert manager.breaker.state == STATE_OPEN
+
+        started = time.perf_counter()
+        for _ in range(1000):
+            manager.get("key")
+        assert time.perf_counter() - started < 0.5
+        assert manager.get_or_set("computed", lambda: "fresh") == "fresh"
+        # Инвалидации во время сбоя повторяются после восстановления
+        manager.bump_generation("user:1")
+        manager.delete("key")
+
+        redis_server.connected = True
+        time.sleep(0.06)
+        manager.get("key")  # запускает пробу
+        manager.breaker.wait_for_probe(2.0)
+
+        assert manager.breaker.state == STATE_CLOSED
+        assert manager.get("key") is None
+        assert manager.get_generation("user:1") == namespace_generation + 1
+        assert manager.set("key", 2) and manager.get("key") == 2
+
+    def test_missed_invalidation_replayed_while_closed(
+        self, make_manager, redis_server
+    ):
+        """Тест что инвалидация, не дошедшая до Redis без размыкания автомата, повторяется при следующем обращении"""
+        manager = make_manager(local_cache=False)
+        manager.set("key", 1)
+        namespace_generation = manager.get_generation("user:1")
+
+        redis_server.connected = False
+        manager.delete("key")
+        manager.bump_generation("user:1")
+        assert manager.breaker.state == STATE_CLOSED
+
+        redis_server.connected = True
+        assert manager.get("key") is None
+        assert manager.get_generation("user:1") == namespace_generation + 1
+
+    def test_missed_invalidation_replayed_from_async_call(
+        self, make_manager, redis_server
+    ):
+        """Тест повтора пропущенной инвалидации при асинхронном обращении (в фоновом потоке)"""
+        manager = make_manager(local_cache=False)
+        manager.set("key", 1)
+
+        redis_server.connected = False
+        manager.delete("key")
+        redis_server.connected = True
+
+        assert asyncio.run(manager.aget("key")) is None
+        manager._replay_thread.join(2.0)
+        assert manager.client.get("key") is None
+        assert asyncio.run(manager.aget("key")) is None
+
+    def test_redis_down_at_startup(self, fast_breaker, redis_server):
+        """Тест что недоступный при создании Redis не отключает кэш навсегда"""
+        redis_server.connected = False
+        manager = CacheManager(
+            client=fakeredis.FakeRedis(server=redis_server),
+            async_client=fakeredis.FakeAsyncRedis(server=redis_server),
+            local_cache=True,
+        )
+        try:
+            assert manager.enabled and manager.breaker.state == STATE_OPEN
+            assert not manager.set("key", 1)
+
+            redis_server.connected = True
+            time.sleep(0.06)
+            manager.get("key")
+            manager.breaker.wait_for_probe(2.0)
+
+            assert manager.set("key", 1) and manager.get("key") == 1
+            assert manager._listener is not None
+        finally:
+            manager.close()
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from src.todo import async_crud
+from src.todo.schemas import TodoCreate
+from src.utils.db import get_async_database_url
+from tests.conftest import TestingAsyncSessionLocal
+
+
+class TestAsyncDatabase:
+    """Тесты асинхронного подключения к БД"""
+
+    @pytest.mark.parametrize(
+        "url, expected",
+        [
+            (
+                "postgresql://user:secret@db:5432/todo_db",
+                "postgresql+asyncpg://user:secret@db:5432/todo_db",
+            ),
+            (
+                "postgresql+psycopg2://user@db/todo_db",
+                "postgresql+asyncpg://user@db/todo_db",
+            ),
+            ("sqlite:///./todo.db", "sqlite+aiosqlite:///./todo.db"),
+        ],
+    )
+    def test_async_database_url(self, url, expected):
+        """Тест выбора асинхронного драйвера по URL"""
+        assert (
+            get_async_database_url(url).render_as_string(hide_password=False)
+            == expected
+        )
+
+    def test_async_database_url_unsupported(self):
+        """Тест СУБД без асинхронного драйвера"""
+        with pytest.raises(ValueError):
+            get_async_database_url("mssql+pyodbc://db/todo_db")
+
+    def test_async_crud_reads_committed_data(self, db_session, test_user):
+        """Тест что асинхронный crud видит данные и возвращает загруженные объекты"""
+        user_id = test_user.id
+
+        async def load():
+            async with TestingAsyncSessionLocal() as db:
+                created = await async_crud.create_todo(
+                    db, todo=TodoCreate(title="Асинхронная"), user_id=user_id
+                )
+                return created, await async_crud.get_todo_stats(db, user_id)
+
+        todo, stats = asyncio.run(load())
+        # Атрибуты доступны после закрытия сессии (expire_on_commit=False + refresh)
+        assert todo.title == "Асинхронная"
+        assert todo.created_at is not None
+        assert stats["total"] == 1
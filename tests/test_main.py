@@ -1,10 +1,12 @@
 import pytest
 from fastapi.testclient import TestClient
 
+from src.config import settings
+
 
 class TestMainApp:
     """Тесты основного приложения"""
-    
+
     def test_read_root(self, client: TestClient):
         """Тест корневого эндпоинта"""
         response = client.get("/")
@@ -14,7 +16,7 @@ class TestMainApp:
         assert "Todo App" in data["message"]
         assert "version" in data
         assert "environment" in data
-    
+
     def test_health_check(self, client: TestClient):
         """Тест проверки состояния приложения"""
         response = client.get("/health")
@@ -24,7 +26,7 @@ class TestMainApp:
         assert "timestamp" in data
         assert "version" in data
         assert "environment" in data
-    
+
     def test_app_info(self, client: TestClient):
         """Тест информации о приложении"""
         response = client.get("/info")
@@ -34,12 +36,12 @@ class TestMainApp:
         assert "version" in data
         assert "environment" in data
         assert "debug" in data
-    
+
     def test_docs_available(self, client: TestClient):
         """Тест доступности документации"""
         response = client.get("/docs")
         assert response.status_code == 200
-    
+
     def test_openapi_schema(self, client: TestClient):
         """Тест доступности OpenAPI схемы"""
         response = client.get("/openapi.json")
@@ -52,17 +54,17 @@ class TestMainApp:
 
 class TestAPIEndpoints:
     """Тесты API эндпоинтов"""
-    
+
     def test_users_endpoint_requires_auth(self, client: TestClient):
         """Тест что эндпоинт пользователей требует аутентификации"""
         response = client.get("/api/v1/users/")
         assert response.status_code == 401
-    
+
     def test_todos_endpoint_requires_auth(self, client: TestClient):
         """Тест что эндпоинт задач требует аутентификации"""
         response = client.get("/api/v1/todos/")
         assert response.status_code == 401
-    
+
     def test_categories_endpoint_requires_auth(self, client: TestClient):
         """Тест что эндпоинт категорий требует аутентификации"""
         response = client.get("/api/v1/categories/")
@@ -71,13 +73,48 @@ class TestAPIEndpoints:
 
 class TestErrorHandling:
     """Тесты обработки ошибок"""
-    
+
     def test_404_not_found(self, client: TestClient):
         """Тест обработки 404 ошибки"""
         response = client.get("/nonexistent")
         assert response.status_code == 404
-    
+
     def test_method_not_allowed(self, client: TestClient):
         """Тест обработки метода не разрешен"""
         response = client.post("/")
         assert response.status_code == 405
+
+
+class TestCacheMetricsEndpoints:
+    """Тесты эндпоинтов метрик кэша"""
+
+    def test_metrics_output(self, cache, client: TestClient, auth_headers):
+        """Тест что /metrics отдает метрики кэша в формате Prometheus"""
+        client.get("/api/v1/todos/stats", headers=auth_headers)
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert (
+            'cache_misses_total{namespace="cache:src.todo.routers._todo_stats"} 1'
+            in response.text
+        )
+
+    def test_admin_endpoint_requires_admin(
+        self, cache, client: TestClient, auth_headers, test_user, monkeypatch
+    ):
+        """Тест что метрики кэша доступны только администраторам"""
+        assert (
+            client.get("/api/v1/admin/cache/metrics", headers=auth_headers).status_code
+            == 403
+        )
+
+        monkeypatch.setattr(settings, "admin_emails", [test_user.email])
+        client.get("/api/v1/todos/stats", headers=auth_headers)
+        client.get("/api/v1/todos/stats", headers=auth_headers)
+
+        response = client.get("/api/v1/admin/cache/metrics?top=5", headers=auth_headers)
+        assert response.status_code == 200
+        stats = response.json()["namespaces"]["cache:src.todo.routers._todo_stats"]
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+        assert stats["hit_ratio"] == 0.5
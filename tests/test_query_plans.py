@@ -0,0 +1,143 @@
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from src.category.models import Category
+from src.notifications import crud as notification_crud
+from src.todo import crud as todo_crud
+from src.todo.models import Todo, TodoStatus
+from src.utils.notifications import NotificationManager
+
+# Полный проход по таблице в плане SQLite: "SCAN todos" / "SCAN notifications"
+FULL_SCAN = re.compile(r"\bSCAN (TABLE )?(todos|notifications)\b")
+
+
+@contextmanager
+def captured_statements(db_session: Session):
+    """Собрать SQL-запросы (с параметрами), выполненные внутри блока"""
+    statements = []
+    bind = db_session.get_bind()
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(bind, "before_cursor_execute", listener)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", listener)
+
+
+def assert_no_full_scans(db_session: Session, statements: list):
+    """Проверить через EXPLAIN QUERY PLAN, что запросы не сканируют таблицы целиком"""
+    assert statements, "Не выполнено ни одного запроса"
+    connection = db_session.connection()
+    for statement, parameters in statements:
+        plan = connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        ).fetchall()
+        details = [row[-1] for row in plan]
+        scans = [detail for detail in details if FULL_SCAN.search(detail)]
+        assert not scans, f"Полный проход таблицы:\n{statement}\nПлан: {details}"
+
+
+@pytest.fixture
+def seeded_user(db_session: Session, test_user):
+    """Пользователь с категорией, задачами и уведомлениями"""
+    category = Category(name="Работа", user_id=test_user.id)
+    db_session.add(category)
+    db_session.commit()
+
+    now = datetime.utcnow()
+    db_session.add_all(
+        [
+            Todo(
+                title="Просрочена",
+                user_id=test_user.id,
+                deadline=now - timedelta(days=1),
+            ),
+            Todo(
+                title="Скоро",
+                user_id=test_user.id,
+                deadline=now + timedelta(hours=3),
+                category_id=category.id,
+            ),
+            Todo(
+                title="Без дедлайна", user_id=test_user.id, status=TodoStatus.COMPLETED
+            ),
+        ]
+    )
+    db_session.commit()
+    return test_user.id, category.id
+
+
+@pytest.mark.parametrize(
+    "list_kwargs",
+    [
+        {},
+        {"status": TodoStatus.PENDING},
+        {"search": "скоро"},
+        {"sort": "deadline"},
+        {"keyset": True},
+        {"keyset": True, "sort": "deadline"},
+        {"count": "estimate"},
+    ],
+)
+def test_todo_list_uses_indexes(db_session: Session, seeded_user, list_kwargs):
+    """Тест что выборка списка задач идет по индексам"""
+    user_id, _ = seeded_user
+    with captured_statements(db_session) as statements:
+        todo_crud.list_todos(db_session, user_id, limit=2, **list_kwargs)
+    assert_no_full_scans(db_session, statements)
+
+
+def test_todo_list_by_category_uses_indexes(db_session: Session, seeded_user):
+    """Тест что фильтр по категории идет по индексу"""
+    user_id, category_id = seeded_user
+    with captured_statements(db_session) as statements:
+        todo_crud.list_todos(db_session, user_id, category_id=category_id)
+        todo_crud.get_todos_by_category(db_session, user_id, category_id)
+    assert_no_full_scans(db_session, statements)
+
+
+def test_todo_stats_uses_indexes(db_session: Session, seeded_user):
+    """Тест что запросы статистики идут по индексам"""
+    user_id, _ = seeded_user
+    with captured_statements(db_session) as statements:
+        todo_crud.get_todo_stats(db_session, user_id)
+    assert_no_full_scans(db_session, statements)
+
+
+def test_deadline_queries_use_indexes(db_session: Session, seeded_user):
+    """Тест что выборки по дедлайнам идут по индексам"""
+    user_id, _ = seeded_user
+    now = datetime.utcnow()
+    with captured_statements(db_session) as statements:
+        todo_crud.get_todos_by_deadline(
+            db_session, user_id, deadline_from=now, deadline_to=now + timedelta(days=1)
+        )
+        NotificationManager().check_deadlines(db_session, user_id)
+    assert_no_full_scans(db_session, statements)
+
+
+def test_notification_queries_use_indexes(db_session: Session, seeded_user):
+    """Тест что выборки уведомлений идут по индексам"""
+    user_id, _ = seeded_user
+    with captured_statements(db_session) as statements:
+        notification_crud.get_user_notifications(db_session, user_id, unread_only=True)
+        notification_crud.get_notification_summary(db_session, user_id)
+    assert_no_full_scans(db_session, statements)
+
+
+def test_open_deadline_partial_index_exists(db_session: Session):
+    """Тест что частичный индекс открытых задач с дедлайном создан"""
+    sql = db_session.execute(
+        text("SELECT sql FROM sqlite_master WHERE name = 'ix_todos_user_open_deadline'")
+    ).scalar()
+    assert sql is not None
+    assert "WHERE" in sql.upper()
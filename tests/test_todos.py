@@ -0,0 +1,1110 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from main import app
+from src.config import settings
+from src.todo import counters, crud, export, schemas
+from src.todo.counters import COUNTER_FIELDS, check_todo_counters, get_todo_counters
+from src.todo.models import Todo, TodoCounter, TodoStatus
+from src.user import crud as user_crud
+from src.user.models import User
+from src.utils.cache import user_tag
+from src.utils.db import get_session_factory
+from src.utils.security import create_access_token
+from tests.conftest import TestingSessionLocal, async_engine
+
+
+def _create_todos(db_session: Session, user_id: int, count: int, **fields) -> list:
+    """Создать задачи напрямую в БД (счетчики пересчитываются по данным)"""
+    todos = [Todo(title=f"Todo {i}", user_id=user_id, **fields) for i in range(count)]
+    db_session.add_all(todos)
+    db_session.commit()
+    counters.rebuild_todo_counters(db_session, user_id)
+    db_session.commit()
+    return todos
+
+
+class TestTodoPagination:
+    """Тесты пагинации списка задач"""
+
+    def test_offset_mode_is_default(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что offset-режим работает как раньше"""
+        _create_todos(db_session, test_user.id, 5)
+
+        response = client.get("/api/v1/todos/?skip=2&limit=2", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) == 2
+        assert data["total"] == 5
+        assert data["page"] == 2
+        assert data["next_cursor"] is None
+
+    @pytest.mark.parametrize("sort", ["created_at", "deadline"])
+    def test_cursor_mode_walks_all_items(
+        self, client: TestClient, db_session: Session, test_user, auth_headers, sort
+    ):
+        """Тест что курсор обходит все задачи без пропусков и повторов"""
+        now = datetime.utcnow()
+        _create_todos(db_session, test_user.id, 4, deadline=now + timedelta(days=1))
+        _create_todos(db_session, test_user.id, 3)
+
+        seen = []
+        params = {"pagination": "cursor", "limit": 2, "sort": sort}
+        while True:
+            response = client.get("/api/v1/todos/", params=params, headers=auth_headers)
+            assert response.status_code == 200
+            data = response.json()
+            seen.extend(item["id"] for item in data["items"])
+            if not data["next_cursor"]:
+                break
+            params["cursor"] = data["next_cursor"]
+
+        assert len(seen) == 7
+        assert len(set(seen)) == 7
+
+    def test_cursor_for_other_sort_rejected(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что курсор нельзя использовать с другой сортировкой"""
+        _create_todos(db_session, test_user.id, 3)
+
+        response = client.get(
+            "/api/v1/todos/?pagination=cursor&limit=1", headers=auth_headers
+        )
+        cursor = response.json()["next_cursor"]
+        assert cursor
+
+        response = client.get(
+            f"/api/v1/todos/?cursor={cursor}&sort=deadline", headers=auth_headers
+        )
+        assert response.status_code == 400
+
+    def test_invalid_cursor_rejected(self, client: TestClient, auth_headers):
+        """Тест обработки поврежденного курсора"""
+        response = client.get(
+            "/api/v1/todos/?cursor=not-a-cursor", headers=auth_headers
+        )
+        assert response.status_code == 400
+
+
+class TestTodoListSerialization:
+    """Тесты сериализации списка задач"""
+
+    def test_items_match_schema(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что элементы содержат ровно поля схемы и совпадают с ее сериализацией"""
+        category = client.post(
+            "/api/v1/categories/",
+            json={"name": "Дом", "color": "#00FF00"},
+            headers=auth_headers,
+        ).json()
+        client.post(
+            "/api/v1/todos/",
+            json={
+                "title": "С категорией",
+                "category_id": category["id"],
+                "deadline": "2030-01-01T10:00:00",
+            },
+            headers=auth_headers,
+        )
+
+        response = client.get("/api/v1/todos/", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+
+        data = response.json()
+        item = data["items"][0]
+        assert set(item) == set(schemas.TodoWithCategory.model_fields)
+        assert item["category_name"] == "Дом"
+        assert item["status"] == "pending"
+
+        expected = schemas.TodoListResponse.model_validate(data).model_dump(mode="json")
+        assert data == expected
+
+
+class TestTodoListCount:
+    """Тесты подсчета общего количества в списке задач"""
+
+    def test_total_respects_search(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что total учитывает фильтр поиска"""
+        _create_todos(db_session, test_user.id, 3)
+        db_session.add(Todo(title="Купить молоко", user_id=test_user.id))
+        db_session.commit()
+
+        response = client.get("/api/v1/todos/?search=молоко", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == 1
+        assert data["pages"] == 1
+
+    def test_page_and_total_in_one_statement(self, db_session: Session, test_user):
+        """Тест что страница и количество получаются одним SQL-запросом"""
+        user_id = test_user.id
+        _create_todos(db_session, user_id, 5)
+
+        statements = []
+        bind = db_session.get_bind()
+        listener = lambda *args: statements.append(args[2])
+        event.listen(bind, "before_cursor_execute", listener)
+        try:
+            result = crud.list_todos(db_session, user_id, limit=2, skip=2)
+        finally:
+            event.remove(bind, "before_cursor_execute", listener)
+
+        assert len(statements) == 1
+        assert len(result["items"]) == 2
+        assert result["total"] == 5
+
+    def test_total_beyond_last_page(self, db_session: Session, test_user):
+        """Тест что total известен и для пустой страницы за концом выборки"""
+        _create_todos(db_session, test_user.id, 3)
+
+        result = crud.list_todos(db_session, test_user.id, limit=10, skip=20)
+        assert result["items"] == []
+        assert result["total"] == 3
+
+    def test_count_none(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест отключения подсчета"""
+        _create_todos(db_session, test_user.id, 3)
+
+        response = client.get("/api/v1/todos/?count=none", headers=auth_headers)
+        data = response.json()
+        assert len(data["items"]) == 3
+        assert data["total"] is None
+        assert data["pages"] is None
+
+    def test_count_estimate_is_capped(
+        self,
+        client: TestClient,
+        db_session: Session,
+        test_user,
+        auth_headers,
+        monkeypatch,
+    ):
+        """Тест ограничения подсчета порогом"""
+        monkeypatch.setattr(settings, "todo_count_cap", 4)
+        _create_todos(db_session, test_user.id, 6)
+
+        response = client.get(
+            "/api/v1/todos/?count=estimate&limit=2", headers=auth_headers
+        )
+        data = response.json()
+        assert data["total"] == 4
+        assert data["total_is_estimate"] is True
+
+
+class TestTodoSearch:
+    """Тесты полнотекстового поиска задач"""
+
+    def _search(self, client: TestClient, headers: dict, query: str, **params) -> list:
+        response = client.get(
+            "/api/v1/todos/", params={"search": query, **params}, headers=headers
+        )
+        assert response.status_code == 200
+        return [item["title"] for item in response.json()["items"]]
+
+    def test_prefix_search(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест поиска по префиксу слова без учета регистра"""
+        db_session.add_all(
+            [
+                Todo(title="Купить МОЛОКО", user_id=test_user.id),
+                Todo(title="Позвонить маме", user_id=test_user.id),
+            ]
+        )
+        db_session.commit()
+
+        assert self._search(client, auth_headers, "мол") == ["Купить МОЛОКО"]
+        assert self._search(client, auth_headers, "куп мол") == ["Купить МОЛОКО"]
+        assert self._search(client, auth_headers, "хлеб") == []
+
+    def test_relevance_sort(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что совпадения в названии ранжируются выше совпадений в описании"""
+        db_session.add_all(
+            [
+                Todo(
+                    title="Разное",
+                    description="отчет где-то в описании длинного текста задачи",
+                    user_id=test_user.id,
+                ),
+                Todo(title="Отчет", user_id=test_user.id),
+            ]
+        )
+        db_session.commit()
+
+        assert self._search(client, auth_headers, "отчет", sort="relevance") == [
+            "Отчет",
+            "Разное",
+        ]
+
+    def test_index_follows_update_and_delete(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что поисковый индекс синхронизирован с изменениями задач"""
+        response = client.post(
+            "/api/v1/todos/", json={"title": "Старое название"}, headers=auth_headers
+        )
+        todo_id = response.json()["id"]
+        assert self._search(client, auth_headers, "старое") == ["Старое название"]
+
+        client.put(
+            f"/api/v1/todos/{todo_id}",
+            json={"title": "Новое название"},
+            headers=auth_headers,
+        )
+        assert self._search(client, auth_headers, "старое") == []
+        assert self._search(client, auth_headers, "новое") == ["Новое название"]
+
+        client.delete(f"/api/v1/todos/{todo_id}", headers=auth_headers)
+        assert self._search(client, auth_headers, "новое") == []
+
+    def test_search_is_scoped_to_user(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что поиск не возвращает задачи других пользователей"""
+        other = User(email="other@example.com", password_hash="x")
+        db_session.add(other)
+        db_session.commit()
+        db_session.add(Todo(title="Секретный план", user_id=other.id))
+        db_session.commit()
+
+        assert self._search(client, auth_headers, "секрет") == []
+
+
+class TestTodoStats:
+    """Тесты статистики задач на счетчиках"""
+
+    def test_counters_follow_mutations(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что счетчики совпадают с данными после создания, смены статуса и удаления"""
+        ids = []
+        for i in range(3):
+            response = client.post(
+                "/api/v1/todos/", json={"title": f"Todo {i}"}, headers=auth_headers
+            )
+            ids.append(response.json()["id"])
+
+        client.patch(
+            f"/api/v1/todos/{ids[0]}/status",
+            json={"status": "completed"},
+            headers=auth_headers,
+        )
+        client.put(
+            f"/api/v1/todos/{ids[1]}",
+            json={"status": "in_progress"},
+            headers=auth_headers,
+        )
+        client.delete(f"/api/v1/todos/{ids[2]}", headers=auth_headers)
+
+        response = client.get("/api/v1/todos/stats", headers=auth_headers)
+        assert response.status_code == 200
+        stats = response.json()
+        assert stats["total"] == 2
+        assert stats["completed"] == 1
+        assert stats["in_progress"] == 1
+        assert stats["pending"] == 0
+        assert check_todo_counters(db_session, test_user.id) == {}
+
+    def test_counters_built_lazily(self, db_session: Session, test_user):
+        """Тест построения счетчиков для пользователя без них (данные до миграции)"""
+        user_id = test_user.id
+        _create_todos(
+            db_session, user_id, 2, deadline=datetime.utcnow() - timedelta(days=1)
+        )
+        db_session.query(TodoCounter).filter(TodoCounter.user_id == user_id).delete()
+        db_session.commit()
+        assert get_todo_counters(db_session, user_id) is None
+
+        stats = crud.get_todo_stats(db_session, user_id)
+        assert stats["total"] == 2
+        assert stats["overdue"] == 2
+        assert get_todo_counters(db_session, user_id)["pending"] == 2
+
+    def test_new_user_has_counters(
+        self, client: TestClient, db_session: Session, test_user_data
+    ):
+        """Тест что пользователь, созданный после миграции, сразу получает строку счетчиков"""
+        user = client.post("/api/v1/users/register", json=test_user_data).json()
+        assert get_todo_counters(db_session, user["id"]) == {
+            field: 0 for field in COUNTER_FIELDS
+        }
+
+        headers = {
+            "Authorization": f"Bearer {create_access_token(data={'sub': str(user['id'])})}"
+        }
+        response = client.post(
+            "/api/v1/todos/", json={"title": "Первая"}, headers=headers
+        )
+        assert response.status_code == 201
+        assert get_todo_counters(db_session, user["id"])["pending"] == 1
+
+    def test_concurrently_created_counters_are_not_lost(
+        self, db_session: Session, test_user, monkeypatch
+    ):
+        """Тест что строка счетчиков, созданная параллельным запросом, не дает IntegrityError и получает изменения"""
+        user_id = test_user.id
+        db_session.query(TodoCounter).filter(TodoCounter.user_id == user_id).delete()
+        db_session.commit()
+
+        # Между неудачным UPDATE и INSERT другой запрос создает строку со своей задачей
+        compute = counters.compute_todo_stats
+
+        def concurrent_insert(db, uid, now=None):
+            stats = compute(db, uid, now)
+            db.execute(insert(TodoCounter).values(user_id=uid, total=1, pending=1))
+            return stats
+
+        monkeypatch.setattr(counters, "compute_todo_stats", concurrent_insert)
+        todo = crud.create_todo(db_session, schemas.TodoCreate(title="Моя"), user_id)
+
+        assert todo is not None
+        assert get_todo_counters(db_session, user_id)["pending"] == 2
+
+    def test_status_change_uses_current_status(self, db_session: Session, test_user):
+        """Тест что изменение вычитает из счетчиков текущий статус строки, а не прочитанный сессией раньше"""
+        user_id = test_user.id
+        todo = crud.create_todo(db_session, schemas.TodoCreate(title="Гонка"), user_id)
+
+        other = TestingSessionLocal()
+        try:
+            crud.update_todo_status(other, todo.id, TodoStatus.COMPLETED, user_id)
+        finally:
+            other.close()
+
+        # В db_session задача осталась со статусом pending
+        assert todo.status == TodoStatus.PENDING
+        crud.update_todo_status(db_session, todo.id, TodoStatus.IN_PROGRESS, user_id)
+        assert check_todo_counters(db_session, user_id) == {}
+
+    def test_stats_read_is_constant(self, db_session: Session, test_user):
+        """Тест что статистика читается двумя запросами независимо от числа задач"""
+        user_id = test_user.id
+        _create_todos(db_session, user_id, 20)
+        crud.get_todo_stats(db_session, user_id)
+
+        statements = []
+        bind = db_session.get_bind()
+        listener = lambda *args: statements.append(args[2])
+        event.listen(bind, "before_cursor_execute", listener)
+        try:
+            stats = crud.get_todo_stats(db_session, user_id)
+        finally:
+            event.remove(bind, "before_cursor_execute", listener)
+
+        assert stats["total"] == 20
+        assert len(statements) == 2
+
+    def test_category_delete_updates_counters(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что каскадное удаление задач категории отражается в счетчиках"""
+        category = client.post(
+            "/api/v1/categories/", json={"name": "Дом"}, headers=auth_headers
+        ).json()
+        client.post(
+            "/api/v1/todos/",
+            json={"title": "В категории", "category_id": category["id"]},
+            headers=auth_headers,
+        )
+        client.post(
+            "/api/v1/todos/", json={"title": "Без категории"}, headers=auth_headers
+        )
+
+        client.delete(f"/api/v1/categories/{category['id']}", headers=auth_headers)
+
+        stats = client.get("/api/v1/todos/stats", headers=auth_headers).json()
+        assert stats["total"] == 1
+        assert check_todo_counters(db_session, test_user.id) == {}
+
+
+class TestTodoBulk:
+    """Тесты пакетных операций с задачами"""
+
+    def test_bulk_create(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест пакетного создания с ошибкой в одном элементе"""
+        response = client.post(
+            "/api/v1/todos/bulk",
+            json={
+                "items": [
+                    {"title": "Первая"},
+                    {"title": "Чужая категория", "category_id": 999},
+                    {"title": "Третья", "status": "completed"},
+                ]
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["succeeded"] == 2
+        assert data["failed"] == 1
+        assert [item["result"] for item in data["results"]] == [
+            "created",
+            "error",
+            "created",
+        ]
+        assert data["results"][1]["id"] is None
+
+        created = client.get(
+            f"/api/v1/todos/{data['results'][2]['id']}", headers=auth_headers
+        ).json()
+        assert created["title"] == "Третья"
+        assert check_todo_counters(db_session, test_user.id) == {}
+
+    def test_bulk_create_limit(self, client: TestClient, auth_headers):
+        """Тест ограничения размера пакета"""
+        items = [
+            {"title": f"Todo {i}"} for i in range(settings.todo_bulk_max_items + 1)
+        ]
+        response = client.post(
+            "/api/v1/todos/bulk", json={"items": items}, headers=auth_headers
+        )
+        assert response.status_code == 422
+
+    def test_bulk_update_mixed_operations(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест смешанного пакета update/status/delete"""
+        first, second, third = (
+            todo.id for todo in _create_todos(db_session, test_user.id, 3)
+        )
+
+        response = client.patch(
+            "/api/v1/todos/bulk",
+            json={
+                "operations": [
+                    {"op": "update", "id": first, "fields": {"title": "Переименована"}},
+                    {"op": "status", "id": first, "status": "completed"},
+                    {"op": "status", "id": second, "status": "in_progress"},
+                    {"op": "delete", "id": third},
+                    {"op": "delete", "id": 999},
+                ]
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["result"] for item in data["results"]] == [
+            "updated",
+            "updated",
+            "updated",
+            "deleted",
+            "error",
+        ]
+
+        todo = client.get(f"/api/v1/todos/{first}", headers=auth_headers).json()
+        assert todo["title"] == "Переименована"
+        assert todo["status"] == "completed"
+        assert (
+            client.get(f"/api/v1/todos/{third}", headers=auth_headers).status_code
+            == 404
+        )
+
+        stats = client.get("/api/v1/todos/stats", headers=auth_headers).json()
+        assert (
+            stats["total"],
+            stats["completed"],
+            stats["in_progress"],
+            stats["pending"],
+        ) == (2, 1, 1, 0)
+        assert check_todo_counters(db_session, test_user.id) == {}
+
+    def test_bulk_update_keeps_search_in_sync(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что пакетные изменения отражаются в полнотекстовом поиске"""
+        todo_id = _create_todos(db_session, test_user.id, 1)[0].id
+        client.patch(
+            "/api/v1/todos/bulk",
+            json={
+                "operations": [
+                    {
+                        "op": "update",
+                        "id": todo_id,
+                        "fields": {"title": "Купить молоко"},
+                    },
+                ]
+            },
+            headers=auth_headers,
+        )
+
+        data = client.get("/api/v1/todos/?search=молоко", headers=auth_headers).json()
+        assert [item["id"] for item in data["items"]] == [todo_id]
+
+    def test_bulk_update_is_scoped_to_user(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что чужие задачи недоступны для пакетных операций"""
+        other = User(email="other@example.com", password_hash="x")
+        db_session.add(other)
+        db_session.commit()
+        foreign_id = _create_todos(db_session, other.id, 1)[0].id
+
+        data = client.patch(
+            "/api/v1/todos/bulk",
+            json={
+                "operations": [
+                    {"op": "delete", "id": foreign_id},
+                ]
+            },
+            headers=auth_headers,
+        ).json()
+        assert data["failed"] == 1
+        assert db_session.get(Todo, foreign_id) is not None
+
+    def test_bulk_operation_requires_payload(self, client: TestClient, auth_headers):
+        """Тест валидации операции без данных"""
+        response = client.patch(
+            "/api/v1/todos/bulk",
+            json={
+                "operations": [
+                    {"op": "status", "id": 1},
+                ]
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == 422
+
+
+class TestTodoExport:
+    """Тесты экспорта задач"""
+
+    def test_export_csv(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест экспорта в CSV с фильтром по статусу"""
+        _create_todos(db_session, test_user.id, 2)
+        _create_todos(db_session, test_user.id, 1, status=TodoStatus.COMPLETED)
+
+        response = client.get(
+            "/api/v1/todos/export?format=csv&status=completed", headers=auth_headers
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert 'filename="todos.csv"' in response.headers["content-disposition"]
+
+        rows = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+        assert rows[0][:2] == ["ID", "Название"]
+        assert len(rows) == 2
+        assert rows[1][3] == "completed"
+
+    def test_export_xlsx(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест экспорта в XLSX"""
+        _create_todos(db_session, test_user.id, 3, deadline=datetime.utcnow())
+
+        response = client.get("/api/v1/todos/export?format=xlsx", headers=auth_headers)
+        assert response.status_code == 200
+
+        workbook = load_workbook(io.BytesIO(response.content), read_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+        assert len(rows) == 4
+        assert isinstance(rows[1][5], datetime)
+
+    def test_export_is_streamed(self, db_session: Session, test_user, monkeypatch):
+        """Тест что строки выбираются порциями и CSV отдается частями"""
+        monkeypatch.setattr(settings, "todo_export_batch_size", 10)
+        monkeypatch.setattr(export, "CSV_FLUSH_ROWS", 10)
+        user_id = test_user.id
+        _create_todos(db_session, user_id, 35)
+        db_session.expunge_all()
+
+        rows = crud.iter_todos_for_export(db_session, user_id)
+        chunks = list(export.stream_csv(rows))
+
+        assert len(chunks) == 4
+        assert len(db_session.identity_map) == 0
+
+    def test_export_session_closed_after_stream(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что экспорт читает в своей сессии и закрывает ее после отдачи потока"""
+        _create_todos(db_session, test_user.id, 3)
+        sessions, closed = [], []
+
+        def session_factory():
+            session = TestingSessionLocal()
+            close = session.close
+
+            def tracked_close():
+                closed.append(session)
+                close()
+
+            session.close = tracked_close
+            sessions.append(session)
+            return session
+
+        app.dependency_overrides[get_session_factory] = lambda: session_factory
+        response = client.get("/api/v1/todos/export?format=csv", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert len(response.content.decode("utf-8-sig").splitlines()) == 4
+        assert len(sessions) == 1
+        assert closed == sessions
+
+    def test_export_query_error_returns_500(
+        self, client: TestClient, auth_headers, monkeypatch
+    ):
+        """Тест что ошибка запроса к БД до начала потока дает 500"""
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("БД недоступна")
+            yield
+
+        monkeypatch.setattr(crud, "iter_todos_for_export", fail)
+        response = client.get("/api/v1/todos/export?format=csv", headers=auth_headers)
+        assert response.status_code == 500
+
+    def test_export_invalid_format(self, client: TestClient, auth_headers):
+        """Тест неподдерживаемого формата"""
+        response = client.get("/api/v1/todos/export?format=pdf", headers=auth_headers)
+        assert response.status_code == 422
+
+
+class TestTodoETag:
+    """Тесты условных запросов (ETag / If-None-Match)"""
+
+    def test_unchanged_list_returns_304(
+        self, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что повторный запрос без изменений получает 304 без запроса задач"""
+        _create_todos(db_session, test_user.id, 3)
+
+        first = client.get("/api/v1/todos/", headers=auth_headers)
+        etag = first.headers["etag"]
+        assert first.headers["cache-control"] == "private, no-cache"
+
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            second = client.get(
+                "/api/v1/todos/", headers={**auth_headers, "If-None-Match": etag}
+            )
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+
+        assert second.status_code == 304
+        assert second.content == b""
+        assert second.headers["etag"] == etag
+        assert statements and not any("todos" in statement for statement in statements)
+
+    def test_mutations_change_etag(self, client: TestClient, auth_headers):
+        """Тест что изменения задач и категорий меняют ETag"""
+        etags = [client.get("/api/v1/todos/", headers=auth_headers).headers["etag"]]
+
+        todo = client.post(
+            "/api/v1/todos/", json={"title": "Новая"}, headers=auth_headers
+        ).json()
+        etags.append(client.get("/api/v1/todos/", headers=auth_headers).headers["etag"])
+
+        client.patch(
+            f"/api/v1/todos/{todo['id']}/status",
+            json={"status": "completed"},
+            headers=auth_headers,
+        )
+        etags.append(client.get("/api/v1/todos/", headers=auth_headers).headers["etag"])
+
+        client.post("/api/v1/categories/", json={"name": "Дом"}, headers=auth_headers)
+        etags.append(client.get("/api/v1/todos/", headers=auth_headers).headers["etag"])
+
+        client.delete(f"/api/v1/todos/{todo['id']}", headers=auth_headers)
+        response = client.get(
+            "/api/v1/todos/", headers={**auth_headers, "If-None-Match": etags[-1]}
+        )
+        assert response.status_code == 200
+        etags.append(response.headers["etag"])
+
+        assert len(set(etags)) == len(etags)
+
+    def test_etag_depends_on_query(self, client: TestClient, auth_headers):
+        """Тест что ETag различается для разных параметров запроса"""
+        etag = client.get(
+            "/api/v1/todos/?status=pending", headers=auth_headers
+        ).headers["etag"]
+
+        response = client.get(
+            "/api/v1/todos/?status=completed",
+            headers={**auth_headers, "If-None-Match": etag},
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    @pytest.mark.parametrize(
+        "path",
+        [
+            "/api/v1/todos/stats",
+            "/api/v1/categories/",
+            "/api/v1/categories/with-counts",
+        ],
+    )
+    def test_other_polled_endpoints(self, client: TestClient, auth_headers, path):
+        """Тест 304 для статистики и категорий"""
+        etag = client.get(path, headers=auth_headers).headers["etag"]
+        assert (
+            client.get(
+                path, headers={**auth_headers, "If-None-Match": etag}
+            ).status_code
+            == 304
+        )
+
+        client.post("/api/v1/todos/", json={"title": "Новая"}, headers=auth_headers)
+        assert (
+            client.get(
+                path, headers={**auth_headers, "If-None-Match": etag}
+            ).status_code
+            == 200
+        )
+
+    def test_etag_ignores_cached_user(
+        self, cache, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что ETag берет версию данных из БД, даже если в кэше остался пользователь со старой версией"""
+        etag = client.get("/api/v1/todos/", headers=auth_headers).headers["etag"]
+        key = user_crud.principal_key(test_user.id)
+        principal = cache.get(key)
+        assert principal is not None
+
+        # Пользователь, прочитанный до изменения, записан в кэш после его инвалидации
+        _create_todos(db_session, test_user.id, 1)
+        user_crud.bump_data_version(db_session, test_user.id)
+        db_session.commit()
+        cache.set(key, principal)
+
+        assert (
+            client.get(
+                "/api/v1/todos/", headers={**auth_headers, "If-None-Match": etag}
+            ).status_code
+            == 200
+        )
+
+
+class TestReadThroughCache:
+    """Тесты кэширования списков и статистики с инвалидацией при изменениях"""
+
+    @staticmethod
+    def count_todo_queries(client: TestClient, url: str, headers: dict):
+        """Ответ и число SQL-запросов к задачам при его получении"""
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            response = client.get(url, headers=headers)
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+        return response, sum("FROM todos" in statement for statement in statements)
+
+    def test_repeated_list_served_from_cache(
+        self, cache, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что повторный список отдается из кэша с тем же телом"""
+        _create_todos(db_session, test_user.id, 3, deadline=datetime(2030, 1, 1))
+
+        first, first_queries = self.count_todo_queries(
+            client, "/api/v1/todos/?limit=2", auth_headers
+        )
+        second, second_queries = self.count_todo_queries(
+            client, "/api/v1/todos/?limit=2", auth_headers
+        )
+
+        assert first_queries > 0
+        assert second_queries == 0
+        assert second.content == first.content
+        assert second.json()["next_cursor"] is None
+
+    def test_no_stale_reads_after_todo_writes(
+        self, cache, client: TestClient, auth_headers
+    ):
+        """Тест что после каждого изменения задач список и статистика актуальны"""
+
+        def state():
+            items = client.get("/api/v1/todos/", headers=auth_headers).json()["items"]
+            stats = client.get("/api/v1/todos/stats", headers=auth_headers).json()
+            return (
+                {item["title"]: item["status"] for item in items},
+                stats["total"],
+                stats["completed"],
+            )
+
+        assert state() == ({}, 0, 0)
+        todo = client.post(
+            "/api/v1/todos/", json={"title": "Первая"}, headers=auth_headers
+        ).json()
+        assert state() == ({"Первая": "pending"}, 1, 0)
+
+        client.put(
+            f"/api/v1/todos/{todo['id']}",
+            json={"title": "Переименована"},
+            headers=auth_headers,
+        )
+        assert state() == ({"Переименована": "pending"}, 1, 0)
+
+        client.patch(
+            f"/api/v1/todos/{todo['id']}/status",
+            json={"status": "completed"},
+            headers=auth_headers,
+        )
+        assert state() == ({"Переименована": "completed"}, 1, 1)
+
+        client.post(
+            "/api/v1/todos/bulk",
+            json={"items": [{"title": "Пакет"}]},
+            headers=auth_headers,
+        )
+        assert state() == ({"Переименована": "completed", "Пакет": "pending"}, 2, 1)
+
+        client.patch(
+            "/api/v1/todos/bulk",
+            json={"operations": [{"op": "delete", "id": todo["id"]}]},
+            headers=auth_headers,
+        )
+        assert state() == ({"Пакет": "pending"}, 1, 0)
+
+    def test_no_stale_reads_after_category_writes(
+        self, cache, client: TestClient, auth_headers
+    ):
+        """Тест что изменения категорий видны в категориях, счетчиках и списке задач"""
+        category = client.post(
+            "/api/v1/categories/", json={"name": "Дом"}, headers=auth_headers
+        ).json()
+        client.post(
+            "/api/v1/todos/",
+            json={"title": "Уборка", "category_id": category["id"]},
+            headers=auth_headers,
+        )
+
+        def state():
+            names = [
+                c["name"]
+                for c in client.get("/api/v1/categories/", headers=auth_headers).json()
+            ]
+            counts = {
+                c["name"]: c["todo_count"]
+                for c in client.get(
+                    "/api/v1/categories/with-counts", headers=auth_headers
+                ).json()
+            }
+            items = client.get("/api/v1/todos/", headers=auth_headers).json()["items"]
+            return names, counts, [item["category_name"] for item in items]
+
+        assert state() == (["Дом"], {"Дом": 1}, ["Дом"])
+
+        client.put(
+            f"/api/v1/categories/{category['id']}",
+            json={"name": "Квартира"},
+            headers=auth_headers,
+        )
+        assert state() == (["Квартира"], {"Квартира": 1}, ["Квартира"])
+
+        client.post(
+            "/api/v1/categories/", json={"name": "Работа"}, headers=auth_headers
+        )
+        assert state() == (
+            ["Квартира", "Работа"],
+            {"Квартира": 1, "Работа": 0},
+            ["Квартира"],
+        )
+
+        client.delete(f"/api/v1/categories/{category['id']}", headers=auth_headers)
+        assert state() == (["Работа"], {"Работа": 0}, [])
+
+    def test_sync_crud_invalidates_after_commit(
+        self, cache, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест инвалидации при изменении через синхронную сессию (вне event loop)"""
+        assert client.get("/api/v1/todos/", headers=auth_headers).json()["total"] == 0
+
+        crud.create_todo(
+            db_session, schemas.TodoCreate(title="Из скрипта"), test_user.id
+        )
+
+        assert client.get("/api/v1/todos/", headers=auth_headers).json()["total"] == 1
+
+    def test_users_do_not_share_entries(
+        self, cache, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что записи кэша разделены по пользователям"""
+        _create_todos(db_session, test_user.id, 2)
+        client.get("/api/v1/todos/", headers=auth_headers)
+
+        other = User(email="second@example.com", password_hash="x")
+        db_session.add(other)
+        db_session.commit()
+        other_headers = {
+            "Authorization": f"Bearer {create_access_token(data={'sub': str(other.id)})}"
+        }
+
+        assert client.get("/api/v1/todos/", headers=other_headers).json()["total"] == 0
+
+
+class TestTodoListHydration:
+    """Тесты сборки страниц списка задач из кэша отдельных задач"""
+
+    @pytest.fixture(autouse=True)
+    def hydrate(self, cache, monkeypatch):
+        monkeypatch.setattr(settings, "todo_list_hydrate", True)
+        fetched = []
+        get_todo_items = crud.get_todo_items
+
+        def spy(db, user_id, todo_ids):
+            fetched.append(sorted(todo_ids))
+            return get_todo_items(db, user_id, todo_ids)
+
+        monkeypatch.setattr(crud, "get_todo_items", spy)
+        return fetched
+
+    def test_page_matches_joined_query(
+        self,
+        cache,
+        client: TestClient,
+        db_session: Session,
+        test_user,
+        auth_headers,
+        monkeypatch,
+    ):
+        """Тест что собранная страница совпадает со страницей из запроса с JOIN"""
+        category = client.post(
+            "/api/v1/categories/",
+            json={"name": "Дом", "color": "#FF0000"},
+            headers=auth_headers,
+        ).json()
+        _create_todos(db_session, test_user.id, 3, category_id=category["id"])
+        _create_todos(db_session, test_user.id, 2)
+
+        for url in (
+            "/api/v1/todos/?limit=4",
+            "/api/v1/todos/?pagination=cursor&limit=2&sort=deadline",
+        ):
+            hydrated = client.get(url, headers=auth_headers).json()
+            monkeypatch.setattr(settings, "todo_list_hydrate", False)
+            cache.client.flushall()
+            joined = client.get(url, headers=auth_headers).json()
+            monkeypatch.setattr(settings, "todo_list_hydrate", True)
+            cache.client.flushall()
+
+            assert hydrated == joined
+
+    def test_only_misses_are_fetched(
+        self, hydrate, client: TestClient, db_session: Session, test_user, auth_headers
+    ):
+        """Тест что после изменения списка из БД дочитываются только новые задачи"""
+        todos = _create_todos(db_session, test_user.id, 3)
+        client.get("/api/v1/todos/", headers=auth_headers)
+        assert hydrate == [sorted(todo.id for todo in todos)]
+
+        created = client.post(
+            "/api/v1/todos/", json={"title": "Новая"}, headers=auth_headers
+        ).json()
+        items = client.get("/api/v1/todos/", headers=auth_headers).json()["items"]
+
+        assert len(items) == 4
+        assert hydrate[-1] == [created["id"]]
+
+    def test_no_stale_items_after_writes(
+        self, hydrate, client: TestClient, auth_headers
+    ):
+        """Тест что изменения задачи и переименование категории видны в списке"""
+        category = client.post(
+            "/api/v1/categories/", json={"name": "Дом"}, headers=auth_headers
+        ).json()
+        todo = client.post(
+            "/api/v1/todos/",
+            json={"title": "Уборка", "category_id": category["id"]},
+            headers=auth_headers,
+        ).json()
+
+        def state():
+            return [
+                (item["title"], item["status"], item["category_name"])
+                for item in client.get("/api/v1/todos/", headers=auth_headers).json()[
+                    "items"
+                ]
+            ]
+
+        assert state() == [("Уборка", "pending", "Дом")]
+
+        client.put(
+            f"/api/v1/todos/{todo['id']}",
+            json={"title": "Стирка"},
+            headers=auth_headers,
+        )
+        assert state() == [("Стирка", "pending", "Дом")]
+
+        client.patch(
+            f"/api/v1/todos/{todo['id']}/status",
+            json={"status": "completed"},
+            headers=auth_headers,
+        )
+        assert state() == [("Стирка", "completed", "Дом")]
+
+        client.put(
+            f"/api/v1/categories/{category['id']}",
+            json={"name": "Квартира"},
+            headers=auth_headers,
+        )
+        assert state() == [("Стирка", "completed", "Квартира")]
+
+        client.patch(
+            "/api/v1/todos/bulk",
+            json={
+                "operations": [{"op": "status", "id": todo["id"], "status": "pending"}]
+            },
+            headers=auth_headers,
+        )
+        assert state() == [("Стирка", "pending", "Квартира")]
+
+    def test_item_read_before_update_is_not_served(
+        self,
+        cache,
+        client: TestClient,
+        db_session: Session,
+        test_user,
+        auth_headers,
+        monkeypatch,
+    ):
+        """Тест что строка, прочитанная до изменения и записанная в кэш после его инвалидации, не попадает в список"""
+        todo = _create_todos(db_session, test_user.id, 1)[0]
+        get_todo_items = crud.get_todo_items
+
+        def racing_update(db, user_id, todo_ids):
+            # Изменение и его инвалидация успевают между чтением строки и записью в кэш
+            rows = get_todo_items(db, user_id, todo_ids)
+            monkeypatch.setattr(crud, "get_todo_items", get_todo_items)
+            db_session.get(Todo, todo.id).title = "Новое"
+            db_session.commit()
+            cache.bump_generation(user_tag(user_id, "todos"))
+            return rows
+
+        monkeypatch.setattr(crud, "get_todo_items", racing_update)
+        assert [
+            item["title"]
+            for item in client.get("/api/v1/todos/", headers=auth_headers).json()[
+                "items"
+            ]
+        ] == ["Todo 0"]
+        assert [
+            item["title"]
+            for item in client.get("/api/v1/todos/", headers=auth_headers).json()[
+                "items"
+            ]
+        ] == ["Новое"]
@@ -1,16 +1,31 @@
+import asyncio
+import threading
+import time
+from datetime import timedelta
+
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
+from passlib.hash import bcrypt
 from sqlalchemy.orm import Session
 
+from src.config import settings
+from src.user import crud
+from src.user import routers as user_routers
 from src.user.crud import create_user, get_user_by_email
 from src.user.schemas import UserCreate
+from src.utils import permissions, security, token_revocation
+from src.utils.password_hasher import PasswordHasher
 from src.utils.security import get_password_hash
+from src.utils.token_revocation import BloomFilter, TokenRevocationStore
 
 
 class TestUserRegistration:
     """Тесты регистрации пользователей"""
-    
-    def test_register_user_success(self, client: TestClient, db_session: Session, test_user_data: dict):
+
+    def test_register_user_success(
+        self, client: TestClient, db_session: Session, test_user_data: dict
+    ):
         """Тест успешной регистрации пользователя"""
         response = client.post("/api/v1/users/register", json=test_user_data)
         assert response.status_code == 201
@@ -19,24 +34,26 @@ class TestUserRegistration:
         assert "email" in data
         assert data["email"] == test_user_data["email"]
         assert "password" not in data  # Пароль не должен возвращаться
-    
-    def test_register_user_duplicate_email(self, client: TestClient, db_session: Session, test_user_data: dict):
+
+    def test_register_user_duplicate_email(
+        self, client: TestClient, db_session: Session, test_user_data: dict
+    ):
         """Тест регистрации с существующим email"""
         # Создаем первого пользователя
         response1 = client.post("/api/v1/users/register", json=test_user_data)
         assert response1.status_code == 201
-        
+
         # Пытаемся создать второго с тем же email
         response2 = client.post("/api/v1/users/register", json=test_user_data)
         assert response2.status_code == 400
         assert "уже существует" in response2.json()["detail"]
-    
+
     def test_register_user_invalid_data(self, client: TestClient):
         """Тест регистрации с неверными данными"""
         invalid_data = {"email": "invalid-email", "password": "123"}
         response = client.post("/api/v1/users/register", json=invalid_data)
         assert response.status_code == 422
-    
+
     def test_register_user_missing_fields(self, client: TestClient):
         """Тест регистрации с отсутствующими полями"""
         incomplete_data = {"email": "test@example.com"}
@@ -46,16 +63,20 @@ class TestUserRegistration:
 
 class TestUserLogin:
     """Тесты авторизации пользователей"""
-    
-    def test_login_user_success(self, client: TestClient, db_session: Session, test_user_data: dict):
+
+    def test_login_user_success(
+        self, client: TestClient, db_session: Session, test_user_data: dict
+    ):
         """Тест успешной авторизации"""
         # Сначала регистрируем пользователя
         client.post("/api/v1/users/register", json=test_user_data)
-        
+
         # Затем пытаемся войти
         login_data = {
-            "username": test_user_data["email"],  # OAuth2PasswordRequestForm использует username
-            "password": test_user_data["password"]
+            "username": test_user_data[
+                "email"
+            ],  # OAuth2PasswordRequestForm использует username
+            "password": test_user_data["password"],
         }
         response = client.post("/api/v1/users/login", data=login_data)
         assert response.status_code == 200
@@ -63,50 +84,48 @@ class TestUserLogin:
         assert "access_token" in data
         assert "token_type" in data
         assert data["token_type"] == "bearer"
-    
-    def test_login_user_invalid_credentials(self, client: TestClient, db_session: Session, test_user_data: dict):
+
+    def test_login_user_invalid_credentials(
+        self, client: TestClient, db_session: Session, test_user_data: dict
+    ):
         """Тест авторизации с неверными данными"""
         # Регистрируем пользователя
         client.post("/api/v1/users/register", json=test_user_data)
-        
+
         # Пытаемся войти с неверным паролем
-        login_data = {
-            "username": test_user_data["email"],
-            "password": "wrongpassword"
-        }
+        login_data = {"username": test_user_data["email"], "password": "wrongpassword"}
         response = client.post("/api/v1/users/login", data=login_data)
         assert response.status_code == 401
         assert "Неверный email или пароль" in response.json()["detail"]
-    
+
     def test_login_nonexistent_user(self, client: TestClient):
         """Тест авторизации несуществующего пользователя"""
-        login_data = {
-            "username": "nonexistent@example.com",
-            "password": "password123"
-        }
+        login_data = {"username": "nonexistent@example.com", "password": "password123"}
         response = client.post("/api/v1/users/login", data=login_data)
         assert response.status_code == 401
 
 
 class TestUserProfile:
     """Тесты профиля пользователя"""
-    
+
     def test_get_user_profile_requires_auth(self, client: TestClient):
         """Тест что получение профиля требует аутентификации"""
         response = client.get("/api/v1/users/me")
         assert response.status_code == 401
-    
-    def test_get_user_profile_with_token(self, client: TestClient, db_session: Session, test_user_data: dict):
+
+    def test_get_user_profile_with_token(
+        self, client: TestClient, db_session: Session, test_user_data: dict
+    ):
         """Тест получения профиля с токеном"""
         # Регистрируем и авторизуем пользователя
         client.post("/api/v1/users/register", json=test_user_data)
         login_data = {
             "username": test_user_data["email"],
-            "password": test_user_data["password"]
+            "password": test_user_data["password"],
         }
         login_response = client.post("/api/v1/users/login", data=login_data)
         token = login_response.json()["access_token"]
-        
+
         # Получаем профиль
         headers = {"Authorization": f"Bearer {token}"}
         response = client.get("/api/v1/users/me", headers=headers)
@@ -117,21 +136,429 @@ class TestUserProfile:
 
 class TestUserCRUD:
     """Тесты CRUD операций с пользователями"""
-    
+
     def test_create_user_in_db(self, db_session: Session, test_user_data: dict):
         """Тест создания пользователя в базе данных"""
         user_create = UserCreate(**test_user_data)
         user = create_user(db_session, user_create)
         assert user is not None
         assert user.email == test_user_data["email"]
-        assert user.password_hash != test_user_data["password"]  # Пароль должен быть захеширован
-    
+        assert (
+            user.password_hash != test_user_data["password"]
+        )  # Пароль должен быть захеширован
+
     def test_get_user_by_email(self, db_session: Session, test_user_data: dict):
         """Тест получения пользователя по email"""
         user_create = UserCreate(**test_user_data)
         created_user = create_user(db_session, user_create)
-        
+
         found_user = get_user_by_email(db_session, email=test_user_data["email"])
         assert found_user is not None
         assert found_user.id == created_user.id
         assert found_user.email == created_user.email
+
+
+class TestPrincipalCache:
+    """Тесты кэша аутентифицированного пользователя в get_current_user"""
+
+    @pytest.fixture
+    def lookups(self, cache, monkeypatch):
+        """Запросы пользователя к БД из get_principal"""
+        calls = []
+        get_user = crud.get_user
+
+        def spy(db, user_id):
+            calls.append(user_id)
+            return get_user(db, user_id)
+
+        monkeypatch.setattr(crud, "get_user", spy)
+        return calls
+
+    def test_repeated_requests_hit_cache(
+        self, lookups, client: TestClient, test_user, auth_headers
+    ):
+        """Тест что повторные запросы не читают пользователя из БД"""
+        for _ in range(3):
+            assert client.get("/api/v1/todos/", headers=auth_headers).status_code == 200
+        assert lookups == [test_user.id]
+
+    def test_update_invalidates_principal(
+        self, lookups, client: TestClient, auth_headers
+    ):
+        """Тест что изменение профиля сразу видно в /me"""
+        client.get("/api/v1/users/me", headers=auth_headers)
+        client.put(
+            "/api/v1/users/me",
+            json={"email": "renamed@example.com"},
+            headers=auth_headers,
+        )
+
+        response = client.get("/api/v1/users/me", headers=auth_headers)
+        assert response.json()["email"] == "renamed@example.com"
+
+    def test_deactivation_takes_effect_immediately(
+        self, lookups, client: TestClient, auth_headers
+    ):
+        """Тест что деактивированный пользователь сразу теряет доступ"""
+        assert client.get("/api/v1/todos/", headers=auth_headers).status_code == 200
+        client.put("/api/v1/users/me", json={"is_active": False}, headers=auth_headers)
+
+        assert client.get("/api/v1/todos/", headers=auth_headers).status_code == 401
+
+    def test_deleted_user_is_rejected(
+        self, lookups, client: TestClient, test_user, auth_headers
+    ):
+        """Тест что удаленный пользователь не аутентифицируется из кэша"""
+        assert client.get("/api/v1/todos/", headers=auth_headers).status_code == 200
+        client.delete(f"/api/v1/users/{test_user.id}", headers=auth_headers)
+
+        assert client.get("/api/v1/todos/", headers=auth_headers).status_code == 401
+
+    def test_data_change_refreshes_etag(
+        self, lookups, client: TestClient, auth_headers
+    ):
+        """Тест что изменение задач обновляет версию данных в закэшированном пользователе"""
+        etag = client.get("/api/v1/todos/", headers=auth_headers).headers["ETag"]
+        client.post("/api/v1/todos/", json={"title": "Новая"}, headers=auth_headers)
+
+        response = client.get(
+            "/api/v1/todos/", headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == 1
+
+
+class TestPasswordHasher:
+    """Тесты пула потоков для bcrypt"""
+
+    def test_event_loop_is_not_blocked(self):
+        """Тест что во время хеширования event loop продолжает работу"""
+        hasher = PasswordHasher(workers=1)
+
+        async def scenario():
+            ticks = 0
+            task = asyncio.ensure_future(hasher.run(time.sleep, 0.2))
+            while not task.done():
+                ticks += 1
+                await asyncio.sleep(0.01)
+            await task
+            return ticks
+
+        assert asyncio.run(scenario()) > 5
+        assert hasher.snapshot()["completed"] == 1
+
+    def test_full_queue_is_rejected(self):
+        """Тест что сверх очереди вызов сразу получает 503"""
+        hasher = PasswordHasher(workers=1, max_queue=1)
+        release = threading.Event()
+
+        async def scenario():
+            running = asyncio.ensure_future(hasher.run(release.wait))
+            queued = asyncio.ensure_future(hasher.run(len, "x"))
+            await asyncio.sleep(0.05)
+            with pytest.raises(HTTPException) as exc_info:
+                await hasher.run(len, "x")
+            assert hasher.snapshot()["queued"] == 1
+            release.set()
+            await asyncio.gather(running, queued)
+            return exc_info.value
+
+        error = asyncio.run(scenario())
+        assert error.status_code == 503
+        assert error.headers["Retry-After"] == "1"
+        assert hasher.snapshot()["rejected"] == {"queue_full": 1}
+
+    def test_stale_queued_call_is_skipped(self):
+        """Тест что вызов, ждавший в очереди дольше queue_timeout, не выполняется"""
+        hasher = PasswordHasher(workers=1, queue_timeout=0.05)
+        calls = []
+
+        async def scenario():
+            first = asyncio.ensure_future(hasher.run(time.sleep, 0.1))
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException):
+                await hasher.run(calls.append, "late")
+            await first
+
+        asyncio.run(scenario())
+        assert calls == []
+        assert hasher.snapshot()["rejected"] == {"timeout": 1}
+
+    def test_login_storm_gets_503(
+        self, client: TestClient, test_user, test_user_data, monkeypatch
+    ):
+        """Тест что при заполненной очереди вход отвечает 503 с Retry-After, а не ждет"""
+        hasher = PasswordHasher(workers=1, max_queue=0)
+        hasher.running = 1
+        monkeypatch.setattr(security, "password_hasher", hasher)
+
+        response = client.post(
+            "/api/v1/users/login",
+            data={
+                "username": test_user_data["email"],
+                "password": test_user_data["password"],
+            },
+        )
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+    def test_metrics_include_queue_depth(self, client: TestClient):
+        """Тест что /metrics содержит глубину очереди пула"""
+        response = client.get("/metrics")
+        assert "password_hasher_queue_depth 0" in response.text
+        assert 'password_hasher_rejected_total{reason="queue_full"}' in response.text
+
+
+class TestPasswordHashCost:
+    """Тесты калибровки стоимости хеширования и пересчета хеша при входе"""
+
+    @pytest.fixture(autouse=True)
+    def restore_context(self):
+        config = security.pwd_context.to_dict()
+        costs = dict(security.password_costs)
+        yield
+        security.pwd_context.load(config)
+        security.password_costs.clear()
+        security.password_costs.update(costs)
+
+    def test_calibration_respects_bounds(self, monkeypatch):
+        """Тест что калибровка выбирает стоимость в заданных границах и сообщает время"""
+        monkeypatch.setitem(settings.password_min_rounds, "bcrypt", 5)
+        monkeypatch.setitem(settings.password_max_rounds, "bcrypt", 6)
+
+        costs = security.calibrate_password_hashing(target_ms=10000)
+
+        assert costs["bcrypt"]["rounds"] == 6
+        assert costs["bcrypt"]["ms"] > 0
+        assert security.password_costs == costs
+        assert security.get_password_hash("password123").startswith("$2b$06$")
+
+    def test_login_rehashes_outdated_hash(
+        self, db_session: Session, test_user_data: dict, monkeypatch
+    ):
+        """Тест что хеш ниже минимальной стоимости пересчитывается при успешном входе"""
+        user = create_user(
+            db_session,
+            UserCreate(**test_user_data),
+            hashed_password=bcrypt.hash(test_user_data["password"], rounds=4),
+        )
+        monkeypatch.setitem(settings.password_min_rounds, "bcrypt", 5)
+        monkeypatch.setitem(settings.password_max_rounds, "bcrypt", 6)
+        security.calibrate_password_hashing(target_ms=0)
+
+        assert (
+            crud.authenticate_user(
+                db_session, test_user_data["email"], test_user_data["password"]
+            )
+            is not None
+        )
+        db_session.refresh(user)
+        assert user.password_hash.startswith("$2b$06$")
+        assert security.verify_password(test_user_data["password"], user.password_hash)
+
+    def test_hash_within_bounds_is_kept(
+        self, db_session: Session, test_user_data: dict, monkeypatch
+    ):
+        """Тест что хеш в допустимых границах не пересчитывается (калибровка на другом сервере)"""
+        original = bcrypt.hash(test_user_data["password"], rounds=5)
+        user = create_user(
+            db_session, UserCreate(**test_user_data), hashed_password=original
+        )
+        monkeypatch.setitem(settings.password_min_rounds, "bcrypt", 5)
+        monkeypatch.setitem(settings.password_max_rounds, "bcrypt", 6)
+        security.calibrate_password_hashing(target_ms=0)
+
+        assert (
+            crud.authenticate_user(
+                db_session, test_user_data["email"], test_user_data["password"]
+            )
+            is not None
+        )
+        db_session.refresh(user)
+        assert user.password_hash == original
+
+
+class TestVerifiedTokenCache:
+    """Тесты кэша проверенных JWT"""
+
+    @pytest.fixture
+    def decodes(self, monkeypatch):
+        """Вызовы jwt.decode"""
+        security.verified_tokens.clear()
+        calls = []
+        decode = security.jwt.decode
+
+        def spy(token, *args, **kwargs):
+            calls.append(token)
+            return decode(token, *args, **kwargs)
+
+        monkeypatch.setattr(security.jwt, "decode", spy)
+        yield calls
+        security.verified_tokens.clear()
+
+    def test_repeated_token_is_decoded_once(self, decodes):
+        """Тест что повторная проверка того же токена не декодирует его"""
+        token = security.create_access_token(data={"sub": "1"})
+
+        assert security.verify_token(token)["sub"] == "1"
+        assert security.verify_token(token)["sub"] == "1"
+        assert len(decodes) == 1
+
+    def test_cached_token_type_is_checked(self, decodes):
+        """Тест что тип токена проверяется и при попадании в кэш"""
+        token = security.create_access_token(data={"sub": "1"})
+        security.verify_token(token)
+
+        assert security.verify_token(token, "refresh") is None
+
+    def test_entry_expires_with_token(self, decodes):
+        """Тест что запись живет не дольше exp токена"""
+        token = security.create_access_token(
+            data={"sub": "1"}, expires_delta=timedelta(seconds=2)
+        )
+        security.verify_token(token)
+
+        expires_at = security.verified_tokens._entries[security._token_digest(token)][0]
+        assert expires_at - time.monotonic() <= 2
+
+
+class TestRefreshTokenRotation:
+    """Тесты ротации refresh токенов и отзыва семейств"""
+
+    @pytest.fixture(autouse=True)
+    def revocations(self, cache, monkeypatch):
+        """Чистое хранилище отзывов поверх fakeredis"""
+        store = TokenRevocationStore(capacity=1000)
+        for module in (token_revocation, permissions, user_routers):
+            monkeypatch.setattr(module, "token_revocations", store)
+        return store
+
+    @pytest.fixture
+    def tokens(self, client: TestClient, test_user, test_user_data):
+        response = client.post(
+            "/api/v1/users/login",
+            data={
+                "username": test_user_data["email"],
+                "password": test_user_data["password"],
+            },
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    def _refresh(self, client: TestClient, refresh_token: str):
+        return client.post(
+            "/api/v1/users/refresh", json={"refresh_token": refresh_token}
+        )
+
+    def test_login_tokens_authenticate(self, client: TestClient, tokens, test_user):
+        """Тест что access токен после входа принимается"""
+        response = client.get(
+            "/api/v1/users/me",
+            headers={"Authorization": f"Bearer {tokens['access_token']}"},
+        )
+        assert response.status_code == 200
+        assert response.json()["id"] == test_user.id
+
+    def test_refresh_rotates_tokens(self, client: TestClient, tokens):
+        """Тест что refresh выдает новую пару того же семейства без access токена"""
+        response = self._refresh(client, tokens["refresh_token"])
+        assert response.status_code == 200
+        rotated = response.json()
+
+        assert rotated["refresh_token"] != tokens["refresh_token"]
+        old, new = (
+            security.verify_token(token["refresh_token"], "refresh")
+            for token in (tokens, rotated)
+        )
+        assert new["fam"] == old["fam"] and new["jti"] != old["jti"]
+        assert (
+            client.get(
+                "/api/v1/users/me",
+                headers={"Authorization": f"Bearer {rotated['access_token']}"},
+            ).status_code
+            == 200
+        )
+
+    def test_reuse_revokes_family(self, client: TestClient, tokens):
+        """Тест что повторное использование refresh токена отзывает все семейство"""
+        rotated = self._refresh(client, tokens["refresh_token"]).json()
+
+        assert self._refresh(client, tokens["refresh_token"]).status_code == 401
+        assert self._refresh(client, rotated["refresh_token"]).status_code == 401
+        for access_token in (tokens["access_token"], rotated["access_token"]):
+            response = client.get(
+                "/api/v1/users/me", headers={"Authorization": f"Bearer {access_token}"}
+            )
+            assert response.status_code == 401
+
+    def test_access_token_is_not_refresh_token(self, client: TestClient, tokens):
+        """Тест что access токен не принимается вместо refresh"""
+        assert self._refresh(client, tokens["access_token"]).status_code == 401
+
+    def test_logout_revokes_session(self, client: TestClient, tokens):
+        """Тест что выход отзывает токены сессии"""
+        response = client.post(
+            "/api/v1/users/logout", json={"refresh_token": tokens["refresh_token"]}
+        )
+        assert response.status_code == 200
+
+        headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+        assert client.get("/api/v1/users/me", headers=headers).status_code == 401
+        assert self._refresh(client, tokens["refresh_token"]).status_code == 401
+
+    def test_redis_unavailable_returns_503(self, cache, client: TestClient, tokens):
+        """Тест что без Redis одноразовость не проверить и refresh отвечает 503"""
+        cache.client.connection_pool.connection_kwargs["server"].connected = False
+        assert self._refresh(client, tokens["refresh_token"]).status_code == 503
+
+    def test_unknown_family_skips_redis(self, cache, revocations, monkeypatch):
+        """Тест что семейство вне фильтра Блума проверяется без обращения к Redis"""
+
+        async def fail(*args, **kwargs):
+            raise AssertionError("обращение к Redis")
+
+        monkeypatch.setattr(cache.async_client, "exists", fail)
+        assert asyncio.run(revocations.is_revoked({"fam": "active"})) is False
+
+    def test_sync_loads_revocations_of_other_workers(self, revocations):
+        """Тест что пересборка фильтра видит отзывы, сделанные другим воркером"""
+        other_worker = TokenRevocationStore(capacity=1000)
+
+        async def scenario():
+            await other_worker.revoke_family("stolen", ttl=60)
+            before = await revocations.is_revoked({"fam": "stolen"})
+            await revocations.sync()
+            return before, await revocations.is_revoked({"fam": "stolen"})
+
+        assert asyncio.run(scenario()) == (False, True)
+
+    def test_revocation_is_published_to_other_workers(self, revocations):
+        """Тест что другой воркер видит отзыв сразу, без пересборки фильтра"""
+        other_worker = TokenRevocationStore(capacity=1000)
+        other_worker.start_listener()
+        try:
+            asyncio.run(revocations.revoke_family("stolen", ttl=60))
+            deadline = time.monotonic() + 2
+            while "stolen" not in other_worker.bloom and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert asyncio.run(other_worker.is_revoked({"fam": "stolen"})) is True
+        finally:
+            other_worker.stop_listener()
+
+
+class TestBloomFilter:
+    """Тесты фильтра Блума"""
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        items = [f"family-{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        assert all(item in bloom for item in items)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"family-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        assert false_positives < 300